@@ -0,0 +1,241 @@
+"""
+End-to-end load test: many concurrent simulated players against the real app.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test                        # 100 players, 3 games each, local server
+    python -m benchmarks.load_test --players 2000 --games 1
+    python -m benchmarks.load_test --stateless            # games in signed tokens (see web_app/tokens.py)
+    python -m benchmarks.load_test --url http://host:8080 # an already running server
+
+Without --url the app is started in this process on a free port (threaded
+werkzeug server, HTTP/1.1 keep-alive), with the ranking and replay files in
+a temporary directory. Each player keeps one connection and its own cookies
+and plays whole games through the same routes as the page:
+
+    /api/gamestate -> /api/reset?tier=... -> /api/solve -> /api/click/r/c ...
+    -> /api/submit_score -> /ranking
+
+Players run in a thread pool, one thread per player, so --players is the
+number of simultaneous clients. A local server shares the interpreter (and
+the GIL) with the players; to measure the server alone, or several worker
+processes, start it separately and pass --url. The report (JSON) gives the total
+throughput and, per route, the request count, error rate (transport errors
+and unexpected statuses) and p50/p95/p99/max latency in milliseconds.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+DEFAULT_PLAYERS = 100
+DEFAULT_GAMES = 3
+DEFAULT_TIER = 'easy'
+REQUEST_TIMEOUT = 30
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class RouteStats:
+    """Latencies and error counts per route, shared by all player threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed):
+        routes = {}
+        total = errors = 0
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            failed = self.errors.get(route, 0)
+            total += len(values)
+            errors += failed
+            routes[route] = {
+                'requests': len(values),
+                'errors': failed,
+                'error_rate': round(failed / len(values), 4),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+            }
+        return {
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_sec': round(total / elapsed, 1) if elapsed else None,
+            'routes': routes,
+        }
+
+
+class Player:
+    """One simulated browser: a keep-alive connection and a cookie jar."""
+
+    def __init__(self, host, port, stats):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.cookies = {}
+        self.connection = None
+
+    def request(self, method, path, route, body=None, expected=(200,)):
+        """Sends one request and records it under `route`. Returns (status, parsed JSON or None)."""
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT)
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.stats.record(route, time.perf_counter() - started, False)
+            self.close() # Reconnect on the next request
+            return None, None
+        self.stats.record(route, time.perf_counter() - started, response.status in expected)
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.getheader('Content-Type', '').startswith('application/json'):
+            return response.status, json.loads(data)
+        return response.status, None
+
+    def play(self, tier, name):
+        """Plays one game to the win and submits it."""
+        self.request('GET', '/api/gamestate', '/api/gamestate')
+        self.request('GET', f'/api/reset?tier={tier}', '/api/reset')
+        status, solution = self.request('GET', '/api/solve', '/api/solve')
+        if status != 200:
+            return
+        data = None
+        for row, col in solution['clicks']:
+            status, data = self.request('GET', f'/api/click/{row}/{col}', '/api/click/<int:row>/<int:col>')
+            if status != 200:
+                return
+        if data is not None and data.get('win'):
+            self.request('POST', '/api/submit_score', '/api/submit_score',
+                         body={'name': name, 'moves': data['moves']}, expected=(202,))
+        self.request('GET', '/ranking', '/ranking')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def run_players(host, port, players, games, tier):
+    stats = RouteStats()
+
+    def player_main(number):
+        player = Player(host, port, stats)
+        try:
+            for game in range(games):
+                player.play(tier, f"load-{number}-{game}")
+        finally:
+            player.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=players) as pool:
+        for _ in pool.map(player_main, range(players)):
+            pass
+    return stats.report(time.perf_counter() - started)
+
+
+def run_local(players, games, tier, stateless=False):
+    """Starts the app on a free local port with throwaway ranking files and runs the players against it."""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from web_app import app as app_module
+    from web_app import ranking_utils, replay
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    original_ranking_path = ranking_utils.RANKING_FILE_PATH
+    original_replay_path = replay.REPLAY_LOG_PATH
+    original_stateless = app_module.app.config['STATELESS_GAMES']
+    server = None
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            ranking_utils.RANKING_FILE_PATH = os.path.join(directory, "ranking_jogo.txt")
+            replay.REPLAY_LOG_PATH = os.path.join(directory, "ranking_replays.txt")
+            app_module.app.config['STATELESS_GAMES'] = stateless
+            server = make_server('127.0.0.1', 0, app_module.app, threaded=True, request_handler=KeepAliveHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            report = run_players('127.0.0.1', server.server_port, players, games, tier)
+            app_module.score_writer.flush() # Queued scores go to the temporary files
+            report['sessions'] = app_module.sessions.stats()['active']
+            return report
+    finally:
+        if server is not None:
+            server.shutdown()
+        ranking_utils.RANKING_FILE_PATH = original_ranking_path
+        replay.REPLAY_LOG_PATH = original_replay_path
+        app_module.app.config['STATELESS_GAMES'] = original_stateless
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=DEFAULT_PLAYERS, help="simultaneous simulated players")
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES, help="games played by each player")
+    parser.add_argument('--tier', default=DEFAULT_TIER, help="puzzle tier of every game (easy, medium, hard)")
+    parser.add_argument('--url', help="load an already running server instead of starting one")
+    parser.add_argument('--stateless', action='store_true', help="local server in stateless token mode")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+    if args.players <= 0 or args.games <= 0:
+        parser.error("--players and --games must be positive")
+
+    if args.url:
+        target = urlsplit(args.url)
+        report = run_players(target.hostname, target.port or 80, args.players, args.games, args.tier)
+    else:
+        report = run_local(args.players, args.games, args.tier, args.stateless)
+    report['meta'] = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'players': args.players,
+        'games': args.games,
+        'tier': args.tier,
+        'target': args.url or ('local, stateless' if args.stateless else 'local'),
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
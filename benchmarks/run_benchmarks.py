@@ -0,0 +1,242 @@
+"""
+Micro-benchmark suite for the game logic, the ranking storage and the Flask routes.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks                  # full run, compared with baseline.json
+    python -m benchmarks.run_benchmarks --quick          # smaller ranking files, shorter timings
+    python -m benchmarks.run_benchmarks --output out.json
+    python -m benchmarks.run_benchmarks --update-baseline
+
+Each benchmark reports operations per second (best of several repeats).
+Results are printed as JSON; when a baseline exists, any benchmark slower
+than the baseline by more than --threshold (default 20%) is listed and the
+process exits with status 1. Only benchmarks present in both runs are
+compared, so --quick runs can be checked against a full baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from web_app.game_logic import Game
+from web_app.rules import PRESETS
+from web_app import ranking_utils
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.20
+# 300x300 is past MAX_MASK_TABLE_CELLS: clicks build their mask from the row stencil
+BOARD_SIZES = (5, 10, 25, 50, 300)
+RANKING_FILE_SIZES = (10, 1000, 100000, 1000000)
+QUICK_RANKING_FILE_SIZES = (10, 1000, 10000)
+
+
+def measure(func, min_time=0.2, repeats=3, setup=None):
+    """
+    Calls func() in a loop for at least `min_time` seconds, `repeats` times; returns the best ops/sec.
+    `setup`, if given, is called untimed before each repeat.
+    """
+    best = 0.0
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        count = 0
+        started = time.perf_counter()
+        deadline = started + min_time
+        while True:
+            func()
+            count += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+        best = max(best, count / (now - started))
+    return best
+
+
+def bench_game_logic(results, min_time):
+    rng = random.Random(0)
+    for size in BOARD_SIZES:
+        game = Game(size, size)
+        clicks = [(rng.randrange(size), rng.randrange(size)) for _ in range(1024)]
+        position = [0]
+
+        def click():
+            row, col = clicks[position[0] & 1023]
+            position[0] += 1
+            game.toggle_cell_and_neighbors(row, col)
+
+        results[f"game.toggle_cell_and_neighbors[{size}x{size}]"] = measure(click, min_time)
+        results[f"game.check_win[{size}x{size}]"] = measure(game.check_win, min_time)
+        results[f"game.reset_board[{size}x{size}]"] = measure(game.reset_board, min_time)
+
+    # Every rule compiles to the same kind of toggle table, so clicks should cost the same
+    clicks = [(rng.randrange(5), rng.randrange(5)) for _ in range(1024)]
+    for name, rule in PRESETS.items():
+        game = Game(5, 5, rule)
+        position = [0]
+
+        def click():
+            row, col = clicks[position[0] & 1023]
+            position[0] += 1
+            game.toggle_cell_and_neighbors(row, col)
+
+        results[f"game.toggle_cell_and_neighbors[5x5,{name}]"] = measure(click, min_time)
+
+
+def _write_ranking_file(path, lines):
+    rng = random.Random(lines)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(f"Player{i},{rng.randint(15, 500)},2024-01-01 12:00:00\n")
+
+
+def bench_ranking(results, min_time, file_sizes):
+    original_path = ranking_utils.RANKING_FILE_PATH
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for lines in file_sizes:
+                path = os.path.join(directory, f"ranking_{lines}.txt")
+                _write_ranking_file(path, lines)
+                ranking_utils.RANKING_FILE_PATH = path
+
+                def cold_read():
+                    ranking_utils._indexes.pop(path, None) # Parse the whole file
+                    ranking_utils.get_rankings()
+
+                results[f"ranking.get_rankings.cold[{lines}]"] = measure(cold_read, min_time, repeats=1)
+                results[f"ranking.get_rankings[{lines}]"] = measure(ranking_utils.get_rankings, min_time)
+                results[f"ranking.get_rank[{lines}]"] = measure(lambda: ranking_utils.get_rank(100), min_time)
+                results[f"ranking.get_ranking_page[{lines}]"] = measure(
+                    lambda: ranking_utils.get_ranking_page(lines // 40, 20), min_time)
+                results[f"ranking.add_score[{lines}]"] = measure(
+                    lambda: ranking_utils.add_score("Bench", 42, "2024-01-01 12:00:00"), min_time)
+                os.remove(path)
+    finally:
+        ranking_utils.RANKING_FILE_PATH = original_path
+
+
+def bench_solver(results, min_time):
+    from web_app.solver import get_solver, solve_state
+
+    rng = random.Random(23)
+    for size in (100, 300):
+        get_solver(size, size)  # The light-chasing table is built once per size
+        state = rng.getrandbits(size * size)
+        results[f"solver.solve_state[{size}x{size}]"] = measure(
+            lambda: solve_state(state, size, size, minimal=False), min_time)
+
+
+def bench_tokens(results, min_time):
+    from web_app.tokens import TokenCodec
+
+    codec = TokenCodec("benchmark")
+    session = codec.new_session()
+    for index in range(50):
+        session.click(index % 5, index // 5 % 5)
+    token = codec.encode(session)
+    # What a stateless request adds: verify and rebuild the game, then sign it again
+    results["tokens.decode+encode[5x5,50 clicks]"] = measure(lambda: codec.encode(codec.decode(token)), min_time)
+
+
+def _get_ok(client, url):
+    """GETs `url`; an error response would be timed instead of the route, so it stops the run."""
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} answered {response.status_code} during the benchmark")
+    return response
+
+
+def bench_flask(results, min_time):
+    from web_app import app as app_module
+    from web_app import replay
+
+    original_ranking_path = ranking_utils.RANKING_FILE_PATH
+    original_replay_path = replay.REPLAY_LOG_PATH
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            ranking_utils.RANKING_FILE_PATH = os.path.join(directory, "ranking_jogo.txt")
+            replay.REPLAY_LOG_PATH = os.path.join(directory, "ranking_replays.txt")
+            _write_ranking_file(ranking_utils.RANKING_FILE_PATH, 10)
+            client = app_module.app.test_client()
+            client.get('/api/gamestate')  # Issues the session cookie
+            # A fresh game per repeat keeps the clicks under the per-game move cap
+            reset = lambda: _get_ok(client, '/api/reset')
+            results["flask./api/click"] = measure(lambda: _get_ok(client, '/api/click/2/2'), min_time, setup=reset)
+            results["flask./api/click?format=compact"] = measure(
+                lambda: _get_ok(client, '/api/click/2/2?format=compact'), min_time, setup=reset)
+            results["flask./ranking"] = measure(lambda: _get_ok(client, '/ranking'), min_time)
+    finally:
+        ranking_utils.RANKING_FILE_PATH = original_ranking_path
+        replay.REPLAY_LOG_PATH = original_replay_path
+
+
+def run(quick=False):
+    min_time = 0.05 if quick else 0.2
+    results = {}
+    bench_game_logic(results, min_time)
+    bench_ranking(results, min_time, QUICK_RANKING_FILE_SIZES if quick else RANKING_FILE_SIZES)
+    bench_solver(results, min_time)
+    bench_tokens(results, min_time)
+    try:
+        bench_flask(results, min_time)
+    except ImportError as e:  # Flask not installed
+        print(f"Warning: skipping Flask benchmarks: {e}", file=sys.stderr)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': quick,
+            'unit': 'ops_per_sec',
+        },
+        'results': {name: round(value, 1) for name, value in results.items()},
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Returns (name, baseline ops/sec, current ops/sec) for every benchmark that regressed."""
+    regressions = []
+    for name, base_value in baseline['results'].items():
+        value = current['results'].get(name)
+        if value is not None and value < base_value * (1 - threshold):
+            regressions.append((name, base_value, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help="smaller ranking files and shorter timings")
+    parser.add_argument('--output', help="also write the JSON results to this file")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before failing (0.2 = 20%%)")
+    parser.add_argument('--update-baseline', action='store_true', help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    current = run(quick=args.quick)
+    text = json.dumps(current, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.", file=sys.stderr)
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    for name, base_value, value in regressions:
+        print(f"REGRESSION {name}: {value:.1f} ops/s vs baseline {base_value:.1f} ops/s "
+              f"({(1 - value / base_value) * 100:.0f}% slower)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
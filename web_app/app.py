@@ -1,51 +1,536 @@
-from flask import Flask, render_template, jsonify, request
-from game_logic import Game, LIGHT_ON, LIGHT_OFF # Import Game and constants
-from ranking_utils import get_rankings, add_score # Import ranking utilities
+import os
+import time
+import atexit
+import secrets
+import hashlib
+import threading
+from flask import Flask, render_template, jsonify, request, g, make_response, Response
 from datetime import datetime # Import datetime
 
+try:
+    from .game_logic import LIGHT_ON, LIGHT_OFF # Import constants
+    from .ranking_utils import (get_optimal_moves, get_rankings_version, sanitize_name, # Import ranking utilities
+                                get_ranking_page, get_rank, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    from .score_writer import ScoreWriter
+    from .ranking_stream import RankingBroadcaster
+    from .rules import CLASSIC, PRESETS, parse_rule, rule_slug, stencil_payload
+    from .solver import get_solver, optimal_moves, solve_state, MAX_NULL_SPACE_DIM
+    from .sessions import SessionRegistry
+    from .tokens import TokenCodec, TokenLedger, SqliteTokenLedger, InvalidToken, LedgerFull, DEFAULT_LEDGER_PATH
+    from .replay import verify_game, format_replay_record
+    from .puzzles import PuzzlePool, TIER_NAMES
+    from .distance_table import load_distance_table
+    from .ws_server import GameChannel, DEFAULT_WS_PORT
+    from . import metrics
+    from .wire import wants_compact, compact_payload, parse_clicks
+except ImportError:
+    from game_logic import LIGHT_ON, LIGHT_OFF
+    from ranking_utils import (get_optimal_moves, get_rankings_version, sanitize_name,
+                               get_ranking_page, get_rank, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    from score_writer import ScoreWriter
+    from ranking_stream import RankingBroadcaster
+    from rules import CLASSIC, PRESETS, parse_rule, rule_slug, stencil_payload
+    from solver import get_solver, optimal_moves, solve_state, MAX_NULL_SPACE_DIM
+    from sessions import SessionRegistry
+    from tokens import TokenCodec, TokenLedger, SqliteTokenLedger, InvalidToken, LedgerFull, DEFAULT_LEDGER_PATH
+    from replay import verify_game, format_replay_record
+    from puzzles import PuzzlePool, TIER_NAMES
+    from distance_table import load_distance_table
+    from ws_server import GameChannel, DEFAULT_WS_PORT
+    import metrics
+    from wire import wants_compact, compact_payload, parse_clicks
+
 app = Flask(__name__)
 
-# Initialize the game instance
-game = Game()
-server_moves_count = 0
+# Rendered ranking pages: (rows, cols, rule, page, page size, live) -> (rankings version, ETag, HTML)
+_ranking_page_cache = {}
+_ranking_page_lock = threading.Lock()
+RANKING_PAGE_CACHE_SIZE = 256
+
+# Largest board side accepted by the ranking routes (each size has its own ranking)
+MAX_RANKING_SIDE = 10
+
+# Upper bound on the clicks accepted by one /api/moves request
+MAX_BATCH_MOVES = 10000
+
+# Largest null space of a custom stencil from ?rule=: its solves, hints and
+# puzzles enumerate 2^k equivalent solutions inside the request
+MAX_CUSTOM_NULL_SPACE_DIM = 8
+
+# Larger request bodies are refused with 413 before they are read; a full
+# batch of JSON clicks (MAX_BATCH_MOVES pairs) stays well below it
+app.config['MAX_CONTENT_LENGTH'] = 256 * 1024
+
+# Accepted scores are written to the ranking in batches by a background thread;
+# whatever is still queued is written when the process exits
+score_writer = ScoreWriter()
+atexit.register(score_writer.stop)
+
+# Live top-of-ranking updates for /api/ranking/stream, one producer for all subscribers.
+# Each open stream holds a worker thread for as long as the page stays open, so
+# streams are only served by threaded servers (wsgi.multithread: the development
+# server, gunicorn -k gthread); JOGO_RANKING_STREAM=1 forces them on (e.g. gevent
+# workers) and =0 turns them off.
+ranking_broadcaster = RankingBroadcaster()
+app.config['RANKING_STREAM'] = os.environ.get('JOGO_RANKING_STREAM', 'auto')
+
+# Ready-made solvable puzzles per difficulty tier, refilled in the background
+puzzle_pool = PuzzlePool()
+
+# Memory-mapped distance table of the classic board, if it was built
+# (python -m web_app.distance_table); hints fall back to the solver without it
+distance_table = load_distance_table(5, 5)
+
+# One game per player, keyed by the session id cookie
+SESSION_COOKIE_NAME = 'game_sid'
+sessions = SessionRegistry()
+
+# Stateless mode: games travel in signed tokens (see tokens.py) instead of the
+# session registry, so any worker process sharing JOGO_TOKEN_SECRET can serve them
+app.config['STATELESS_GAMES'] = os.environ.get('JOGO_STATELESS') == '1'
+TOKEN_COOKIE_NAME = 'game_token'
+TOKEN_HEADER = 'X-Game-Token'
+token_codec = TokenCodec(os.environ.get('JOGO_TOKEN_SECRET'))
+# Which tokens are stale must be known to every worker: the ledger is a SQLite
+# file shared by the processes of this host (JOGO_TOKEN_LEDGER, 'memory' for a
+# single process). Across hosts, route each player to one host.
+TOKEN_LEDGER_PATH = os.environ.get('JOGO_TOKEN_LEDGER', DEFAULT_LEDGER_PATH)
+if app.config['STATELESS_GAMES'] and TOKEN_LEDGER_PATH != 'memory':
+    token_ledger = SqliteTokenLedger(TOKEN_LEDGER_PATH)
+else:
+    token_ledger = TokenLedger()
+if app.config['STATELESS_GAMES'] and not os.environ.get('JOGO_TOKEN_SECRET'):
+    print("Warning: JOGO_TOKEN_SECRET is not set; game tokens are only valid in this process")
+
+class StaleToken(Exception):
+    """The request carries an older token of a game than the latest one issued."""
+
+# Routes that change a stateless game: they claim the token's next sequence number
+# in the ledger before they run, so one token cannot be played twice concurrently
+TOKEN_WRITE_ENDPOINTS = {'handle_click', 'handle_moves', 'undo_move', 'redo_move', 'submit_score'}
+
+# Optional WebSocket play channel; the page falls back to the REST routes without it
+WS_PORT = int(os.environ.get('JOGO_WS_PORT', DEFAULT_WS_PORT))
+game_channel = None
+
+def start_game_channel(port=WS_PORT):
+    """Starts the WebSocket channel on `port`, sharing this app's session registry."""
+    global game_channel
+    if game_channel is None:
+        game_channel = GameChannel(sessions, port=port, cookie_name=SESSION_COOKIE_NAME).start()
+    return game_channel
+
+def current_session(allow_stale=False):
+    """
+    Returns the GameSession of the requesting browser, issuing a session id if it has none.
+    In stateless mode it is rebuilt from the request's token; a stale token raises
+    StaleToken unless `allow_stale` (the game is about to be replaced anyway).
+    """
+    if app.config['STATELESS_GAMES']:
+        return token_session(allow_stale)
+    session_id = request.cookies.get(SESSION_COOKIE_NAME)
+    if not session_id:
+        session_id = secrets.token_urlsafe(16)
+        g.new_session_id = session_id
+    return sessions.get(session_id)
+
+def token_session(allow_stale):
+    session = g.get('token_session')
+    if session is not None:
+        return session
+    token = request.headers.get(TOKEN_HEADER) or request.cookies.get(TOKEN_COOKIE_NAME)
+    session = None
+    if token:
+        try:
+            session = token_codec.decode(token)
+        except InvalidToken:
+            pass # A forged, damaged or expired token just starts a new game
+    if session is None:
+        session = token_codec.new_session(sessions.rows, sessions.cols)
+        g.token_origin = None
+    else:
+        if request.endpoint in TOKEN_WRITE_ENDPOINTS:
+            # Compare-and-set before anything changes: a concurrent request with the same token loses here
+            if not token_ledger.advance(session.game_id, session.seq, session.seq + 1):
+                raise StaleToken()
+            session.seq += 1
+            g.token_claimed = True
+        elif not allow_stale and not token_ledger.is_current(session.game_id, session.seq):
+            raise StaleToken()
+        g.token_origin = session.fingerprint()
+    g.token_session = session
+    return session
+
+def move_limit_reached(session, count):
+    """Every game has a move cap (see GameSession.max_moves), lower for stateless games."""
+    return not session.room_for(count)
+
+def compact_requested():
+    return wants_compact(request.args, request.accept_mimetypes)
+
+metrics.REGISTRY.gauge('jogo_active_sessions', "Games currently held in the session registry.",
+                        lambda: len(sessions))
+metrics.REGISTRY.gauge('jogo_ranking_stream_subscribers', "Open /api/ranking/stream connections.",
+                        lambda: ranking_broadcaster.subscriber_count())
+metrics.REGISTRY.gauge('jogo_score_queue_depth', "Accepted scores not yet written to the ranking.",
+                        lambda: len(score_writer))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - started, {'route': route})
+        metrics.REQUESTS.inc(1, {'route': route, 'method': request.method, 'status': response.status_code})
+    return response
+
+@app.after_request
+def set_session_cookie(response):
+    session_id = g.pop('new_session_id', None)
+    if session_id:
+        response.set_cookie(SESSION_COOKIE_NAME, session_id, httponly=True, samesite='Lax')
+    return response
+
+@app.after_request
+def issue_game_token(response):
+    """
+    Re-issues the token of a stateless game that this request changed, or
+    whose sequence number it claimed (the token it came with is stale now).
+    """
+    session = g.pop('token_session', None)
+    if session is None:
+        return response
+    origin = g.pop('token_origin', None)
+    claimed = g.pop('token_claimed', False)
+    if origin is not None and origin == session.fingerprint() and not claimed:
+        return response
+    if origin is None or origin[0] != session.game_id:
+        try:
+            if origin is not None:
+                token_ledger.finish(origin[0]) # Submitted or started over: its tokens are spent
+            # First token of a new game, whose id was just drawn
+            token_ledger.advance(session.game_id, session.seq, session.seq + 1)
+        except LedgerFull:
+            # Raised after the route ran, so the error handler would not see it
+            return ledger_full(None)
+        session.seq += 1
+    token = token_codec.encode(session)
+    response.headers[TOKEN_HEADER] = token
+    response.set_cookie(TOKEN_COOKIE_NAME, token, httponly=True, samesite='Lax')
+    return response
+
+@app.errorhandler(StaleToken)
+def stale_token(error):
+    return jsonify({'success': False, 'message': 'Jogo desatualizado. Reinicie o jogo.'}), 409
+
+@app.errorhandler(LedgerFull)
+def ledger_full(error):
+    response = jsonify({'success': False, 'message': 'Servidor ocupado. Tente novamente mais tarde.'})
+    response.status_code = 503
+    return response
 
 @app.route('/')
 def game_page():
-    return render_template('index.html')
+    # The WebSocket channel plays registry games, so stateless mode sticks to the REST routes
+    ws_port = game_channel.port if game_channel is not None and not app.config['STATELESS_GAMES'] else None
+    return render_template('index.html', ws_port=ws_port)
+
+def requested_rule(rows, cols):
+    """
+    Rule named by ?rule= (a preset or custom stencil), None if absent. Raises
+    ValueError if it is invalid or cannot be solved exactly on a rows x cols board;
+    a custom stencil must also be cheap to solve and able to light the whole board.
+    """
+    name = request.args.get('rule')
+    if not name:
+        return None
+    rule = parse_rule(name)
+    custom = rule.name not in PRESETS
+    limit = MAX_CUSTOM_NULL_SPACE_DIM if custom else MAX_NULL_SPACE_DIM
+    if len(get_solver(rows, cols, rule).null_basis) > limit:
+        raise ValueError(f"Rule {name} has too many equivalent solutions on a {rows}x{cols} board")
+    if custom and optimal_moves(0, rows, cols, rule) is None:
+        raise ValueError(f"Rule {name} cannot win a {rows}x{cols} board")
+    return rule
+
+def ranking_board():
+    """
+    Board of a ranking request: (rows, cols, rule) from ?rows=&cols=&rule=,
+    the classic 5x5 by default, or None if invalid.
+    """
+    rows = request.args.get('rows', 5, type=int)
+    cols = request.args.get('cols', 5, type=int)
+    if not (1 <= rows <= MAX_RANKING_SIDE and 1 <= cols <= MAX_RANKING_SIDE):
+        return None
+    try:
+        rule = requested_rule(rows, cols) or CLASSIC
+    except ValueError:
+        return None
+    return rows, cols, rule
+
+def ranking_page_args():
+    """1-based page number and page size of a ranking request (?page=&size=)."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    size = min(max(request.args.get('size', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    return page, size
+
+def ranking_stream_enabled():
+    """True if this server can hold /api/ranking/stream connections open (see RANKING_STREAM)."""
+    setting = app.config['RANKING_STREAM']
+    if setting == 'auto':
+        # A sync worker serves one request at a time: a stream would block it
+        return bool(request.environ.get('wsgi.multithread'))
+    return setting == '1'
+
+def load_ranking_page(page, size, rows, cols, rule, version):
+    """Returns (entries with their rank, total scores) of a 1-based page."""
+    if version[2] is None:
+        return [], 0 # A missing file just means no scores yet; don't create it here
+    entries, total = get_ranking_page(page - 1, size, rows, cols, rule_slug(rule))
+    first_rank = (page - 1) * size + 1
+    return [dict(entry, rank=first_rank + i) for i, entry in enumerate(entries)], total
+
+def render_ranking_page(page=1, size=DEFAULT_PAGE_SIZE, rows=5, cols=5, rule=CLASSIC, live=False):
+    """
+    Returns (etag, html) for a page of the ranking, re-reading and re-rendering
+    only when the rankings version changed since the cached copy was built.
+    With `live`, the first page subscribes to /api/ranking/stream.
+    """
+    key = (rows, cols, rule, page, size, live)
+    version = get_rankings_version(rows, cols, rule_slug(rule))
+    cached = _ranking_page_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+    with _ranking_page_lock:
+        cached = _ranking_page_cache.get(key)
+        if cached is None or cached[0] != version:
+            entries, total = load_ranking_page(page, size, rows, cols, rule, version)
+            # Links keep ?rule= only for variants, so classic URLs stay as they were
+            rule_arg = None if rule == CLASSIC else rule.name
+            html = render_template('ranking.html', rankings=entries, total=total, page=page, size=size,
+                                   pages=max(1, -(-total // size)), rows=rows, cols=cols, rule=rule_arg, live=live,
+                                   optimal_moves=get_optimal_moves(rows, cols, rule))
+            etag = hashlib.sha1(html.encode('utf-8')).hexdigest()
+            if len(_ranking_page_cache) >= RANKING_PAGE_CACHE_SIZE:
+                _ranking_page_cache.clear()
+            cached = _ranking_page_cache[key] = (version, etag, html)
+        return cached[1], cached[2]
 
 @app.route('/ranking')
 def ranking_page():
-    rankings_data = get_rankings()
-    return render_template('ranking.html', rankings=rankings_data)
+    board = ranking_board()
+    if board is None:
+        return "Tabuleiro inválido.", 400
+    page, size = ranking_page_args()
+    etag, html = render_ranking_page(page, size, *board, live=ranking_stream_enabled())
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate; unchanged pages cost a 304
+    return response.make_conditional(request)
+
+@app.route('/api/ranking')
+def ranking_api():
+    """Page of the ranking as JSON: ?page= (1-based), ?size=, ?rows=&cols=&rule= for the board."""
+    board = ranking_board()
+    if board is None:
+        return jsonify({'success': False, 'message': 'Tabuleiro inválido.'}), 400
+    page, size = ranking_page_args()
+    rows, cols, rule = board
+    entries, total = load_ranking_page(page, size, rows, cols, rule,
+                                       get_rankings_version(rows, cols, rule_slug(rule)))
+    return jsonify({'rows': rows, 'cols': cols, 'rule': rule.name, 'page': page, 'size': size,
+                    'total': total, 'pages': max(1, -(-total // size)), 'entries': entries})
+
+@app.route('/api/ranking/rank')
+def ranking_rank_api():
+    """Rank and percentile a score of ?moves= would have on the ranking of ?rows=&cols=&rule=."""
+    board = ranking_board()
+    if board is None:
+        return jsonify({'success': False, 'message': 'Tabuleiro inválido.'}), 400
+    moves = request.args.get('moves', type=int)
+    if moves is None or moves <= 0:
+        return jsonify({'success': False, 'message': 'Contagem de jogadas inválida.'}), 400
+    rows, cols, rule = board
+    variant = rule_slug(rule)
+    if get_rankings_version(rows, cols, variant)[2] is None:
+        standing = {'rank': 1, 'percentile': 100.0, 'total': 0}
+    else:
+        standing = get_rank(moves, rows, cols, variant)
+    return jsonify(dict(standing, moves=moves))
+
+@app.route('/api/ranking/stream')
+def ranking_stream():
+    """
+    Server-sent events with the first page (?size=) of the ranking of
+    ?rows=&cols=&rule= and its total: a snapshot on connect, then a diff
+    whenever either changes (see ranking_stream.py).
+    """
+    board = ranking_board()
+    if board is None:
+        return jsonify({'success': False, 'message': 'Tabuleiro inválido.'}), 400
+    if not ranking_stream_enabled():
+        return jsonify({'success': False, 'message': 'Atualizações ao vivo indisponíveis neste servidor.'}), 503
+    rows, cols, rule = board
+    _, size = ranking_page_args()
+    response = Response(ranking_broadcaster.stream((rows, cols, rule_slug(rule), size)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Proxies must not hold events back
+    return response
 
 @app.route('/api/gamestate')
 def get_gamestate():
-    global server_moves_count
-    return jsonify({
-        'board': game.get_board(),
-        'moves': server_moves_count,
-        'light_on_char': LIGHT_ON,  # Send the actual character for ON
-        'light_off_char': LIGHT_OFF # Send the actual character for OFF
-    })
+    session = current_session()
+    with session.lock:
+        if compact_requested():
+            payload = compact_payload(session.game, session.moves)
+            payload['stencil'] = stencil_payload(session.game.rule)
+            payload['can_undo'] = bool(session.played)
+            payload['can_redo'] = bool(session.undone)
+            return jsonify(payload)
+        return jsonify({
+            'board': session.game.get_board(),
+            'moves': session.moves,
+            'rule': session.game.rule.name,
+            'stencil': stencil_payload(session.game.rule),
+            'can_undo': bool(session.played),
+            'can_redo': bool(session.undone),
+            'light_on_char': LIGHT_ON,  # Send the actual character for ON
+            'light_off_char': LIGHT_OFF # Send the actual character for OFF
+        })
 
 @app.route('/api/click/<int:row>/<int:col>')
 def handle_click(row, col):
-    global server_moves_count
-    # Assuming game methods use 0-indexed row/col
-    game.toggle_cell_and_neighbors(row, col)
-    server_moves_count += 1
-    win_status = game.check_win()
+    session = current_session()
+    with session.lock:
+        game = session.game
+        previous_state = game.state
+        # Assuming game methods use 0-indexed row/col
+        if move_limit_reached(session, 1):
+            return jsonify({'success': False, 'message': 'Limite de jogadas atingido.'}), 400
+        if not session.click(row, col):
+            return jsonify({'success': False, 'message': 'Jogada fora do tabuleiro.'}), 400
+        win_status = game.check_win()
     
-    if win_status:
-        # If the game is won, we can save the score.
-        # We can log that a win occurred.
-        # print(f"Win condition met in {server_moves_count} moves. Score not saved yet.")
-        pass # No longer need to print, client will prompt for name.
+        if win_status:
+            # If the game is won, we can save the score.
+            # We can log that a win occurred.
+            pass # No longer need to print, client will prompt for name.
+
+        if compact_requested():
+            payload = compact_payload(game, session.moves, previous_state)
+            payload['win'] = win_status
+            return jsonify(payload)
+
+        return jsonify({
+            'board': game.get_board(),
+            'moves': session.moves,
+            'win': win_status
+        })
+
+def history_step(step, empty_message):
+    """Shared body of /api/undo and /api/redo: one re-toggle of a logged click, counted as a move."""
+    session = current_session()
+    with session.lock:
+        game = session.game
+        previous_state = game.state
+        if move_limit_reached(session, 1):
+            return jsonify({'success': False, 'message': 'Limite de jogadas atingido.'}), 400
+        if step(session) is None:
+            return jsonify({'success': False, 'message': empty_message}), 400
+        if compact_requested():
+            payload = compact_payload(game, session.moves, previous_state)
+        else:
+            payload = {'board': game.get_board(), 'moves': session.moves}
+        payload['win'] = game.check_win()
+        payload['can_undo'] = bool(session.played)
+        payload['can_redo'] = bool(session.undone)
+        return jsonify(payload)
 
+@app.route('/api/undo', methods=['POST'])
+def undo_move():
+    """Takes back the last click; the undo itself counts as a move."""
+    return history_step(lambda session: session.undo(), 'Nenhuma jogada para desfazer.')
+
+@app.route('/api/redo', methods=['POST'])
+def redo_move():
+    """Plays the last undone click again."""
+    return history_step(lambda session: session.redo(), 'Nenhuma jogada para refazer.')
+
+@app.route('/api/moves', methods=['POST'])
+def handle_moves():
+    """
+    Applies an ordered batch of clicks in one request: either
+    {"clicks": [[row, col], ...]} or {"packed": "<base64url varints>"}.
+    Every click is validated first; on any error nothing is applied.
+    An optional integer "seq" is echoed back, so a client that pipelines
+    clicks knows which of its predicted moves the reply already includes.
+    """
+    session = current_session()
+    with session.lock:
+        game = session.game
+        data = request.get_json(silent=True)
+        try:
+            cells = parse_clicks(data, game.rows, game.cols, MAX_BATCH_MOVES)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        if move_limit_reached(session, len(cells)):
+            return jsonify({'success': False, 'message': 'Limite de jogadas atingido.'}), 400
+
+        previous_state = game.state
+        game.apply_moves(cells)
+        session.record(cells)
+        win_status = game.check_win()
+
+        if compact_requested():
+            payload = compact_payload(game, session.moves, previous_state)
+        else:
+            payload = {'board': game.get_board(), 'moves': session.moves}
+        payload['win'] = win_status
+        if isinstance(data.get('seq'), int):
+            payload['seq'] = data['seq']
+        return jsonify(payload)
+
+@app.route('/api/solve')
+def solve_game():
+    session = current_session()
+    with session.lock:
+        game = session.game
+        state, rows, cols, rule = game.state, game.rows, game.cols, game.rule
+    # Solved outside the lock: a large board's solve must not hold up the player's clicks
+    clicks = solve_state(state, rows, cols, rule)
+    if clicks is None:
+        return jsonify({'solvable': False, 'clicks': [], 'moves': None})
+    return jsonify({
+        'solvable': True,
+        'clicks': [[row, col] for row, col in clicks],
+        'moves': len(clicks)
+    })
+
+@app.route('/api/hint')
+def get_hint():
+    """Optimal moves remaining from the current board and a click that gets one closer."""
+    session = current_session()
+    with session.lock:
+        game = session.game
+        state, rows, cols, rule = game.state, game.rows, game.cols, game.rule
+    table = distance_table
+    # The distance table only covers the classic rule
+    if table is not None and (table.rows, table.cols) == (rows, cols) and rule == CLASSIC:
+        remaining = table.distance(state)
+        best_click = table.best_click(state)
+    else:
+        clicks = solve_state(state, rows, cols, rule)
+        remaining = None if clicks is None else len(clicks)
+        best_click = clicks[0] if clicks else None
     return jsonify({
-        'board': game.get_board(),
-        'moves': server_moves_count,
-        'win': win_status
+        'solvable': remaining is not None,
+        'moves_remaining': remaining,
+        'best_click': list(best_click) if best_click is not None else None
     })
 
 @app.route('/api/submit_score', methods=['POST'])
@@ -60,26 +545,82 @@ def submit_score():
     # Basic validation for moves_count
     if not isinstance(moves_count, int) or moves_count <= 0:
         return jsonify({'success': False, 'message': 'Contagem de jogadas inválida.'}), 400
+    # The name is checked as it will be stored: a blank one would be dropped by the writer
+    if isinstance(player_name, str):
+        player_name = sanitize_name(player_name)
+    if not isinstance(player_name, str) or not player_name:
+        return jsonify({'success': False, 'message': 'Nome inválido.'}), 400
+
+    # The score must be reproducible by replaying this player's own move log
+    session = current_session()
+    with session.lock:
+        game = session.game
+        history = session.history
+        if not verify_game(history, game.rows, game.cols, moves_count, session.start_state, game.rule):
+            return jsonify({'success': False, 'message': 'Pontuação não verificável.'}), 400
 
-    current_date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        current_date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    try:
-        add_score(player_name, moves_count, current_date_str)
-        return jsonify({'success': True, 'message': 'Pontuação enviada com sucesso!'})
-    except Exception as e:
-        # Log the exception e for debugging
-        print(f"Error submitting score: {e}")
-        return jsonify({'success': False, 'message': 'Falha ao enviar pontuação devido a erro no servidor.'}), 500
+        try:
+            # The score is written in the background (hence 202); its standing comes from the
+            # in-memory leaderboard plus the queued scores, so the request does not wait for the disk
+            variant = rule_slug(game.rule) # Each rule has its own ranking
+            standing = score_writer.standing(moves_count, game.rows, game.cols, variant)
+            replay_record = format_replay_record(player_name, moves_count, current_date_str, game.rows, game.cols,
+                                                 history, session.start_state, game.rule)
+            if not score_writer.submit(player_name, moves_count, current_date_str, game.rows, game.cols,
+                                       replay_record, variant):
+                return jsonify({'success': False, 'message': 'Servidor ocupado. Tente enviar novamente.'}), 503
+            session.reset() # A won game can only be submitted once
+            return jsonify({'success': True, 'message': 'Pontuação enviada com sucesso!',
+                            'rank': standing['rank'], 'percentile': standing['percentile']}), 202
+        except Exception:
+            app.logger.exception("Error submitting score")
+            return jsonify({'success': False, 'message': 'Falha ao enviar pontuação devido a erro no servidor.'}), 500
 
 @app.route('/api/reset')
 def reset_game():
-    global server_moves_count
-    game.reset_board()
-    server_moves_count = 0
-    return jsonify({
-        'board': game.get_board(),
-        'moves': server_moves_count
-    })
+    """
+    Starts a new game. With ?tier=easy|medium|hard the board is a random
+    solvable puzzle from the pool; otherwise it is the classic all-OFF board.
+    ?rule= switches the neighborhood rule (see rules.py); without it the
+    current rule is kept.
+    """
+    session = current_session(allow_stale=True)
+    try:
+        rule = requested_rule(session.game.rows, session.game.cols) or session.game.rule
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Regra inválida.'}), 400
+    tier = request.args.get('tier')
+    puzzle = None
+    if tier and tier != 'classic':
+        if tier not in TIER_NAMES:
+            return jsonify({'success': False, 'message': 'Nível de dificuldade inválido.'}), 400
+        puzzle_pool.start()
+        puzzle = puzzle_pool.pop(session.game.rows, session.game.cols, tier, rule)
+    with session.lock:
+        previous_state = session.game.state
+        session.reset(puzzle, rule)
+        game = session.game
+        if compact_requested():
+            payload = compact_payload(game, session.moves, previous_state)
+        else:
+            payload = {'board': game.get_board(), 'moves': session.moves, 'rule': game.rule.name}
+    payload['stencil'] = stencil_payload(game.rule)
+    if puzzle is not None:
+        payload['tier'] = puzzle.tier
+        payload['optimal_moves'] = puzzle.optimal_moves
+    return jsonify(payload)
+
+@app.route('/metrics')
+def metrics_page():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if WS_PORT and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        try:
+            start_game_channel()
+        except OSError as e:
+            print(f"Warning: WebSocket channel disabled: {e}")
     app.run(debug=True, host='0.0.0.0', port=8080)
@@ -0,0 +1,101 @@
+"""
+Vectorized simulation of many boards at once, for analytics and bot training.
+
+Requires NumPy (optional dependency: `pip install numpy`). N boards of the
+same size are held as an (N, words) array of uint64, each row being the
+same bitmask Game.state uses, split into 64-bit words. A vector of clicks,
+one per board, is applied with a single fancy-indexed XOR, and the win
+check is one row-wise comparison.
+"""
+try:
+    import numpy as np
+except ImportError:  # Optional dependency
+    np = None
+
+try:
+    from .game_logic import get_toggle_masks, full_mask
+    from .rules import CLASSIC
+except ImportError:
+    from game_logic import get_toggle_masks, full_mask
+    from rules import CLASSIC
+
+_WORD_BITS = 64
+_WORD_MASK = (1 << _WORD_BITS) - 1
+
+
+def _to_words(value, words):
+    return [(value >> (_WORD_BITS * w)) & _WORD_MASK for w in range(words)]
+
+
+class BatchGame:
+    """
+    N independent games of the same size and rule, simulated together.
+    Behaves like N Game objects: clicks outside the board are ignored.
+    """
+
+    def __init__(self, count, rows=5, cols=5, states=None, rule=CLASSIC):
+        if np is None:
+            raise ImportError("BatchGame requires NumPy: pip install numpy")
+        self.count = count
+        self.rows = rows
+        self.cols = cols
+        self.rule = rule
+        self.cells = rows * cols
+        self.words = (self.cells + _WORD_BITS - 1) // _WORD_BITS
+        # One row per cell, plus a final all-zero row used for invalid clicks
+        masks = [_to_words(mask, self.words) for mask in get_toggle_masks(rows, cols, rule)]
+        masks.append([0] * self.words)
+        self._masks = np.array(masks, dtype=np.uint64)
+        self._full = np.array(_to_words(full_mask(rows, cols), self.words), dtype=np.uint64)
+        self.states = np.zeros((count, self.words), dtype=np.uint64)
+        if states is not None:
+            self.set_states(states)
+
+    def set_states(self, states):
+        """Loads the boards from Python integers (Game.state values)."""
+        if len(states) != self.count:
+            raise ValueError(f"Expected {self.count} states, got {len(states)}")
+        self.states[:] = np.array([_to_words(state, self.words) for state in states], dtype=np.uint64)
+
+    def get_states(self):
+        """Returns the boards as Python integers, comparable with Game.state."""
+        result = []
+        for row in self.states.tolist():
+            value = 0
+            for w, word in enumerate(row):
+                value |= int(word) << (_WORD_BITS * w)
+            result.append(value)
+        return result
+
+    def to_bool_boards(self):
+        """Returns an (N, rows, cols) bool array, True where the light is ON."""
+        as_bytes = self.states.astype('<u8').view(np.uint8)
+        bits = np.unpackbits(as_bytes, axis=1, bitorder='little')[:, :self.cells]
+        return bits.astype(bool).reshape(self.count, self.rows, self.cols)
+
+    def click_cells(self, cells):
+        """
+        Applies one click per board, given as cell indices (row * cols + col).
+        Out-of-range indices (e.g. -1 for "no click") leave that board unchanged.
+        Returns the vector of win flags.
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        if cells.shape != (self.count,):
+            raise ValueError(f"Expected {self.count} clicks, got shape {cells.shape}")
+        cells = np.where((cells >= 0) & (cells < self.cells), cells, self.cells)
+        self.states ^= self._masks[cells]
+        return self.check_win()
+
+    def click(self, rows, cols):
+        """Applies one click per board, given as vectors of rows and columns. Returns the win flags."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        valid = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        return self.click_cells(np.where(valid, rows * self.cols + cols, -1))
+
+    def check_win(self):
+        """Vector of win flags, one per board."""
+        return (self.states == self._full).all(axis=1)
+
+    def reset(self):
+        self.states[:] = 0
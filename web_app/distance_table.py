@@ -0,0 +1,193 @@
+"""
+Precomputed distance-to-win table for every state of a small board.
+
+Build step (needs NumPy):
+
+    python -m web_app.distance_table 5 5
+
+runs a breadth-first search from the all-ON board over all 2^(rows*cols)
+states and writes one byte per state (the fewest clicks to win, or 255 when
+the state cannot be won) plus a JSON file with the distance distribution
+and solvability classes. The server memory-maps the table read-only, so
+"moves remaining" and "best next click" hints are O(1) lookups and every
+worker process shares the same pages.
+
+The BFS is bit-parallel: frontier and visited sets are packed 8 states per
+byte. Clicking mask m maps state i to i ^ m; for the high bits of m that is
+a flip of the packed array viewed as a (2, 2, ..., 2) tensor, and for the
+three low bits a 256-entry byte lookup table.
+"""
+import json
+import mmap
+import os
+
+try:
+    import numpy as np
+except ImportError:  # Only the build step needs NumPy
+    np = None
+
+try:
+    from .game_logic import get_toggle_masks, full_mask
+except ImportError:
+    from game_logic import get_toggle_masks, full_mask
+
+UNREACHABLE = 0xFF
+MAX_TABLE_CELLS = 30  # 2^30 bytes = 1 GiB; bigger tables are not practical
+DISTANCE_TABLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+
+
+def table_paths(rows, cols, directory=None):
+    base = os.path.join(directory or DISTANCE_TABLE_DIR, f"distance_{rows}x{cols}")
+    return base + ".bin", base + ".json"
+
+
+def _byte_permutation_tables():
+    """tables[l][v] = byte v with its bit b moved to bit b ^ l (XOR of the 3 low state bits)."""
+    values = np.arange(256, dtype=np.uint16)
+    tables = np.zeros((8, 256), dtype=np.uint8)
+    for low in range(8):
+        permuted = np.zeros(256, dtype=np.uint16)
+        for bit in range(8):
+            permuted |= ((values >> bit) & 1) << (bit ^ low)
+        tables[low] = permuted
+    return tables
+
+
+def compute_distances(rows, cols):
+    """Returns a NumPy uint8 array with the distance to win of every state."""
+    if np is None:
+        raise ImportError("Building the distance table requires NumPy: pip install numpy")
+    cells = rows * cols
+    if cells > MAX_TABLE_CELLS:
+        raise ValueError(f"A {rows}x{cols} board has too many states for a table")
+    masks = get_toggle_masks(rows, cols)
+    goal = full_mask(rows, cols)
+    distances = np.full(1 << cells, UNREACHABLE, dtype=np.uint8)
+    distances[goal] = 0
+
+    if cells < 3:
+        # Too small to pack: plain BFS
+        frontier = [goal]
+        level = 0
+        while frontier:
+            level += 1
+            next_frontier = []
+            for state in frontier:
+                for mask in masks:
+                    neighbor = state ^ mask
+                    if distances[neighbor] == UNREACHABLE:
+                        distances[neighbor] = level
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return distances
+
+    byte_tables = _byte_permutation_tables()
+    high_bits = cells - 3
+    # Axis of the (2,)*high_bits view that holds state bit k (k >= 3)
+    moves = []
+    for mask in masks:
+        axes = tuple(high_bits - 1 - (bit - 3) for bit in range(3, cells) if (mask >> bit) & 1)
+        moves.append((mask & 7, axes))
+
+    frontier = np.zeros(1 << high_bits, dtype=np.uint8)
+    frontier[goal >> 3] = 1 << (goal & 7)
+    visited = frontier.copy()
+    level = 0
+    while frontier.any():
+        level += 1
+        reached = np.zeros_like(frontier)
+        tensor = frontier.reshape((2,) * high_bits)
+        for low, axes in moves:
+            shifted = np.flip(tensor, axis=axes).reshape(-1) if axes else frontier
+            reached |= byte_tables[low][shifted] if low else shifted
+        frontier = reached & ~visited
+        visited |= frontier
+        new_states = np.unpackbits(frontier, bitorder='little').astype(bool)
+        distances[new_states] = level
+    return distances
+
+
+def table_stats(distances, rows, cols):
+    """Distance distribution and solvability classes of a distance table."""
+    counts = np.bincount(distances, minlength=256)
+    reachable = int(len(distances) - counts[UNREACHABLE])
+    distribution = {str(d): int(counts[d]) for d in range(UNREACHABLE) if counts[d]}
+    return {
+        'rows': rows,
+        'cols': cols,
+        'states': int(len(distances)),
+        'winnable_states': reachable,
+        # Winnable states form one coset of the click space; every class has the same size
+        'solvability_classes': int(len(distances) // reachable),
+        'max_distance': max(int(d) for d in distribution),
+        'distribution': distribution,
+    }
+
+
+def build_distance_table(rows=5, cols=5, directory=None):
+    """Computes the table and writes the .bin and .json files. Returns the stats."""
+    distances = compute_distances(rows, cols)
+    stats = table_stats(distances, rows, cols)
+    bin_path, json_path = table_paths(rows, cols, directory)
+    os.makedirs(os.path.dirname(bin_path), exist_ok=True)
+    temp_path = bin_path + ".tmp"
+    distances.tofile(temp_path)
+    os.replace(temp_path, bin_path)  # Readers never see a half-written table
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+class DistanceTable:
+    """Read-only memory-mapped distance table for one board size."""
+
+    def __init__(self, rows, cols, directory=None):
+        self.rows = rows
+        self.cols = cols
+        self._masks = get_toggle_masks(rows, cols)
+        bin_path, json_path = table_paths(rows, cols, directory)
+        with open(bin_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) != 1 << (rows * cols):
+            self._map.close()
+            raise ValueError(f"{bin_path} does not hold a {rows}x{cols} table")
+        with open(json_path, encoding="utf-8") as f:
+            self.stats = json.load(f)
+
+    def close(self):
+        self._map.close()
+
+    def distance(self, state):
+        """Fewest clicks to win from `state`, or None when it cannot be won."""
+        value = self._map[state]
+        return None if value == UNREACHABLE else value
+
+    def best_click(self, state):
+        """A (row, col) click that brings `state` one move closer to winning, or None."""
+        distance = self._map[state]
+        if distance == UNREACHABLE or distance == 0:
+            return None
+        table = self._map
+        for index, mask in enumerate(self._masks):
+            if table[state ^ mask] < distance:
+                return divmod(index, self.cols)
+        return None
+
+
+def load_distance_table(rows=5, cols=5, directory=None):
+    """Maps the table for this board size if it was built, else returns None."""
+    try:
+        return DistanceTable(rows, cols, directory)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    build_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    build_cols = int(sys.argv[2]) if len(sys.argv) > 2 else build_rows
+    started = time.perf_counter()
+    result = build_distance_table(build_rows, build_cols)
+    print(f"Built {build_rows}x{build_cols} table in {time.perf_counter() - started:.1f}s")
+    print(json.dumps(result, indent=2))
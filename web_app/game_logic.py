@@ -1,93 +1,165 @@
+try:
+    from .rules import CLASSIC, compile_rule, compile_row_stencil
+except ImportError:
+    from rules import CLASSIC, compile_rule, compile_row_stencil
+
 LIGHT_OFF = "\U0001F7E5"  # Red square
 LIGHT_ON = "\U0001F7E8"   # Yellow square
+# Largest board (in cells) whose Game keeps a full toggle mask per cell: a
+# table costs (rows * cols)^2 bits, 2 MB here. Larger boards build each
+# click's mask from the rule's row-local stencil instead.
+MAX_MASK_TABLE_CELLS = 4096
+
+
+def get_toggle_masks(rows, cols, rule=CLASSIC):
+    """
+    Returns a tuple with one integer mask per cell (index = row * cols + col).
+    Each mask has the bits of the cells toggled by a click there set (with the
+    classic rule, the cell itself and its direct N, S, E, W neighbors), so a
+    click is a single XOR against the board bitmask. Compiled once per
+    (rule, rows, cols) and shared by every Game (up to MAX_MASK_TABLE_CELLS
+    cells), solver and generator.
+    """
+    return compile_rule(rule, rows, cols)
+
+
+def full_mask(rows, cols):
+    """Bitmask with every cell ON (the winning state)."""
+    return (1 << (rows * cols)) - 1
+
+
+def state_to_board(state, rows, cols):
+    """Renders a board bitmask as the 2D list of emoji characters used by the API."""
+    board = []
+    for row in range(rows):
+        row_bits = state >> (row * cols)
+        board.append([LIGHT_ON if (row_bits >> col) & 1 else LIGHT_OFF for col in range(cols)])
+    return board
+
+
+def board_to_state(board):
+    """Parses a 2D list of emoji characters back into a board bitmask."""
+    state = 0
+    index = 0
+    for row in board:
+        for cell in row:
+            if cell == LIGHT_ON:
+                state |= 1 << index
+            index += 1
+    return state
+
 
 class Game:
     """
     Class representing the game board and its logic.    
     The board is a 2D grid of lights that can be toggled on and off.
     The game is won when all lights are ON.
+
+    Internally the board is a single integer: bit (row * cols + col) is set
+    when that light is ON. The emoji grid is only built by get_board().
+    `rule` (see rules.py) decides which cells a click toggles. Boards over
+    MAX_MASK_TABLE_CELLS cells have no mask table (`_masks` is None): each
+    click's mask is built from the row-local stencil, a few shifted rows.
     """
 
-    def __init__(self, rows=5, cols=5):
+    __slots__ = ('rows', 'cols', 'rule', 'state', '_masks', '_stencil', '_full')
+
+    def __init__(self, rows=5, cols=5, rule=CLASSIC):
         self.rows = rows
         self.cols = cols
-        self.board = [[LIGHT_OFF for _ in range(cols)] for _ in range(rows)]
+        self.rule = rule
+        if rows * cols <= MAX_MASK_TABLE_CELLS:
+            self._masks = get_toggle_masks(rows, cols, rule)
+            self._stencil = None
+        else:
+            self._masks = None
+            self._stencil = compile_row_stencil(rule, cols)
+        self._full = full_mask(rows, cols)
+        self.state = 0  # All lights OFF
 
     def get_board(self):
-        return self.board
+        return state_to_board(self.state, self.rows, self.cols)
+
+    @property
+    def board(self):
+        return self.get_board()
+
+    @board.setter
+    def board(self, board):
+        self.state = board_to_state(board)
 
     def _is_valid_cell(self, row, col):
         return 0 <= row < self.rows and 0 <= col < self.cols
 
+    def _mask(self, index):
+        """Toggle mask of a click on cell `index` (row * cols + col)."""
+        if self._masks is not None:
+            return self._masks[index]
+        rows, cols = self.rows, self.cols
+        row, col = divmod(index, cols)
+        mask = 0
+        for dr, bits in self._stencil[col]:
+            r = row + dr
+            if self.rule.wrap:
+                r %= rows
+            elif not 0 <= r < rows:
+                continue
+            mask |= bits << (r * cols)  # OR: offsets wrapping onto one cell toggle it once
+        return mask
+
     def _get_neighbors(self, row, col):
-        # Corrected to be 1-indexed for compatibility with original logic, then converted to 0-indexed
-        # The original verificaBorda logic seems to be 1-indexed based on its usage.
-        # However, the board here is 0-indexed. We need to be careful with conversion.
-        # For simplicity, this internal logic will remain 0-indexed.
-        # The toggle_cell method will handle 1-indexed input if that's how it's called from app.py
-
-        neighbors = []
-        # The cell itself
-        neighbors.append((row, col))
-        # Top
-        if row > 0:
-            neighbors.append((row - 1, col))
-        # Bottom
-        if row < self.rows - 1:
-            neighbors.append((row + 1, col))
-        # Left
-        if col > 0:
-            neighbors.append((row, col - 1))
-        # Right
-        if col < self.cols - 1:
-            neighbors.append((row, col + 1))
-        return neighbors
+        """Returns the (row, col) cells toggled by a click at (row, col), the cell itself included."""
+        mask = self._mask(row * self.cols + col)
+        return [divmod(index, self.cols) for index in range(self.rows * self.cols) if (mask >> index) & 1]
 
     def toggle_cell_and_neighbors(self, row, col):
         """
-        Toggles the state of the cell at (row, col) and its direct N, S, E, W neighbors.
+        Toggles the state of the cell at (row, col) and its neighbors under the
+        game's rule (direct N, S, E, W neighbors with the classic rule).
         Assumes row and col are 0-indexed.
         """
         if not self._is_valid_cell(row, col):
             # Or raise an error, depending on desired behavior
             return
 
-        cells_to_toggle = []
-        # The cell itself
-        cells_to_toggle.append((row, col))
-        # Top neighbor
-        if row > 0:
-            cells_to_toggle.append((row - 1, col))
-        # Bottom neighbor
-        if row < self.rows - 1:
-            cells_to_toggle.append((row + 1, col))
-        # Left neighbor
-        if col > 0:
-            cells_to_toggle.append((row, col - 1))
-        # Right neighbor
-        if col < self.cols - 1:
-            cells_to_toggle.append((row, col + 1))
-        
-        for r, c in cells_to_toggle:
-            if self._is_valid_cell(r, c):
-                if self.board[r][c] == LIGHT_OFF:
-                    self.board[r][c] = LIGHT_ON
-                else:
-                    self.board[r][c] = LIGHT_OFF
+        self.state ^= self._mask(row * self.cols + col)
+
+    def apply_moves(self, cells):
+        """
+        Applies a sequence of clicks given as cell indices (row * cols + col).
+        The masks are folded into one XOR, so the board changes in a single step.
+        Indices are assumed to be valid.
+        """
+        masks = self._masks
+        combined = 0
+        if masks is None:
+            for index in cells:
+                combined ^= self._mask(index)
+        else:
+            for index in cells:
+                combined ^= masks[index]
+        self.state ^= combined
 
     def check_win(self):
         """
         Checks if all lights on the board are ON.
         Returns True if all lights are ON, False otherwise.
         """
-        for r in range(self.rows):
-            for c in range(self.cols):
-                if self.board[r][c] == LIGHT_OFF:
-                    return False
-        return True
+        return self.state == self._full
 
     def reset_board(self):
-        self.board = [[LIGHT_OFF for _ in range(self.cols)] for _ in range(self.rows)]
+        self.state = 0
+
+    def solve(self):
+        """
+        Returns the minimal list of (row, col) clicks that lights every cell
+        from the current board, or None if the board cannot be won.
+        """
+        try:
+            from .solver import solve_state
+        except ImportError:
+            from solver import solve_state
+        return solve_state(self.state, self.rows, self.cols, self.rule)
 
 # Example usage (not part of the library, just for testing)
 if __name__ == '__main__':
@@ -103,35 +175,16 @@ if __name__ == '__main__':
     
     print(f"\nWin condition: {game.check_win()}")
 
-    # Test case based on original verificaBorda for center piece (2,2) -> 0-indexed (1,1)
-    # Original input (3,3) -> 0-indexed (2,2)
-    # Expected toggles: (2,2), (1,2), (2,1), (3,2), (2,3)
+    # Center piece (2,2) toggles (2,2), (1,2), (2,1), (3,2), (2,3)
     game.reset_board()
     print("\nToggling cell (2,2) (0-indexed):")
     game.toggle_cell_and_neighbors(2,2)
-    # Expected:
-    # X O X X X
-    # O O O X X
-    # X O X X X
-    # X X X X X
-    # X X X X X
-    # (if original was all X)
-    # After toggle:
-    # board[2][2] = O
-    # board[1][2] = O
-    # board[2][1] = O
-    # board[3][2] = O
-    # board[2][3] = O
     for row_idx, row_val in enumerate(game.get_board()):
         print(f"Row {row_idx}: {row_val}")
 
     print(f"\nWin condition: {game.check_win()}")
 
-    # Make all lights ON to test win condition
-    # This is a bit of a hacky way to turn them all on for testing
-    # by repeatedly toggling the center of a 3x3 subgrid
-    # For a 5x5, this is more complex.
-    # Let's manually set them for a clear win test
+    # Manually set every light ON for a clear win test
     game.board = [[LIGHT_ON for _ in range(5)] for _ in range(5)]
     print("\nAll lights ON board:")
     for row in game.get_board():
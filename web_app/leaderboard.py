@@ -0,0 +1,162 @@
+"""
+Order-statistics leaderboard over move counts.
+
+Scores are grouped in one bucket per distinct move count, the distinct
+counts are kept sorted, and a Fenwick (binary indexed) tree over the bucket
+sizes, in that order, answers prefix counts. That gives:
+
+    add a score              O(log D), O(D) for a new count below the worst
+    rank of a move count     O(log D)
+    percentile               O(log D)
+    page K of size P         O(log D + P)
+
+where D is the number of distinct move counts, not the largest one: a
+single very long game costs one slot, not one slot per move. Scores with
+the same move count keep their insertion order, so ties rank first-come
+first-served. Each score is stored as a small tuple, so millions of them
+fit in memory.
+"""
+from bisect import bisect_left, bisect_right
+
+# Below this many scores, extend() adds them one by one to a non-empty board
+# instead of rebuilding the tree
+_BULK_LOAD_MIN = 64
+
+
+class Leaderboard:
+
+    def __init__(self):
+        self._counts = []   # Distinct move counts, ascending; slot i + 1 is _counts[i]
+        self._tree = [0]    # Fenwick tree over the bucket sizes, 1-based
+        self._buckets = {}  # Move count -> list of (name, moves, date)
+        self._total = 0
+        self._top = None    # (count, best scores) until the next add
+
+    def __len__(self):
+        return self._total
+
+    def _rebuild(self):
+        """Rebuilds the tree from the bucket sizes in linear time."""
+        buckets = self._buckets
+        tree = [0] + [len(buckets[moves]) for moves in self._counts]
+        size = len(tree) - 1
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        self._tree = tree
+
+    def _new_slot(self, moves):
+        """Adds an empty bucket for a move count not seen before."""
+        self._buckets[moves] = []
+        counts = self._counts
+        if counts and moves < counts[-1]:
+            counts.insert(bisect_left(counts, moves), moves)
+            self._rebuild()
+            return
+        # A new worst count is the next slot: its tree node sums the slots it covers
+        counts.append(moves)
+        slot = len(counts)
+        self._tree.append(self._prefix(slot - 1) - self._prefix(slot - (slot & -slot)))
+
+    def _prefix(self, slot):
+        """Number of scores in slots 1..slot."""
+        total = 0
+        tree = self._tree
+        while slot > 0:
+            total += tree[slot]
+            slot -= slot & -slot
+        return total
+
+    def _find(self, position):
+        """Returns (slot, offset in its bucket) of the score at 0-based `position`."""
+        slot = 0
+        tree = self._tree
+        size = len(tree) - 1
+        step = 1 << (size.bit_length() - 1) if size else 0
+        while step:
+            following = slot + step
+            if following <= size and tree[following] <= position:
+                slot = following
+                position -= tree[following]
+            step >>= 1
+        return slot + 1, position
+
+    def add(self, name, moves, date_str):
+        bucket = self._buckets.get(moves)
+        if bucket is None:
+            self._new_slot(moves)
+            bucket = self._buckets[moves]
+        bucket.append((name, moves, date_str))
+        self._top = None
+        self._total += 1
+        tree = self._tree
+        size = len(tree) - 1
+        slot = bisect_left(self._counts, moves) + 1
+        while slot <= size:
+            tree[slot] += 1
+            slot += slot & -slot
+
+    def extend(self, scores):
+        """Adds many (name, moves, date) scores, in order, in time linear in their number."""
+        scores = list(scores)
+        if self._total and len(scores) < _BULK_LOAD_MIN:
+            for name, moves, date_str in scores:
+                self.add(name, moves, date_str)
+            return
+        buckets = self._buckets
+        for score in scores:
+            bucket = buckets.get(score[1])
+            if bucket is None:
+                bucket = buckets[score[1]] = []
+            bucket.append(score)
+        self._total += len(scores)
+        self._top = None
+        if len(buckets) != len(self._counts):
+            self._counts = sorted(buckets)
+        self._rebuild()
+
+    def rank_of(self, moves):
+        """1-based rank of a score of `moves`; ties share the best rank."""
+        return self._prefix(bisect_left(self._counts, moves)) + 1
+
+    def count_above(self, moves):
+        """Number of scores that needed more moves than `moves`."""
+        return self._total - self._prefix(bisect_right(self._counts, moves))
+
+    def percentile(self, moves):
+        """Percentage of the recorded scores that needed more moves than `moves`."""
+        if not self._total:
+            return 100.0
+        return 100.0 * self.count_above(moves) / self._total
+
+    def _slice(self, position, end):
+        """Scores at 0-based positions position..end-1, best first, as stored tuples."""
+        result = []
+        end = min(end, self._total)
+        if position >= end:
+            return result
+        slot, offset = self._find(position)
+        counts = self._counts
+        buckets = self._buckets
+        # Every slot holds at least one score, so the range is read off consecutive buckets
+        while position < end:
+            taken = buckets[counts[slot - 1]][offset:offset + end - position]
+            result.extend(taken)
+            position += len(taken)
+            slot, offset = slot + 1, 0
+        return result
+
+    def page(self, page, size):
+        """Scores on page `page` (0-based) of `size` scores, best first, as dicts."""
+        if page < 0 or size <= 0:
+            return []
+        return [{'name': name, 'moves': moves, 'date': date_str}
+                for name, moves, date_str in self._slice(page * size, (page + 1) * size)]
+
+    def top(self, count):
+        """Best `count` scores; the slice is reused until the next score is added."""
+        cached = self._top
+        if cached is None or cached[0] != count:
+            cached = self._top = (count, self._slice(0, count))
+        return [{'name': name, 'moves': moves, 'date': date_str} for name, moves, date_str in cached[1]]
@@ -0,0 +1,157 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, histograms with fixed buckets and callback gauges, each optionally
+split by labels. Recording is a dict lookup plus an addition under a lock,
+cheap enough for the click path. REGISTRY.render() produces the text served
+by /metrics.
+"""
+import threading
+from bisect import bisect_left
+
+# Request latencies in seconds, from 50µs to 2.5s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = ",".join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs)
+    return "{" + escaped + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=None):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, labels=None):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=None):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1  # Index len(buckets) is the +Inf overflow bucket
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, labels=None):
+        series = self._series.get(_label_key(labels))
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, func):
+        self.name = name
+        self.help = help_text
+        self.func = func
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(self.func())}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def gauge(self, name, help_text, func):
+        """Registers (or replaces) a callback gauge."""
+        gauge = Gauge(name, help_text, func)
+        self._metrics[name] = gauge
+        return gauge
+
+    def render(self):
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'jogo_http_request_duration_seconds', "Time spent handling HTTP requests, by route.")
+REQUESTS = REGISTRY.counter(
+    'jogo_http_requests_total', "HTTP requests handled, by route, method and status.")
+RANKING_IO_LATENCY = REGISTRY.histogram(
+    'jogo_ranking_io_duration_seconds', "Time spent reading or writing the ranking file.")
+GAMES_STARTED = REGISTRY.counter('jogo_games_started_total', "Games started (new sessions and resets).")
+GAMES_WON = REGISTRY.counter('jogo_games_won_total', "Games in which every light was turned on.")
+GAMES_ABANDONED = REGISTRY.counter(
+    'jogo_games_abandoned_total', "Unfinished games that were reset, evicted or expired.")
+SCORE_BATCH_SIZE = REGISTRY.histogram(
+    'jogo_score_batch_size', "Scores written to the ranking per group commit.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500))
+SCORES_REJECTED = REGISTRY.counter(
+    'jogo_scores_rejected_total', "Score submissions refused because the write queue was full.")
@@ -0,0 +1,213 @@
+"""
+Pre-generated pool of solvable starting boards, grouped in difficulty tiers.
+
+A puzzle is built by clicking random cells on the all-ON board, which makes
+it solvable by construction; the solver then gives its optimal move count,
+which decides the tier. Tiers are fractions of the largest optimal move
+count the rule allows on the board (solver.max_optimal_moves), so every
+rule gets all the tiers its boards can reach. A background thread keeps a
+bounded deque per (rows, cols, rule, tier) topped up, so handing out a
+puzzle is a popleft.
+"""
+import random
+import threading
+from collections import OrderedDict, deque, namedtuple
+
+try:
+    from .game_logic import get_toggle_masks, full_mask
+    from .solver import get_solver, max_optimal_moves, _popcount
+    from .rules import CLASSIC, PRESETS
+except ImportError:
+    from game_logic import get_toggle_masks, full_mask
+    from solver import get_solver, max_optimal_moves, _popcount
+    from rules import CLASSIC, PRESETS
+
+# Upper bound of each tier, as a fraction of the rule's largest optimal move count
+# (on the classic 5x5 board, 15: easy 1-6, medium 7-11, hard 12-15)
+TIERS = (('easy', 0.4), ('medium', 0.75), ('hard', 1.0))
+TIER_NAMES = tuple(name for name, _ in TIERS)
+DEFAULT_POOL_SIZE = 64  # Puzzles kept ready per (rows, cols, rule, tier)
+MAX_ATTEMPTS = 200      # Puzzles generated in search of one tier before settling for the nearest
+MAX_CUSTOM_BOARDS = 16  # Custom-stencil boards pooled at once; the least recently used is dropped
+
+Puzzle = namedtuple('Puzzle', 'rows cols state optimal_moves tier seed rule', defaults=(CLASSIC,))
+
+
+def tier_for(optimal_moves, rows, cols, rule=CLASSIC):
+    longest = max_optimal_moves(rows, cols, rule)
+    for name, fraction in TIERS:
+        if optimal_moves <= fraction * longest:
+            return name
+    return TIERS[-1][0]
+
+
+def _tier_move_range(tier, rows, cols, rule=CLASSIC):
+    """Optimal move counts (low, high) of `tier`; empty (low > high) if none is possible."""
+    longest = max_optimal_moves(rows, cols, rule)
+    lower = 0.0
+    for name, fraction in TIERS:
+        if name == tier:
+            return int(lower * longest) + 1, int(fraction * longest)
+        lower = fraction
+    raise ValueError(f"Unknown tier: {tier}")
+
+
+def reachable_tiers(rows, cols, rule=CLASSIC):
+    """Tiers with at least one possible optimal move count on this board and rule."""
+    tiers = []
+    for tier in TIER_NAMES:
+        low, high = _tier_move_range(tier, rows, cols, rule)
+        if low <= high:
+            tiers.append(tier)
+    return tuple(tiers)
+
+
+def nearest_tier(tier, rows, cols, rule=CLASSIC):
+    """`tier` if the board can reach it, otherwise the closest tier it can reach."""
+    tiers = reachable_tiers(rows, cols, rule)
+    position = TIER_NAMES.index(tier)
+    return min(tiers, key=lambda name: (abs(TIER_NAMES.index(name) - position), TIER_NAMES.index(name)))
+
+
+def generate_puzzle(rows, cols, tier=None, seed=None, rule=CLASSIC):
+    """
+    Generates one puzzle from `seed` (random if None). When `tier` is given the
+    scramble length is chosen for that tier, but the returned puzzle's tier is
+    always the one its optimal move count actually falls in. The scramble and
+    the solver use the same toggle table of `rule`.
+    """
+    if seed is None:
+        seed = random.getrandbits(63)
+    rng = random.Random(seed)
+    cells = rows * cols
+    # A scramble of k clicks needs at most k moves, so the tier's move range is a good click count
+    low, high = _tier_move_range(tier, rows, cols, rule) if tier else (1, cells)
+    high = max(1, high)
+    clicks = rng.sample(range(cells), min(cells, rng.randint(min(low, high), high)))
+    masks = get_toggle_masks(rows, cols, rule)
+    goal = full_mask(rows, cols)
+    state = goal
+    for index in clicks:
+        state ^= masks[index]
+    solution = get_solver(rows, cols, rule).minimal_solution(state ^ goal)
+    optimal = _popcount(solution)
+    return Puzzle(rows, cols, state, optimal, tier_for(optimal, rows, cols, rule), seed, rule)
+
+
+class PuzzlePool:
+    """
+    Thread-safe pool of ready puzzles per (rows, cols, rule, tier), refilled by a
+    daemon thread. pop() never waits for the thread: if a pool is empty the
+    puzzle is generated on the spot. Only the tiers a board can reach get a
+    pool; asking for another one gives a puzzle of the nearest tier. Custom
+    stencils are pooled like presets, for the MAX_CUSTOM_BOARDS most recent.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, board_sizes=((5, 5),)):
+        self.size = size
+        self._pools = {}
+        self._custom = OrderedDict() # (rows, cols, rule) -> tiers, least recently used first
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        for rows, cols in board_sizes:
+            self._register(rows, cols)
+
+    def _register(self, rows, cols, rule=CLASSIC):
+        tiers = reachable_tiers(rows, cols, rule)
+        with self._lock:
+            if rule.name not in PRESETS:
+                self._custom[(rows, cols, rule)] = tiers
+                if len(self._custom) > MAX_CUSTOM_BOARDS:
+                    (old_rows, old_cols, old_rule), old_tiers = self._custom.popitem(last=False)
+                    for tier in old_tiers:
+                        self._pools.pop((old_rows, old_cols, old_rule, tier), None)
+            for tier in tiers:
+                self._pools.setdefault((rows, cols, rule, tier), deque(maxlen=self.size))
+
+    def start(self):
+        """Starts the refill thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="puzzle-pool", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def available(self, rows, cols, tier, rule=CLASSIC):
+        pool = self._pools.get((rows, cols, rule, tier))
+        return len(pool) if pool is not None else 0
+
+    def pop(self, rows, cols, tier, rule=CLASSIC):
+        """
+        Returns a ready puzzle of the given size, tier and rule in O(1). A tier
+        the board cannot reach is replaced by the nearest one; check the puzzle's tier.
+        """
+        if tier not in TIER_NAMES:
+            raise ValueError(f"Unknown tier: {tier}")
+        tier = nearest_tier(tier, rows, cols, rule)
+        key = (rows, cols, rule, tier)
+        pool = self._pools.get(key)
+        if pool is None:
+            self._register(rows, cols, rule)
+            pool = self._pools.get(key, deque()) # Another custom board may have dropped it already
+        elif rule.name not in PRESETS:
+            with self._lock:
+                if (rows, cols, rule) in self._custom:
+                    self._custom.move_to_end((rows, cols, rule))
+        self._wakeup.set()
+        try:
+            return pool.popleft()
+        except IndexError:
+            return self._generate_for(rows, cols, tier, rule)
+
+    def _generate_for(self, rows, cols, tier, rule=CLASSIC):
+        """
+        Generates until a puzzle of `tier` comes out; the others are pooled, not
+        wasted. After MAX_ATTEMPTS puzzles it settles for the one whose tier is
+        nearest, so a tier that is merely rare never stalls the caller.
+        """
+        wanted = TIER_NAMES.index(tier)
+        nearest = None
+        for _ in range(MAX_ATTEMPTS):
+            puzzle = generate_puzzle(rows, cols, tier, rule=rule)
+            if puzzle.optimal_moves == 0:
+                continue
+            if puzzle.tier == tier:
+                return puzzle
+            if nearest is None or (abs(TIER_NAMES.index(puzzle.tier) - wanted)
+                                   < abs(TIER_NAMES.index(nearest.tier) - wanted)):
+                puzzle, nearest = nearest, puzzle
+                if puzzle is None:
+                    continue
+            pool = self._pools.get((rows, cols, rule, puzzle.tier))
+            if pool is not None and len(pool) < self.size:
+                pool.append(puzzle)
+        if nearest is None: # Only the solved board came out (a board with no other state)
+            nearest = generate_puzzle(rows, cols, tier, rule=rule)
+        return nearest
+
+    def fill(self):
+        """Tops up every pool once. Returns the number of puzzles added."""
+        added = 0
+        for (rows, cols, rule, tier), pool in list(self._pools.items()):
+            while len(pool) < self.size and not self._stop.is_set():
+                puzzle = self._generate_for(rows, cols, tier, rule)
+                if puzzle.tier != tier:
+                    break # Too rare to pool ahead of time; pop() generates it on demand
+                pool.append(puzzle)
+                added += 1
+        return added
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            self.fill()
+            self._wakeup.wait()
@@ -0,0 +1,220 @@
+"""
+Live leaderboard updates for /api/ranking/stream (server-sent events).
+
+One producer thread serves every subscriber. A feed is a board and the
+size of the first page the client shows, (rows, cols, variant, size), so
+the stream covers every row that page renders. While a feed has
+subscribers it checks the board's rankings version (a stat, see
+ranking_utils.get_rankings_version) once per coalescing window, so any
+number of scores written in one window, by this process or another, cost a
+single read of the first page. The new page is compared with the last one
+and, if it or the total changed, the diff is encoded once and the same
+bytes are queued to every subscriber of that feed.
+
+Events (the "data" field is JSON):
+    snapshot  {"version": n, "total": t, "entries": [{"rank", "name", "moves", "date"}, ...]}
+    diff      {"version": n, "size": k, "total": t, "changes": [[rank, name, moves, date], ...]}
+A diff lists only the positions that changed; the client truncates its
+list to `size` entries and replaces the listed ranks. A new score shifts
+every row below it, so those rows are all in the diff. A subscriber that
+falls more than SUBSCRIBER_BUFFER events behind gets a fresh snapshot
+instead of the missed diffs.
+"""
+import json
+import queue
+import threading
+import time
+
+try:
+    from .ranking_utils import get_ranking_page, get_rankings_version, DEFAULT_PAGE_SIZE
+except ImportError:
+    from ranking_utils import get_ranking_page, get_rankings_version, DEFAULT_PAGE_SIZE
+
+COALESCE_SECONDS = 0.5   # Writes within one window produce one update
+SUBSCRIBER_BUFFER = 64   # Events queued per subscriber before it is resynchronized
+HEARTBEAT_SECONDS = 15   # Comment lines keep idle connections open through proxies
+
+
+def format_event(event, data):
+    """Encodes one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf-8')
+
+
+def load_top(rows, cols, variant, size=DEFAULT_PAGE_SIZE):
+    """
+    (first `size` entries, total scores) of a board, without creating the
+    ranking file of a board nobody has played.
+    """
+    if get_rankings_version(rows, cols, variant)[2] is None:
+        return [], 0
+    return get_ranking_page(0, size, rows, cols, variant)
+
+
+def top_version(rows, cols, variant):
+    """Rankings version of the feed's board."""
+    return get_rankings_version(rows, cols, variant)
+
+
+def diff_entries(old, new):
+    """Positions of `new` that differ from `old`, as [rank, name, moves, date] lists."""
+    changes = []
+    for position, entry in enumerate(new):
+        if position >= len(old) or old[position] != entry:
+            changes.append([position + 1, entry['name'], entry['moves'], entry['date']])
+    return changes
+
+
+class Subscription:
+    """One open stream: a bounded queue of encoded events."""
+
+    def __init__(self, board):
+        self.board = board
+        self.events = queue.Queue(SUBSCRIBER_BUFFER)
+        self.lagging = False
+
+    def push(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.lagging = True # Resynchronized with a snapshot by the reader
+
+    def next_event(self, timeout):
+        """Returns the next encoded event, or None after `timeout` seconds without one."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _BoardFeed:
+    """Last published first page and total of one feed, and its subscribers."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.rankings_version = None
+        self.version = 0
+        self.entries = None
+        self.total = 0
+
+
+class RankingBroadcaster:
+    """
+    Fans leaderboard changes out to subscribers. Boards are the arguments of
+    `load`, (rows, cols, variant, page size) tuples by default; `version_of`
+    takes the first three, as a page size shares its rankings version. The
+    producer thread starts with the first subscriber and exits once a window
+    passes without any.
+    """
+
+    def __init__(self, window=COALESCE_SECONDS, load=load_top, version_of=top_version):
+        self.window = window
+        self._load = load
+        self._version_of = version_of
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(feed.subscribers) for feed in self._feeds.values())
+
+    def subscribe(self, board):
+        """Registers a subscriber to `board`; its first event is the current snapshot."""
+        subscription = Subscription(board)
+        with self._lock:
+            feed = self._feeds.get(board)
+            if feed is None:
+                feed = self._feeds[board] = _BoardFeed()
+            feed.subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ranking-stream', daemon=True)
+                self._thread.start()
+            loaded = feed.entries is not None
+            if loaded:
+                subscription.push(self._snapshot_event(feed))
+        if not loaded:
+            self.refresh(board) # First subscriber of the board: one read, shared by the next ones
+            with self._lock:
+                subscription.push(self._snapshot_event(feed))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            feed = self._feeds.get(subscription.board)
+            if feed is not None:
+                feed.subscribers.discard(subscription)
+                if not feed.subscribers:
+                    del self._feeds[subscription.board]
+
+    def resynchronize(self, subscription):
+        """Replaces whatever a lagging subscriber has queued with a fresh snapshot."""
+        with self._lock:
+            while subscription.next_event(0) is not None:
+                pass
+            subscription.lagging = False
+            feed = self._feeds.get(subscription.board)
+            if feed is not None:
+                subscription.push(self._snapshot_event(feed))
+
+    @staticmethod
+    def _snapshot_event(feed):
+        entries = feed.entries or []
+        return format_event('snapshot', {'version': feed.version, 'total': feed.total, 'entries': [
+            dict(entry, rank=position + 1) for position, entry in enumerate(entries)]})
+
+    def refresh(self, board):
+        """
+        Reloads the top of `board` if its rankings changed and queues the diff
+        to its subscribers. Returns True if a diff was published.
+        """
+        rankings_version = self._version_of(*board[:3])
+        with self._lock:
+            feed = self._feeds.get(board)
+            if feed is None or feed.rankings_version == rankings_version:
+                return False
+        entries, total = self._load(*board)
+        with self._lock:
+            if feed.rankings_version == rankings_version:
+                return False # Another caller got here first
+            feed.rankings_version = rankings_version
+            old, feed.entries = feed.entries, entries
+            old_total, feed.total = feed.total, total
+            if old is None:
+                return False
+            changes = diff_entries(old, entries)
+            if not changes and len(old) == len(entries) and old_total == total:
+                return False
+            feed.version += 1
+            event = format_event('diff', {'version': feed.version, 'size': len(entries), 'total': total,
+                                          'changes': changes})
+            # Queued under the lock, so a diff never overtakes the snapshot it applies to
+            for subscription in feed.subscribers:
+                subscription.push(event)
+            return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            with self._lock:
+                boards = list(self._feeds)
+                if not boards:
+                    # Last subscriber gone: the next subscribe() starts a new producer
+                    self._thread = None
+                    return
+            for board in boards:
+                try:
+                    self.refresh(board)
+                except Exception as e:
+                    print(f"Error refreshing ranking stream {board}: {e}")
+
+    def stream(self, board, heartbeat=HEARTBEAT_SECONDS):
+        """Generator of encoded events for one client; unsubscribes when the client goes away."""
+        subscription = self.subscribe(board)
+        try:
+            while True:
+                if subscription.lagging:
+                    self.resynchronize(subscription)
+                event = subscription.next_event(heartbeat)
+                yield event if event is not None else b": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
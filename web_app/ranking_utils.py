@@ -1,95 +1,432 @@
 import os
+import threading
+import time
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking is available
+    fcntl = None
+
+try:
+    from .solver import optimal_moves
+    from .metrics import RANKING_IO_LATENCY
+    from .leaderboard import Leaderboard
+    from .rules import CLASSIC
+except ImportError:
+    from solver import optimal_moves
+    from metrics import RANKING_IO_LATENCY
+    from leaderboard import Leaderboard
+    from rules import CLASSIC
+
 # Constants
-# Path to the ranking file. In a real-world scenario, this should be an absolute path.
+# Path to the ranking file of the classic 5x5 board. In a real-world scenario, this should be an absolute path.
+# Other board sizes and rule variants keep their own board next to it (see ranking_file_path).
 RANKING_FILE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "ranking_jogo.txt"))
-MAX_RANKING_ENTRIES = 10 # Store top 10 scores
+MAX_RANKING_ENTRIES = 10 # Scores returned by get_rankings (the top of the board)
+# The ranking file is an append-only log: one "name,moves,date" record per line.
+# Every score is kept unless MAX_STORED_ENTRIES is set; then, once the file holds
+# COMPACTION_THRESHOLD records more than that, it is compacted back to the best ones.
+MAX_STORED_ENTRIES = None
+COMPACTION_THRESHOLD = 1000
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+LOCK_FILE_SUFFIX = ".lock"
+MAX_NAME_LENGTH = 50
+# Bytes before the read offset remembered to detect a file rewritten in place
+_FINGERPRINT_SIZE = 64
+
 
-def get_rankings():
+class _ReadWriteLock:
     """
-    Reads ranking_jogo.txt, parses lines, sorts by moves (ascending),
-    and returns a list of dictionaries.
-    Each dictionary: {'name': str, 'moves': int, 'date': str}
+    Thread lock of one ranking file: any number of readers at a time, or a
+    single writer. Waiting writers go first, so a steady stream of readers
+    cannot hold a score back.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    def acquire(self, shared):
+        with self._condition:
+            if shared:
+                while self._writing or self._writers_waiting:
+                    self._condition.wait()
+                self._readers += 1
+            else:
+                self._writers_waiting += 1
+                while self._writing or self._readers:
+                    self._condition.wait()
+                self._writers_waiting -= 1
+                self._writing = True
+
+    def release(self, shared):
+        with self._condition:
+            if shared:
+                self._readers -= 1
+            else:
+                self._writing = False
+            self._condition.notify_all()
+
+
+def _thread_lock(path):
+    """The _ReadWriteLock of one ranking file, created on first use."""
+    lock = _thread_locks.get(path)
+    if lock is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(path, _ReadWriteLock())
+    return lock
+
+
+class _FileLock:
+    """
+    Inter-process lock on a sidecar file (never replaced by compaction, unlike
+    the ranking file itself), combined with the thread lock of the same file
+    for this process. Shared holders of one file run concurrently; files of
+    other board sizes and variants never wait for each other.
+    """
+
+    def __init__(self, path, shared=False):
+        self.path = path + LOCK_FILE_SUFFIX
+        self.shared = shared
+        self._thread_lock = _thread_lock(path)
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire(self.shared)
+        if fcntl is not None:
+            try:
+                # One descriptor per holder: flock locks belong to the open file, so
+                # shared holders in this process don't conflict and exclusive ones do
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+            except OSError:
+                # Read-only directory: fall back to in-process locking only
+                if self._fd is not None:
+                    os.close(self._fd)
+                self._fd = None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._fd is not None:
+            os.close(self._fd)  # Closing the descriptor releases the flock
+            self._fd = None
+        self._thread_lock.release(self.shared)
+
+
+class _RankingIndex:
+    """
+    In-memory leaderboard of one ranking file, kept in sync by reading only
+    the bytes appended since the last read. A file that was replaced,
+    truncated or rewritten in place is detected and re-read from scratch.
+    """
+
+    def __init__(self):
+        # Readers holding the shared lock may sync concurrently: one at a time parses
+        self.sync_lock = threading.Lock()
+        # Guards only the in-memory leaderboard, so get_cached_rank never waits for file I/O
+        self.board_lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        with self.board_lock:
+            self.board = Leaderboard()
+            self.signature = None  # Not loaded: get_cached_rank answers None
+        self.offset = 0    # Bytes of the file already parsed (always at a line boundary)
+        self.fingerprint = b""
+
+    def _parse(self, data):
+        scores = []
+        # Decoded in one go: data ends at a line boundary, and b"\n" never occurs inside a UTF-8 character
+        for line in data.decode("utf-8", errors="replace").split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            entry = parse_record(line)
+            if entry is None:
+                print(f"Warning: Skipping malformed line in ranking file: {line}")
+                continue
+            scores.append((entry['name'], entry['moves'], entry['date']))
+        with self.board_lock:
+            self.board.extend(scores)
+
+    def sync(self, f):
+        """Brings the index up to date with the open ranking file `f` (binary mode)."""
+        with self.sync_lock:
+            self._sync(f)
+
+    def _sync(self, f):
+        stat = os.fstat(f.fileno())
+        signature = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if signature == self.signature:
+            return
+        appended = (self.signature is not None
+                    and self.signature[:2] == signature[:2]
+                    and stat.st_size >= self.offset
+                    and self._read_fingerprint(f) == self.fingerprint)
+        if not appended:
+            self._clear()
+        f.seek(self.offset)
+        data = f.read(stat.st_size - self.offset)
+        # Leave a partially written last line for the next sync
+        end = data.rfind(b"\n") + 1
+        self._parse(data[:end])
+        self.offset += end
+        self.fingerprint = self._read_fingerprint(f)
+        self.signature = signature
+
+    def _read_fingerprint(self, f):
+        start = max(0, self.offset - _FINGERPRINT_SIZE)
+        f.seek(start)
+        return f.read(self.offset - start)
+
+
+_thread_locks = {} # Ranking file path -> _ReadWriteLock
+_thread_locks_guard = threading.Lock()
+_indexes = {} # Ranking file path -> _RankingIndex
+_generation = 0 # Bumped on every write from this process
+
+
+def _index_for(path):
+    """The _RankingIndex of one ranking file, created on first use."""
+    index = _indexes.get(path)
+    if index is None:
+        with _thread_locks_guard:
+            index = _indexes.setdefault(path, _RankingIndex())
+    return index
+
+
+def ranking_file_path(rows=5, cols=5, variant=CLASSIC.name):
+    """
+    Ranking file of one board size and rule variant (rules.rule_slug); each
+    has a separate leaderboard.
     """
-    if not os.path.exists(RANKING_FILE_PATH):
-        # Create the file if it doesn't exist to prevent errors on first run
-        try:
-            with open(RANKING_FILE_PATH, "w", encoding="utf-8") as f:
-                pass # Just create an empty file
-        except IOError:
-            # If running in a read-only environment or other permission issues
-            return [] 
+    if (rows, cols, variant) == (5, 5, CLASSIC.name):
+        return RANKING_FILE_PATH
+    suffix = "" if variant == CLASSIC.name else f"_{variant}"
+    return os.path.join(os.path.dirname(RANKING_FILE_PATH), f"ranking_jogo_{rows}x{cols}{suffix}.txt")
+
+
+def sanitize_name(name):
+    """Trims the name, removes line breaks (which would split a record) and limits its length."""
+    name = " ".join(name.splitlines()).strip()
+    return name[:MAX_NAME_LENGTH]
+
 
+def format_record(name, moves, date_str):
+    return f"{name},{moves},{date_str}\n"
 
-    rankings = []
+
+def parse_record(line):
+    """
+    Parses a "name,moves,date" record. The name may itself contain commas,
+    so the record is split from the right. Returns None for malformed lines.
+    """
+    parts = line.rsplit(',', 2)
+    if len(parts) != 3:
+        return None
+    name, moves_str, date_str = parts
     try:
-        with open(RANKING_FILE_PATH, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                parts = line.split(',')
-                if len(parts) == 3:
-                    name, moves_str, date_str = parts
-                    try:
-                        moves = int(moves_str)
-                        rankings.append({'name': name, 'moves': moves, 'date': date_str})
-                    except ValueError:
-                        print(f"Warning: Skipping malformed line in ranking file: {line}")
-                        continue 
+        moves = int(moves_str)
+    except ValueError:
+        return None
+    return {'name': name, 'moves': moves, 'date': date_str}
+
+
+def _query(rows, cols, variant, query, default):
+    """
+    Runs query(leaderboard) on the up-to-date leaderboard of one board size
+    and variant, under the shared lock. Returns `default` if the file cannot be read.
+    """
+    path = ranking_file_path(rows, cols, variant)
+    started = time.perf_counter()
+    try:
+        with _FileLock(path, shared=True):
+            # "a+b" creates the file if it doesn't exist to prevent errors on first run
+            with open(path, "a+b") as f:
+                index = _index_for(path)
+                index.sync(f)
+                with index.board_lock:
+                    return query(index.board)
     except IOError:
-        print(f"Warning: Could not read ranking file: {RANKING_FILE_PATH}")
-        return [] # Return empty list if file cannot be read
+        # If running in a read-only environment or other permission issues
+        print(f"Warning: Could not read ranking file: {path}")
+        return default
+    finally:
+        RANKING_IO_LATENCY.observe(time.perf_counter() - started, {'operation': 'read'})
 
-    # Sort by moves (ascending), then by date (descending, optional, not in original)
-    rankings.sort(key=lambda x: x['moves'])
-    return rankings
 
-def add_score(name, moves, date_str=None):
+def get_rankings(rows=5, cols=5, variant=CLASSIC.name):
+    """
+    Reads the ranking file of the board size and variant and returns a list of dictionaries
+    with the top MAX_RANKING_ENTRIES scores, sorted by moves (ascending).
+    Each dictionary: {'name': str, 'moves': int, 'date': str}
+    Only the records appended since the previous call are actually parsed.
+    """
+    return _query(rows, cols, variant, lambda board: board.top(MAX_RANKING_ENTRIES), [])
+
+
+def get_ranking_page(page=0, page_size=DEFAULT_PAGE_SIZE, rows=5, cols=5, variant=CLASSIC.name):
+    """
+    Returns (scores on 0-based page `page`, total number of scores). Each score
+    is a dictionary like the ones from get_rankings.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    return _query(rows, cols, variant, lambda board: (board.page(page, page_size), len(board)), ([], 0))
+
+
+def get_rank(moves, rows=5, cols=5, variant=CLASSIC.name):
+    """
+    Where a score of `moves` stands: {'rank': int, 'percentile': float, 'total': int}.
+    Ties share the best rank; the percentile is the share of scores that needed more moves.
+    """
+    def query(board):
+        return {'rank': board.rank_of(moves), 'percentile': round(board.percentile(moves), 2),
+                'total': len(board)}
+    return _query(rows, cols, variant, query, {'rank': 1, 'percentile': 100.0, 'total': 0})
+
+
+def get_cached_rank(moves, rows=5, cols=5, variant=CLASSIC.name, pending=None):
+    """
+    Like get_rank, but answered from the leaderboard this process already
+    holds in memory, without the lock file, opening or stat-ing the ranking
+    file: the standing is as of this process's last read or write of it.
+    `pending` maps move counts to the number of scores not written yet
+    (see ScoreWriter), which are counted too. Returns None when the board
+    is not loaded in this process.
+    """
+    index = _indexes.get(ranking_file_path(rows, cols, variant))
+    if index is None:
+        return None
+    with index.board_lock:
+        if index.signature is None:
+            return None
+        board = index.board
+        better = board.rank_of(moves) - 1
+        worse = board.count_above(moves)
+        total = len(board)
+    for pending_moves, count in (pending or {}).items():
+        total += count
+        if pending_moves < moves:
+            better += count
+        elif pending_moves > moves:
+            worse += count
+    percentile = 100.0 * worse / total if total else 100.0
+    return {'rank': better + 1, 'percentile': round(percentile, 2), 'total': total}
+
+
+def get_rankings_version(rows=5, cols=5, variant=CLASSIC.name):
+    """
+    Cheap token that changes whenever the rankings may have changed: a write
+    counter for this process plus the file's identity, size and mtime (which
+    catch writes from other processes). Does not open or create the file;
+    returns None in the last slot when the file does not exist.
     """
-    Adds a new score to ranking_jogo.txt, then re-sorts and truncates to MAX_RANKING_ENTRIES.
+    path = ranking_file_path(rows, cols, variant)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path, _generation, None)
+    return (path, _generation, (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+
+
+def _compact(path, index):
+    """Rewrites the ranking file with only the best MAX_STORED_ENTRIES scores. Caller holds the exclusive lock."""
+    kept = index.board.top(MAX_STORED_ENTRIES)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write("".join(format_record(e['name'], e['moves'], e['date']) for e in kept).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    # The next sync sees a new inode and re-reads the compacted file.
+    index._clear()
+
+
+def add_score(name, moves, date_str=None, rows=5, cols=5, variant=CLASSIC.name):
+    """
+    Appends a new score to the ranking file of the board size and variant.
     name (str): Player's name
     moves (int): Number of moves
     date_str (str, optional): Date string. If None, current date/time will be used.
+
+    The record is appended under an exclusive file lock, so concurrent
+    submissions from several processes are never lost. Every score is kept
+    unless MAX_STORED_ENTRIES limits the board.
     """
     if date_str is None:
         # Using a simple date format, original used '%B %d, %Y %H:%M' with dateutil.tz
         # For simplicity and to avoid extra dependency, using standard datetime.
         date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    current_rankings = get_rankings() # This already handles empty/malformed entries
-
-    # Check if player already exists with a better or equal score for the same name
-    # The original code didn't explicitly handle this, it just added and re-sorted.
-    # For now, let's stick to adding and re-sorting. User can have multiple entries.
-
     # Basic sanitization for name
-    name = name.strip()
+    name = sanitize_name(name)
     if not name: # If name is empty after stripping, don't add score
         print("Warning: Empty name provided. Score not added.")
         return
-    
-    # Limit name length (e.g., to 50 characters)
-    name = name[:50]
-    
-    new_entry = {'name': name, 'moves': moves, 'date': date_str}
-    current_rankings.append(new_entry)
-    
-    # Sort by moves (ascending)
-    current_rankings.sort(key=lambda x: x['moves'])
-    
-    # Keep only top N scores
-    updated_rankings = current_rankings[:MAX_RANKING_ENTRIES]
-    
+
+    _append_records(ranking_file_path(rows, cols, variant), [(name, moves, date_str)])
+
+def add_scores(scores):
+    """
+    Appends many scores at once: (name, moves, date_str, rows, cols, variant) tuples.
+    Each ranking file touched gets one locked write and one fsync for the
+    whole batch. Scores with an empty name are skipped. Returns the number of
+    scores written.
+    """
+    by_path = {}
+    for name, moves, date_str, rows, cols, variant in scores:
+        name = sanitize_name(name)
+        if name:
+            by_path.setdefault(ranking_file_path(rows, cols, variant), []).append((name, moves, date_str))
+    for path, records in by_path.items():
+        _append_records(path, records, durable=True)
+    return sum(len(records) for records in by_path.values())
+
+def _append_records(path, records, durable=False):
+    """
+    Appends (name, moves, date_str) records under the exclusive lock and
+    brings the index up to date. With `durable`, the file is also fsynced,
+    after the lock is released so readers never wait for the disk.
+    """
+    global _generation
+    started = time.perf_counter()
+    f = None
     try:
-        with open(RANKING_FILE_PATH, "w", encoding="utf-8") as f:
-            for entry in updated_rankings:
-                f.write(f"{entry['name']},{entry['moves']},{entry['date']}\n")
+        with _FileLock(path):
+            _generation += 1
+            f = open(path, "a+b")
+            index = _index_for(path)
+            index.sync(f)
+            data = "".join(format_record(*record) for record in records).encode("utf-8")
+            if os.fstat(f.fileno()).st_size > index.offset:
+                # A writer died mid-line: terminate its partial record first
+                data = b"\n" + data
+            f.write(data)
+            f.flush()
+            index.sync(f) # Parses just the records appended above
+            if MAX_STORED_ENTRIES is not None and len(index.board) > MAX_STORED_ENTRIES + COMPACTION_THRESHOLD:
+                _compact(path, index)
+        if durable:
+            os.fsync(f.fileno())
     except IOError:
-        print(f"Warning: Could not write to ranking file: {RANKING_FILE_PATH}")
+        print(f"Warning: Could not write to ranking file: {path}")
         # Decide how to handle this: maybe raise an exception or log more formally.
         # For now, the score might not be saved if this fails.
+    finally:
+        if f is not None:
+            f.close()
+        RANKING_IO_LATENCY.observe(time.perf_counter() - started, {'operation': 'write'})
+
+def get_optimal_moves(rows=5, cols=5, rule=CLASSIC):
+    """
+    Fewest moves that win a game started from the all-OFF board, used to
+    compare the scores in the ranking against the optimum.
+    """
+    return optimal_moves(0, rows, cols, rule)
 
 # --- Example Usage (for testing, not run when imported) ---
 if __name__ == '__main__':
@@ -110,7 +447,7 @@ if __name__ == '__main__':
         print(rank_entry)
     print("-" * 20)
 
-    # Test adding more scores to see sorting and truncation
+    # Test adding more scores to see sorting and truncation of the returned list
     print("Adding more scores to test truncation (MAX_RANKING_ENTRIES =", MAX_RANKING_ENTRIES, ")...")
     names = ["P1", "P2", "P3", "P4", "P5", "P6", "P7", "P8", "P9", "P10", "P11", "P12"]
     for i, name in enumerate(names):
@@ -120,7 +457,7 @@ if __name__ == '__main__':
     final_ranks = get_rankings()
     for i, rank_entry in enumerate(final_ranks):
         print(f"{i+1}. {rank_entry}")
-    
+
     assert len(final_ranks) <= MAX_RANKING_ENTRIES
     if len(final_ranks) > 1:
         assert final_ranks[0]['moves'] <= final_ranks[-1]['moves']
@@ -0,0 +1,154 @@
+"""
+Server-side replay verification of submitted scores.
+
+A game's move log is the sequence of clicked cell indices (row * cols + col),
+packed as varints (see wire.encode_clicks). Verifying a score means replaying
+the log from the starting board and checking that it ends on the all-ON
+board after exactly the claimed number of moves. A click is one XOR, so a
+single process verifies tens of thousands of typical games per second;
+verify_batch can spread larger audits across a process pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .game_logic import get_toggle_masks, full_mask
+    from .wire import encode_clicks, decode_clicks
+    from .rules import CLASSIC, parse_rule
+except ImportError:
+    from game_logic import get_toggle_masks, full_mask
+    from wire import encode_clicks, decode_clicks
+    from rules import CLASSIC, parse_rule
+
+# Every verified winning game is appended here, so the ranking history can be audited later.
+REPLAY_LOG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "ranking_replays.txt"))
+# Below this many games a process pool costs more than it saves
+MIN_PARALLEL_BATCH = 2000
+
+
+def replay(cells, rows, cols, start_state=0, rule=CLASSIC):
+    """Returns the board reached by clicking `cells` from `start_state`, or None if a cell is off the board."""
+    masks = get_toggle_masks(rows, cols, rule)
+    size = len(masks)
+    state = start_state
+    for index in cells:
+        if index >= size:
+            return None
+        state ^= masks[index]
+    return state
+
+
+def verify_game(cells, rows, cols, claimed_moves, start_state=0, rule=CLASSIC):
+    """
+    True when the move log `cells` (cell indices, or a packed string) wins the
+    game played under `rule` from `start_state` in exactly `claimed_moves` moves.
+    """
+    if isinstance(cells, str):
+        try:
+            cells = decode_clicks(cells)
+        except ValueError:
+            return False
+    if len(cells) != claimed_moves:
+        return False
+    return replay(cells, rows, cols, start_state, rule) == full_mask(rows, cols)
+
+
+def _verify_chunk(games):
+    return [verify_game(*game) for game in games]
+
+
+def verify_batch(games, workers=None, chunk_size=1000):
+    """
+    Verifies many games at once. Each game is a tuple of verify_game arguments:
+    (cells, rows, cols, claimed_moves[, start_state[, rule]]). Returns a list of bools
+    in the same order. With `workers` > 1 and a large enough batch, chunks are
+    verified in a process pool.
+    """
+    games = list(games)
+    if not workers or workers <= 1 or len(games) < MIN_PARALLEL_BATCH:
+        return _verify_chunk(games)
+    chunks = [games[i:i + chunk_size] for i in range(0, len(games), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_result in executor.map(_verify_chunk, chunks):
+            results.extend(chunk_result)
+    return results
+
+
+def format_replay_record(name, moves, date_str, rows, cols, cells, start_state=0, rule=CLASSIC):
+    # The name goes last because it may contain commas; line breaks would split the record
+    name = " ".join(name.splitlines())
+    # Games under another rule carry a leading "rule=<name>" field; classic records keep the original layout
+    prefix = "" if rule == CLASSIC else f"rule={rule.name},"
+    return f"{prefix}{rows},{cols},{start_state},{moves},{date_str},{encode_clicks(cells)},{name}\n"
+
+
+def parse_replay_record(line):
+    """Parses a replay log line into a dict, or returns None if it is malformed."""
+    line = line.rstrip("\n")
+    rule = CLASSIC
+    if line.startswith("rule="):
+        rule_name, _, line = line[len("rule="):].partition(',')
+        try:
+            rule = parse_rule(rule_name)
+        except ValueError:
+            return None
+    parts = line.split(',', 6)
+    if len(parts) != 7:
+        return None
+    rows, cols, start_state, moves, date_str, packed, name = parts
+    try:
+        return {'rows': int(rows), 'cols': int(cols), 'start_state': int(start_state),
+                'moves': int(moves), 'date': date_str, 'log': packed, 'name': name, 'rule': rule}
+    except ValueError:
+        return None
+
+
+def append_replay_record(name, moves, date_str, rows, cols, cells, start_state=0, path=None, rule=CLASSIC):
+    """Appends one verified game to the replay log (a single small O_APPEND write)."""
+    record = format_replay_record(name, moves, date_str, rows, cols, cells, start_state, rule)
+    with open(path or REPLAY_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(record)
+
+
+def append_replay_records(records, path=None):
+    """Appends already formatted replay records in one write and fsyncs the log."""
+    if not records:
+        return
+    with open(path or REPLAY_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write("".join(records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def audit_replay_log(path=None, workers=None):
+    """
+    Re-verifies every game in the replay log. Returns (verified, failed) where
+    `failed` lists the parsed records (or raw lines) that did not verify.
+    """
+    records = []
+    failed = []
+    with open(path or REPLAY_LOG_PATH, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = parse_replay_record(line)
+            if record is None:
+                failed.append(line)
+            else:
+                records.append(record)
+    games = [(r['log'], r['rows'], r['cols'], r['moves'], r['start_state'], r['rule']) for r in records]
+    results = verify_batch(games, workers=workers)
+    failed.extend(record for record, ok in zip(records, results) if not ok)
+    return sum(results), failed
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    started = time.perf_counter()
+    verified, failed = audit_replay_log(sys.argv[1] if len(sys.argv) > 1 else None, workers=os.cpu_count())
+    elapsed = time.perf_counter() - started
+    print(f"{verified} games verified, {len(failed)} failed in {elapsed:.2f}s")
+    for record in failed:
+        print(f"FAILED: {record}")
@@ -0,0 +1,144 @@
+"""
+Write-behind queue for ranking submissions.
+
+/api/submit_score only puts the verified score on a bounded in-memory
+queue; a daemon thread drains it in batches, so a burst of winners costs
+one locked write and one fsync per batch (ranking_utils.add_scores)
+instead of one per request. The request does not wait for the disk
+either: the standing it reports (standing()) comes from the leaderboard
+this process keeps in memory plus the scores still queued, so its latency
+stays flat however many scores arrive per second. Only the first standing
+of a board that this process has never read loads its ranking file.
+"""
+
+import queue
+import threading
+from collections import Counter
+
+try:
+    from .ranking_utils import add_scores, get_cached_rank, get_rank
+    from .replay import append_replay_records
+    from .metrics import SCORE_BATCH_SIZE, SCORES_REJECTED
+except ImportError:
+    from ranking_utils import add_scores, get_cached_rank, get_rank
+    from replay import append_replay_records
+    from metrics import SCORE_BATCH_SIZE, SCORES_REJECTED
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+
+_STOP = object() # Queued by stop(): everything before it is written first
+
+
+class ScoreWriter:
+    """
+    Bounded queue of (name, moves, date, rows, cols, variant, replay record)
+    items and the thread that writes them. submit() never blocks: when the queue is
+    full it refuses the score instead of slowing the request down.
+    """
+
+    def __init__(self, capacity=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue = queue.Queue(capacity)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = {}  # (rows, cols, variant) -> Counter of move counts queued or being written
+        self._pending_lock = threading.Lock()
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def start(self):
+        """Starts the writer thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Writes every score queued so far, then stops the writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, name, moves, date_str, rows=5, cols=5, replay_record=None, variant='classic'):
+        """Queues a score. Returns False, queuing nothing, when the queue is full."""
+        self.start()
+        board = (rows, cols, variant)
+        with self._pending_lock:
+            self._pending.setdefault(board, Counter())[moves] += 1
+        try:
+            self._queue.put_nowait((name, moves, date_str, rows, cols, variant, replay_record))
+        except queue.Full:
+            self._forget([(name, moves, date_str, rows, cols, variant)])
+            SCORES_REJECTED.inc()
+            return False
+        return True
+
+    def _forget(self, items):
+        """Drops written (or refused) items from the pending counts."""
+        with self._pending_lock:
+            for item in items:
+                board = (item[3], item[4], item[5])
+                counts = self._pending[board]
+                counts[item[1]] -= 1
+                if counts[item[1]] <= 0:
+                    del counts[item[1]]
+                if not counts:
+                    del self._pending[board]
+
+    def standing(self, moves, rows=5, cols=5, variant='classic'):
+        """
+        Rank and percentile a score of `moves` would get, counting the scores
+        still queued (see ranking_utils.get_cached_rank). A score being
+        written may briefly count twice, so the rank can be off by up to one
+        batch for a few milliseconds.
+        """
+        with self._pending_lock:
+            pending = dict(self._pending.get((rows, cols, variant), ()))
+        standing = get_cached_rank(moves, rows, cols, variant, pending)
+        if standing is None:
+            # First standing of this board in the process: its file is read once
+            fallback = get_rank(moves, rows, cols, variant)
+            standing = get_cached_rank(moves, rows, cols, variant, pending) or fallback
+        return standing
+
+    def flush(self):
+        """Blocks until every score queued so far has been written."""
+        self._queue.join()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def write_batch(self, items):
+        """Group commit: one append (and fsync) per ranking file and one for the replay log."""
+        add_scores(item[:6] for item in items)
+        append_replay_records([item[6] for item in items if item[6] is not None])
+        SCORE_BATCH_SIZE.observe(len(items))
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            items = [item for item in batch if item is not _STOP]
+            try:
+                if items:
+                    self.write_batch(items)
+            except Exception as e:
+                # Keep draining: one bad batch must not stall every later score
+                print(f"Error writing {len(items)} queued scores: {e}")
+            finally:
+                self._forget(items)
+                for _ in batch:
+                    self._queue.task_done()
+            if len(items) < len(batch):
+                return
@@ -0,0 +1,251 @@
+"""
+Per-player game sessions.
+
+Each browser gets its own game, keyed by a session id cookie. Sessions are
+kept in an OrderedDict in least-recently-used order, which gives O(1) LRU
+eviction when the registry is full and O(1) amortized idle expiry: the
+oldest entry is always at the front, so expired sessions are popped from
+there until a live one is found.
+"""
+import sys
+import time
+import threading
+from array import array
+from collections import OrderedDict
+
+try:
+    from .game_logic import Game
+    from .metrics import GAMES_STARTED, GAMES_WON, GAMES_ABANDONED
+except ImportError:
+    from game_logic import Game
+    from metrics import GAMES_STARTED, GAMES_WON, GAMES_ABANDONED
+
+DEFAULT_CAPACITY = 50000       # Maximum simultaneous games kept in memory
+DEFAULT_TTL_SECONDS = 30 * 60  # Games idle for longer than this are dropped
+MAX_GAME_MOVES = 10000         # Clicks one game may log; keeps each session's memory bounded
+
+
+def new_history(rows, cols):
+    """Empty move log: one 2-byte entry per click, 4 bytes on boards over 65536 cells."""
+    return array('H' if rows * cols <= 0x10000 else 'I')
+
+
+def new_positions():
+    """Empty stack of positions in a move log, 4 bytes each."""
+    return array('I')
+
+
+class GameSession:
+    """
+    Compact state of one player's game: the bitmask board, a move counter and
+    the log of clicked cell indices, which is replayed to verify scores.
+    `puzzle` is the starting puzzle, or None for the classic all-OFF board.
+
+    A click is its own inverse, so undo toggles the last click still in
+    effect once more and redo toggles the last undone one again. Both are
+    real toggles of the board and count as moves like any click: they are
+    appended to the log, which always holds every toggle in order, so the
+    move count of a verified score is what the player actually played.
+    `played` holds the log positions of the clicks still in effect (what
+    undo takes back) and `undone` the cells taken back (what redo plays);
+    both are stacks, so undo and redo are O(1). A game takes at most
+    `max_moves` moves; callers check room_for() before applying more.
+
+    The Flask routes and the WebSocket channel may play the same session from
+    different threads: they hold `lock` while they change or read it.
+    """
+
+    __slots__ = ('game', 'moves', 'history', 'played', 'undone', 'puzzle', 'won', 'last_access', 'lock')
+
+    max_moves = MAX_GAME_MOVES
+
+    def __init__(self, game, now):
+        self.game = game
+        self.moves = 0
+        self.history = new_history(game.rows, game.cols)
+        self.played = new_positions()
+        self.undone = new_history(game.rows, game.cols)
+        self.puzzle = None
+        self.won = False
+        self.last_access = now
+        self.lock = threading.Lock()
+        GAMES_STARTED.inc()
+
+    @property
+    def start_state(self):
+        return self.puzzle.state if self.puzzle is not None else 0
+
+    def room_for(self, count):
+        """True if `count` more moves (clicks, undos or redos) fit under max_moves."""
+        return self.moves + count <= self.max_moves
+
+    def click(self, row, col):
+        """Applies and logs one click. Returns False (and changes nothing) if it is off the board."""
+        game = self.game
+        if not game._is_valid_cell(row, col):
+            return False
+        game.toggle_cell_and_neighbors(row, col)
+        self.record((row * game.cols + col,))
+        return True
+
+    def record(self, cells):
+        """Counts and logs clicks that were applied to the game. New clicks discard the redo stack."""
+        if self.undone:
+            del self.undone[:]
+        start = len(self.history)
+        self.history.extend(cells)
+        self.played.extend(range(start, len(self.history)))
+        self._count(len(self.history) - start)
+
+    def _count(self, count):
+        self.moves += count
+        if not self.won and self.game.check_win():
+            self.won = True
+            GAMES_WON.inc()
+
+    def undo(self):
+        """
+        Takes back the last click still in effect, which counts as a move.
+        Returns its cell index, or None if there is none.
+        """
+        if not self.played:
+            return None
+        index = self.history[self.played.pop()]
+        self.game.apply_moves((index,))
+        self.history.append(index)
+        self.undone.append(index)
+        self._count(1)
+        return index
+
+    def redo(self):
+        """
+        Plays the last undone click again, which counts as a move.
+        Returns its cell index, or None if there is none.
+        """
+        if not self.undone:
+            return None
+        index = self.undone.pop()
+        self.game.apply_moves((index,))
+        self.played.append(len(self.history))
+        self.history.append(index)
+        self._count(1)
+        return index
+
+    def discard(self):
+        """Called when the game is dropped; unfinished games count as abandoned."""
+        if not self.won:
+            GAMES_ABANDONED.inc()
+
+    def reset(self, puzzle=None, rule=None):
+        """
+        Starts over, from `puzzle` if given or else from the all-OFF board.
+        The game switches to `rule` (or to the puzzle's rule) when given.
+        """
+        self.discard()
+        GAMES_STARTED.inc()
+        self.won = False
+        self.puzzle = puzzle
+        if puzzle is not None:
+            rule = puzzle.rule
+        if rule is not None and rule != self.game.rule:
+            self.game = Game(self.game.rows, self.game.cols, rule)
+        self.game.reset_board()
+        self.game.state = self.start_state
+        self.moves = 0
+        self.history = new_history(self.game.rows, self.game.cols)
+        self.played = new_positions()
+        self.undone = new_history(self.game.rows, self.game.cols)
+
+
+class SessionRegistry:
+    """
+    Bounded, thread-safe map of session id -> GameSession with LRU eviction
+    and idle TTL expiry.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL_SECONDS,
+                 rows=5, cols=5, clock=time.monotonic):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.rows = rows
+        self.cols = cols
+        self._clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0  # Dropped because the registry was full
+        self.expired = 0  # Dropped because they were idle for too long
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            self._expire(self._clock())
+            return session_id in self._sessions
+
+    def _expire(self, now):
+        sessions = self._sessions
+        deadline = now - self.ttl
+        while sessions:
+            session_id, session = next(iter(sessions.items()))
+            if session.last_access > deadline:
+                break
+            sessions.popitem(last=False)
+            session.discard()
+            self.expired += 1
+
+    def get(self, session_id):
+        """
+        Returns the session for `session_id`, creating a fresh game if there is
+        none (or if it expired). Marks the session as most recently used.
+        """
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            sessions = self._sessions
+            session = sessions.get(session_id)
+            if session is None:
+                if len(sessions) >= self.capacity:
+                    sessions.popitem(last=False)[1].discard()
+                    self.evicted += 1
+                session = GameSession(Game(self.rows, self.cols), now)
+                sessions[session_id] = session
+            else:
+                sessions.move_to_end(session_id)
+                session.last_access = now
+            return session
+
+    def discard(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.discard()
+
+    def memory_footprint(self):
+        """
+        Approximate bytes held by the registry: the dict itself plus, for every
+        entry, the key, the session and game objects and their integer fields.
+        Objects shared by all games of a size (the toggle masks) are not counted.
+        """
+        with self._lock:
+            total = sys.getsizeof(self._sessions)
+            for session_id, session in self._sessions.items():
+                game = session.game
+                total += (sys.getsizeof(session_id) + sys.getsizeof(session) + sys.getsizeof(game)
+                          + sys.getsizeof(game.state) + sys.getsizeof(session.moves)
+                          + sys.getsizeof(session.history) + sys.getsizeof(session.played)
+                          + sys.getsizeof(session.undone)
+                          + sys.getsizeof(session.lock))
+            return total
+
+    def stats(self):
+        return {
+            'active': len(self._sessions),
+            'capacity': self.capacity,
+            'ttl_seconds': self.ttl,
+            'evicted': self.evicted,
+            'expired': self.expired,
+            'memory_bytes': self.memory_footprint(),
+        }
@@ -0,0 +1,331 @@
+"""
+Minimum-move solver for the lights game.
+
+A click is a XOR with a fixed mask, so solving a board is a linear system
+over GF(2): A x = b, where column j of A is the toggle mask of cell j,
+b is the set of lights that still have to change and x is the set of cells
+to click. Clicking a cell twice is a no-op, so every solution is a set.
+
+Eliminating the whole rows*cols system costs O((rows*cols)^3), so large
+boards of rules that allow it are solved by light chasing instead (see
+ChasingSolver): only a cols x cols system is eliminated, once per board
+size, and each solve is two linear passes over bit-packed rows.
+"""
+import random
+from itertools import product
+from functools import lru_cache
+
+try:
+    from .game_logic import get_toggle_masks, full_mask
+    from .rules import CLASSIC, COMPILED_CACHE_SIZE
+except ImportError:
+    from game_logic import get_toggle_masks, full_mask
+    from rules import CLASSIC, COMPILED_CACHE_SIZE
+
+# Null spaces bigger than this are not enumerated exhaustively (2^k candidates).
+MAX_NULL_SPACE_DIM = 20
+# Boards with at least this many cells are solved by light chasing when the rule allows it
+CHASING_MIN_CELLS = 100
+# max_optimal_moves is exact up to this many steps, and sampled above it
+MAX_EXACT_DISTANCE_WORK = 20000
+DISTANCE_SAMPLE_WORK = 1 << 16  # Null-space combinations tried while sampling (at least 16 boards)
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value):
+        return bin(value).count("1")
+
+
+def bit_indices(value):
+    """Indices of the set bits of `value`, in increasing order (linear in its size)."""
+    return [index for index, bit in enumerate(reversed(bin(value)[2:])) if bit == "1"]
+
+
+def _minimal_combination(solution, basis):
+    """
+    Fewest-clicks XOR of `solution` with a combination of the null `basis`.
+    The combinations are walked in Gray-code order so each step is a single XOR.
+    """
+    if len(basis) > MAX_NULL_SPACE_DIM:
+        raise ValueError(
+            f"Null space of dimension {len(basis)} is too large to enumerate exhaustively."
+        )
+    best = solution
+    best_count = _popcount(solution)
+    current = solution
+    for step in range(1, 1 << len(basis)):
+        # Index of the lowest set bit of `step` is the basis vector to flip.
+        current ^= basis[(step & -step).bit_length() - 1]
+        count = _popcount(current)
+        if count < best_count:
+            best, best_count = current, count
+    return best
+
+
+class LinearSolver:
+    """
+    Gauss-Jordan elimination of a toggle matrix, done once and reused.
+
+    Rows are packed into Python integers (bit j = column j), so each row
+    operation is a single XOR. The elimination also records the row
+    operations applied (`transform`), which lets every later solve skip the
+    elimination and reduce the right-hand side with one parity per pivot.
+    """
+
+    def __init__(self, masks, size):
+        self.size = size
+        # Row i of A: the clicks that toggle cell i.
+        matrix = [0] * size
+        for col, mask in enumerate(masks):
+            for row in range(size):
+                if (mask >> row) & 1:
+                    matrix[row] |= 1 << col
+        transform = [1 << row for row in range(size)]
+
+        pivot_cols = []
+        pivot_row = 0
+        for col in range(size):
+            bit = 1 << col
+            found = None
+            for row in range(pivot_row, size):
+                if matrix[row] & bit:
+                    found = row
+                    break
+            if found is None:
+                continue
+            matrix[pivot_row], matrix[found] = matrix[found], matrix[pivot_row]
+            transform[pivot_row], transform[found] = transform[found], transform[pivot_row]
+            for row in range(size):
+                if row != pivot_row and matrix[row] & bit:
+                    matrix[row] ^= matrix[pivot_row]
+                    transform[row] ^= transform[pivot_row]
+            pivot_cols.append(col)
+            pivot_row += 1
+
+        rank = pivot_row
+        self.rank = rank
+        # (row of the transform, pivot column) pairs: x[col] = parity(row & b).
+        self.pivots = tuple(zip(transform[:rank], pivot_cols))
+        # Zero rows of the reduced matrix: b is solvable iff parity(row & b) == 0.
+        self.checks = tuple(transform[rank:])
+
+        pivot_set = set(pivot_cols)
+        null_basis = []
+        for free_col in range(size):
+            if free_col in pivot_set:
+                continue
+            vector = 1 << free_col
+            for row, col in enumerate(pivot_cols):
+                if (matrix[row] >> free_col) & 1:
+                    vector |= 1 << col
+            null_basis.append(vector)
+        # Clicking every cell of a null vector leaves the board unchanged.
+        self.null_basis = tuple(null_basis)
+
+    def is_solvable(self, target):
+        return not any(_popcount(row & target) & 1 for row in self.checks)
+
+    def particular_solution(self, target):
+        """Returns one click set (bitmask) producing `target`, or None."""
+        if not self.is_solvable(target):
+            return None
+        solution = 0
+        for row, col in self.pivots:
+            if _popcount(row & target) & 1:
+                solution |= 1 << col
+        return solution
+
+    def minimal_solution(self, target):
+        """
+        Returns the click set with the fewest clicks producing `target`, or None.
+        Every solution is the particular one XOR a combination of the null basis.
+        """
+        solution = self.particular_solution(target)
+        if solution is None:
+            return None
+        return _minimal_combination(solution, self.null_basis)
+
+
+def supports_chasing(rule):
+    """
+    Light chasing needs every click to reach, in the row above, only the cell
+    straight above it, and nothing further than one row away (no wrap-around).
+    """
+    offsets = set(rule.offsets)
+    return (not rule.wrap and all(-1 <= dr <= 1 for dr, _ in offsets)
+            and {offset for offset in offsets if offset[0] == -1} == {(-1, 0)})
+
+
+class ChasingSolver:
+    """
+    Light-chasing solver, with the same interface as LinearSolver.
+
+    Once the clicks of row r are known, the only clicks left that reach a
+    light of row r are those straight below it, so row r + 1 must click
+    exactly the lights row r still has wrong ("chasing" them down). The
+    first row therefore decides everything, and the last row's leftover
+    lights are a linear function of it. That function is built once per
+    board size by chasing each single first-row click, and eliminated as
+    a cols x cols LinearSolver. A solve chases the target with an empty
+    first row, solves the small system for the first row that cancels
+    the leftover, and chases again with it. Rows are Python integers
+    (bit c = column c), so every step is a few shifts and XORs.
+    """
+
+    def __init__(self, rows, cols, rule=CLASSIC):
+        if not supports_chasing(rule):
+            raise ValueError(f"Rule {rule.name} cannot be solved by light chasing")
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self._row_mask = (1 << cols) - 1
+        self._same_row = tuple(dc for dr, dc in set(rule.offsets) if dr == 0)
+        self._row_below = tuple(dc for dr, dc in set(rule.offsets) if dr == 1)
+        # Column j: the last row's leftover lights after chasing a lone click on (0, j)
+        first_row = LinearSolver([self._chase(1 << col)[1] for col in range(cols)], cols)
+        self._first_row = first_row
+        # A first row in the small system's null space chases down to a board-wide null vector
+        self.null_basis = tuple(self._pack(self._chase(vector)[0]) for vector in first_row.null_basis)
+        self.rank = self.size - len(self.null_basis)
+
+    def _spread(self, clicks, shifts):
+        """Lights of one row toggled by the clicks `clicks` (a row bitmask) through column offsets `shifts`."""
+        toggled = 0
+        for dc in shifts:
+            toggled ^= clicks << dc if dc >= 0 else clicks >> -dc
+        return toggled & self._row_mask
+
+    def _chase(self, first, target_rows=None):
+        """
+        Clicks the first row as `first`, then each following row to clear
+        the row above. Returns (clicks per row, lights of the last row still
+        to toggle); `target_rows` are the lights to toggle, None for none.
+        """
+        clicks = [first]
+        above = 0
+        current = first
+        for row in range(self.rows):
+            leftover = self._spread(current, self._same_row) ^ self._spread(above, self._row_below)
+            if target_rows is not None:
+                leftover ^= target_rows[row]
+            if row == self.rows - 1:
+                return clicks, leftover
+            clicks.append(leftover)
+            above, current = current, leftover
+
+    def _split(self, value):
+        """Board bitmask -> one integer per row (linear in the board size)."""
+        bits = format(value, f"0{self.size}b")
+        size, cols = self.size, self.cols
+        return [int(bits[size - (row + 1) * cols:size - row * cols], 2) for row in range(self.rows)]
+
+    def _pack(self, rows):
+        """Inverse of _split."""
+        return int("".join(format(row, f"0{self.cols}b") for row in reversed(rows)), 2)
+
+    def is_solvable(self, target):
+        return self.particular_solution(target) is not None
+
+    def particular_solution(self, target):
+        """Returns one click set (bitmask) producing `target`, or None."""
+        target_rows = self._split(target)
+        first = self._first_row.particular_solution(self._chase(0, target_rows)[1])
+        if first is None:
+            return None
+        return self._pack(self._chase(first, target_rows)[0])
+
+    def minimal_solution(self, target):
+        """Returns the click set with the fewest clicks producing `target`, or None."""
+        solution = self.particular_solution(target)
+        if solution is None:
+            return None
+        return _minimal_combination(solution, self.null_basis)
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def get_solver(rows, cols, rule=CLASSIC):
+    """
+    Cached solver for a board size and rule; the elimination runs once per
+    (rule, rows, cols). Large boards use light chasing when the rule allows it.
+    """
+    if rows * cols >= CHASING_MIN_CELLS and supports_chasing(rule):
+        return ChasingSolver(rows, cols, rule)
+    return LinearSolver(get_toggle_masks(rows, cols, rule), rows * cols)
+
+
+def solve_state(state, rows, cols, rule=CLASSIC, minimal=True):
+    """
+    Minimal list of (row, col) clicks that turns `state` into the all-ON board,
+    or None when that board cannot be reached from `state`. With minimal=False
+    any winning click set is returned, which skips the search over equivalent
+    solutions (needed on boards whose null space is too large to search).
+    """
+    solver = get_solver(rows, cols, rule)
+    target = state ^ full_mask(rows, cols)
+    solution = solver.minimal_solution(target) if minimal else solver.particular_solution(target)
+    if solution is None:
+        return None
+    return [divmod(index, cols) for index in bit_indices(solution)]
+
+
+def optimal_moves(state, rows, cols, rule=CLASSIC):
+    """Fewest moves needed to win from `state`, or None if it cannot be won."""
+    clicks = solve_state(state, rows, cols, rule)
+    return None if clicks is None else len(clicks)
+
+
+def _covering_radius(basis, size, limit):
+    """
+    Largest fewest-clicks weight of any click set modulo the null `basis`,
+    or None if that takes more than `limit` steps. Cells are grouped by which
+    null vectors contain them; only how many cells of each group are clicked
+    matters, so the search is over those counts instead of over 2^size sets.
+    """
+    groups = {}
+    for cell in range(size):
+        pattern = 0
+        for bit, vector in enumerate(basis):
+            pattern |= ((vector >> cell) & 1) << bit
+        groups[pattern] = groups.get(pattern, 0) + 1
+    always = groups.pop(0, 0)  # Cells no null vector touches: clicking them always counts
+    sizes = list(groups.values())
+    flips = [[_popcount(combination & pattern) & 1 for pattern in groups] for combination in range(1 << len(basis))]
+    work = len(flips)
+    for count in sizes:
+        work *= count + 1
+        if work > limit:
+            return None
+    radius = 0
+    for clicked in product(*(range(count + 1) for count in sizes)):
+        weight = min(sum(count - ones if flip else ones for flip, count, ones in zip(flipped, sizes, clicked))
+                     for flipped in flips)
+        radius = max(radius, weight)
+    return always + radius
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def max_optimal_moves(rows, cols, rule=CLASSIC):
+    """
+    Largest optimal move count of any winnable board of this size and rule
+    (the covering radius of the null space). All cells when every board has
+    a unique solution; exact while the grouped search is small enough, and
+    otherwise the largest one found among random boards from a fixed seed.
+    """
+    size = rows * cols
+    basis = get_solver(rows, cols, rule).null_basis
+    if not basis:
+        return size
+    radius = _covering_radius(basis, size, MAX_EXACT_DISTANCE_WORK)
+    if radius is not None:
+        return radius
+    solver = get_solver(rows, cols, rule)
+    masks = get_toggle_masks(rows, cols, rule)
+    rng = random.Random(size)
+    radius = 0
+    for _ in range(max(16, DISTANCE_SAMPLE_WORK >> len(basis))):
+        target = 0
+        for index in bit_indices(rng.getrandbits(size)):
+            target ^= masks[index]
+        radius = max(radius, _popcount(solver.minimal_solution(target)))
+    return radius
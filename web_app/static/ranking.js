@@ -0,0 +1,59 @@
+document.addEventListener('DOMContentLoaded', () => {
+    // The first page keeps all its rows and the total live through /api/ranking/stream (server-sent events)
+    const container = document.querySelector('[data-stream-url]');
+    if (!container || !window.EventSource) {
+        return;
+    }
+    const rowsElement = document.getElementById('ranking-rows');
+    const totalElement = document.getElementById('ranking-total');
+    const pageSize = Number(container.dataset.size);
+    const pages = Number(container.dataset.pages);
+    let top = []; // {rank, name, moves, date} of every entry on the page
+    let version = -1;
+
+    function render(total) {
+        if (!rowsElement || Math.max(1, Math.ceil(total / pageSize)) !== pages) {
+            // No table yet, or the pagination changed: the server renders those
+            if (top.length > 0) {
+                window.location.reload();
+            }
+            return;
+        }
+        totalElement.textContent = total;
+        top.forEach((entry, index) => {
+            let row = rowsElement.rows[index];
+            if (!row) {
+                row = rowsElement.insertRow();
+                for (let i = 0; i < 4; i++) {
+                    row.insertCell();
+                }
+            }
+            [entry.rank, entry.name, entry.moves, entry.date].forEach((value, i) => {
+                row.cells[i].textContent = value; // textContent: names are user input
+            });
+        });
+        while (rowsElement.rows.length > top.length) {
+            rowsElement.deleteRow(-1);
+        }
+    }
+
+    const source = new EventSource(container.dataset.streamUrl);
+    source.addEventListener('snapshot', (event) => {
+        const data = JSON.parse(event.data);
+        version = data.version;
+        top = data.entries;
+        render(data.total);
+    });
+    source.addEventListener('diff', (event) => {
+        const data = JSON.parse(event.data);
+        if (data.version <= version) {
+            return; // Already part of the last snapshot
+        }
+        version = data.version;
+        top = top.slice(0, data.size);
+        data.changes.forEach(([rank, name, moves, date]) => {
+            top[rank - 1] = { rank: rank, name: name, moves: moves, date: date };
+        });
+        render(data.total);
+    });
+});
@@ -2,62 +2,207 @@ document.addEventListener('DOMContentLoaded', () => {
     const boardElement = document.getElementById('game-board');
     const moveCounterElement = document.getElementById('move-counter');
     const resetButton = document.getElementById('reset-button');
-    const numRows = 5; // Should ideally come from server or be consistent
-    const numCols = 5; // Should ideally come from server or be consistent
+    const undoButton = document.getElementById('undo-button');
+    const redoButton = document.getElementById('redo-button');
+    const tierSelect = document.getElementById('tier-select');
+    const ruleSelect = document.getElementById('rule-select');
+    const optimalInfoElement = document.getElementById('optimal-info');
+    const optimalMovesElement = document.getElementById('optimal-moves');
+    let numRows = 5; // Updated from the server's game state
+    let numCols = 5; // Updated from the server's game state
+    let currentRule = 'classic'; // Rule of the game being played, from the server's game state
 
     const LIGHT_OFF_CSS_CLASS = 'light-off';
     const LIGHT_ON_CSS_CLASS = 'light-on';
+    // Ask the server for the compact wire format (base64 bitmask + changed cells)
+    const COMPACT_QUERY = '?format=compact';
 
-    let boardState = []; // 2D array representing the board characters (e.g., 'X', 'O')
+    // Clicks are shown at once and confirmed by the server afterwards. The
+    // server's state is the truth; the board shows it with the clicks it has
+    // not acknowledged yet applied on top.
+    let confirmedBits = new Uint8Array(0); // Last server state: bit i is cell (i / numCols, i % numCols), 1 = ON
+    let confirmedMoves = 0;
+    let boardBits = new Uint8Array(0); // What is shown: confirmedBits plus the pending clicks
+    let pending = []; // {seq, index} of clicks applied locally, not yet acknowledged
+    let unsent = []; // Pending clicks waiting for the next /api/moves batch
+    let flushScheduled = false;
+    let clickSeq = 0; // Numbers every click and channel message; the server echoes it
+    let neighborhoods = []; // Cells toggled by a click on each cell, from the rule's stencil
+    let cells = []; // Persistent DOM cells, indexed like boardBits
     let moves = 0;
-    let SERVER_LIGHT_ON_CHAR = ''; // To be fetched from server
-    let SERVER_LIGHT_OFF_CHAR = ''; // To be fetched from server
+    let canUndo = false; // Some click is still in effect (an undo counts as a move, so moves can't tell)
+    let canRedo = false; // The server keeps the undone clicks; new clicks discard them
+    let gameSocket = null; // Open WebSocket play channel, if any
+    let socketSentSeq = 0; // Last seq sent over the channel
+    let socketAckedSeq = 0; // Last seq the channel replied to
+    let socketWaiters = []; // {seq, resolve} waiting for the channel to reply up to seq
+    let serverQueue = Promise.resolve(); // REST calls run one at a time, in click order
+
+    function decodeState(encoded) {
+        const raw = atob(encoded);
+        const bytes = new Uint8Array(raw.length);
+        for (let i = 0; i < raw.length; i++) {
+            bytes[i] = raw.charCodeAt(i);
+        }
+        return bytes;
+    }
+
+    function isLightOn(index) {
+        return ((boardBits[index >> 3] >> (index & 7)) & 1) === 1;
+    }
+
+    function buildNeighborhoods(stencil) {
+        // Same toggles as the server's compiled rule: offsets outside the board
+        // are dropped (or wrap around), and a cell is toggled at most once
+        neighborhoods = [];
+        for (let r = 0; r < numRows; r++) {
+            for (let c = 0; c < numCols; c++) {
+                const targets = new Set();
+                stencil.offsets.forEach(([dr, dc]) => {
+                    let row = r + dr;
+                    let col = c + dc;
+                    if (stencil.wrap) {
+                        row = ((row % numRows) + numRows) % numRows;
+                        col = ((col % numCols) + numCols) % numCols;
+                    } else if (row < 0 || row >= numRows || col < 0 || col >= numCols) {
+                        return;
+                    }
+                    targets.add(row * numCols + col);
+                });
+                neighborhoods.push([...targets]);
+            }
+        }
+    }
+
+    function toggleBits(bits, index) {
+        neighborhoods[index].forEach(target => { bits[target >> 3] ^= 1 << (target & 7); });
+    }
+
+    function showBoard() {
+        // Recomputes what is shown and touches only the cells that differ
+        const next = confirmedBits.slice();
+        pending.forEach(click => toggleBits(next, click.index));
+        const previous = boardBits;
+        boardBits = next;
+        cells.forEach((cell, index) => {
+            if (((previous[index >> 3] ^ next[index >> 3]) >> (index & 7)) & 1) {
+                updateCell(index);
+            }
+        });
+        moves = confirmedMoves + pending.length;
+        updateMoveCounter();
+    }
+
+    function applyServerState(data, acknowledgedSeq) {
+        // data includes every click numbered up to acknowledgedSeq; later ones stay predicted
+        confirmedBits = decodeState(data.state);
+        confirmedMoves = data.moves;
+        pending = pending.filter(click => click.seq > acknowledgedSeq);
+        // Click and reset replies carry no can_undo: after a click there is one to take back
+        canUndo = data.can_undo !== undefined ? data.can_undo === true : data.moves > 0;
+        canRedo = data.can_redo === true;
+        const resized = data.rows !== numRows || data.cols !== numCols || cells.length === 0;
+        numRows = data.rows;
+        numCols = data.cols;
+        if (data.rule) {
+            currentRule = data.rule;
+        }
+        if (data.stencil) {
+            buildNeighborhoods(data.stencil);
+        } else if (resized) {
+            buildNeighborhoods({ offsets: [[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1]], wrap: false });
+        }
+        if (resized) {
+            boardBits = confirmedBits.slice();
+            pending = [];
+            buildBoard();
+            moves = confirmedMoves;
+            updateMoveCounter();
+        } else {
+            showBoard();
+        }
+    }
+
+    function checkWin(data) {
+        // Only the server decides a win, once every predicted click is confirmed
+        if (data.win && pending.length === 0) {
+            handleWin(data);
+        }
+    }
+
+    function enqueue(task) {
+        serverQueue = serverQueue.then(task).catch(error => console.error("Server request failed:", error));
+        return serverQueue;
+    }
+
+    async function resynchronize() {
+        // The server rejected something: drop the predictions and show its state
+        pending = [];
+        unsent = [];
+        const seq = clickSeq;
+        const response = await fetch('/api/gamestate' + COMPACT_QUERY);
+        if (response.status === 409) {
+            await resetGame();
+            return;
+        }
+        if (response.ok) {
+            applyServerState(await response.json(), seq);
+        }
+    }
 
     async function fetchInitialGameState() {
         try {
-            const response = await fetch('/api/gamestate');
+            const response = await fetch('/api/gamestate' + COMPACT_QUERY);
+            if (response.status === 409) {
+                await resetGame();
+                return;
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             const data = await response.json();
-            boardState = data.board;
-            moves = data.moves;
-            SERVER_LIGHT_ON_CHAR = data.light_on_char;
-            SERVER_LIGHT_OFF_CHAR = data.light_off_char;
-            updateMoveCounter();
-            renderBoard();
+            applyServerState(data, clickSeq);
+            // Show the rule of a game resumed from an earlier visit
+            if ([...ruleSelect.options].some(option => option.value === data.rule)) {
+                ruleSelect.value = data.rule;
+            }
         } catch (error) {
             console.error("Error fetching initial game state:", error);
             // Display error to user or retry
         }
     }
 
-    function renderBoard() {
-        boardElement.innerHTML = ''; // Clear previous board
-        if (!boardState || boardState.length === 0) {
-            console.error("Board state is not initialized or empty.");
-            return;
-        }
+    function buildBoard() {
+        // Cells are created once per board size and then updated in place
+        boardElement.innerHTML = '';
+        boardElement.style.gridTemplateColumns = `repeat(${numCols}, 1fr)`;
+        boardElement.style.gridTemplateRows = `repeat(${numRows}, 1fr)`;
+        cells = [];
         for (let r = 0; r < numRows; r++) {
             for (let c = 0; c < numCols; c++) {
                 const cell = document.createElement('div');
                 cell.classList.add('cell');
-                // Determine class based on character from server
-                if (boardState[r][c] === SERVER_LIGHT_ON_CHAR) {
-                    cell.classList.add(LIGHT_ON_CSS_CLASS);
-                } else {
-                    cell.classList.add(LIGHT_OFF_CSS_CLASS);
-                }
                 cell.dataset.row = r;
                 cell.dataset.col = c;
                 cell.addEventListener('click', handleCellClick);
                 boardElement.appendChild(cell);
+                cells.push(cell);
+                updateCell(cells.length - 1);
             }
         }
     }
 
+    function updateCell(index) {
+        const on = isLightOn(index);
+        const classList = cells[index].classList;
+        classList.toggle(LIGHT_ON_CSS_CLASS, on);
+        classList.toggle(LIGHT_OFF_CSS_CLASS, !on);
+    }
+
     function updateMoveCounter() {
         moveCounterElement.textContent = moves;
+        undoButton.disabled = !canUndo && pending.length === 0;
+        redoButton.disabled = !canRedo;
     }
 
     function setBoardInteractive(isInteractive) {
@@ -71,7 +216,100 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    async function handleCellClick(event) {
+    function handleWin(data) {
+        // Board remains non-interactive until after prompt and score submission/cancellation
+        setBoardInteractive(false);
+        setTimeout(async () => { // Make this async to await fetch
+            const playerName = window.prompt(`Parabéns! Você venceu em ${data.moves} jogadas!\nDigite seu nome para o ranking:`);
+            if (playerName && playerName.trim() !== "") {
+                // No explicit button to disable for prompt, browser handles modal nature
+                try {
+                    const submitResponse = await fetch('/api/submit_score', {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json',
+                        },
+                        body: JSON.stringify({ name: playerName.trim(), moves: data.moves }),
+                    });
+                    const submitResult = await submitResponse.json();
+                    if (submitResponse.ok && submitResult.success) {
+                        const standing = submitResult.rank
+                            ? `\nVocê ficou em ${submitResult.rank}º lugar (melhor que ${submitResult.percentile}% das pontuações).`
+                            : "";
+                        alert(submitResult.message + standing + "\nVocê será redirecionado para a página de ranking.");
+                        // Redirect to the ranking this score went to: each board and rule has its own
+                        window.location.href = `/ranking?rows=${numRows}&cols=${numCols}&rule=${encodeURIComponent(currentRule)}`;
+                    } else {
+                        alert("Falha ao enviar pontuação: " + (submitResult.message || "Erro desconhecido"));
+                        setBoardInteractive(true); // Re-enable board if score submission fails and user stays on page
+                    }
+                } catch (submitError) {
+                    console.error("Error submitting score:", submitError);
+                    alert("Ocorreu um erro ao enviar sua pontuação.");
+                    setBoardInteractive(true); // Re-enable board
+                }
+            } else {
+                alert("Você venceu, mas sua pontuação não foi salva porque nenhum nome foi fornecido.");
+                setBoardInteractive(true); // Re-enable board as game is over but score not saved
+            }
+        }, 100); // Small delay to allow UI update before prompt
+    }
+
+    function socketSend(message) {
+        socketSentSeq = message.seq;
+        gameSocket.send(JSON.stringify(message));
+    }
+
+    function socketAcknowledged(seq) {
+        // Resolves once the channel replied to every message up to seq, or closed
+        if (seq <= socketAckedSeq || !gameSocket) {
+            return Promise.resolve();
+        }
+        return new Promise(resolve => socketWaiters.push({ seq, resolve }));
+    }
+
+    function releaseSocketWaiters(closed) {
+        socketWaiters = socketWaiters.filter(waiter => {
+            if (closed || waiter.seq <= socketAckedSeq) {
+                waiter.resolve();
+                return false;
+            }
+            return true;
+        });
+    }
+
+    function connectGameChannel() {
+        // Optional WebSocket channel; clicks go over REST while it is not open
+        const port = boardElement.dataset.wsPort;
+        if (!port || !window.WebSocket) {
+            return;
+        }
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.hostname}:${port}/ws`);
+        socket.addEventListener('message', (event) => {
+            const data = JSON.parse(event.data);
+            if (typeof data.seq === 'number') {
+                socketAckedSeq = Math.max(socketAckedSeq, data.seq);
+            }
+            if (data.type === 'error') {
+                console.error("Game channel error:", data.message);
+                // Drop the predictions and ask for the authoritative state
+                pending = [];
+                socketSend({ type: 'state', seq: ++clickSeq });
+            } else {
+                applyServerState(data, data.seq);
+                checkWin(data);
+            }
+            releaseSocketWaiters(false);
+        });
+        socket.addEventListener('open', () => { gameSocket = socket; });
+        socket.addEventListener('close', () => {
+            gameSocket = null; // Back to REST
+            releaseSocketWaiters(true);
+        });
+    }
+
+    function handleCellClick(event) {
         // If the board or cell is already disabled, do nothing
         if (event.target.classList.contains('disabled') || boardElement.classList.contains('disabled')) {
             return;
@@ -79,75 +317,81 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const row = parseInt(event.target.dataset.row);
         const col = parseInt(event.target.dataset.col);
+        const click = { seq: ++clickSeq, index: row * numCols + col };
+
+        // Shown immediately; the server's reply confirms or corrects it
+        pending.push(click);
+        canRedo = false;
+        showBoard();
 
-        setBoardInteractive(false); // Disable board
+        if (gameSocket && gameSocket.readyState === WebSocket.OPEN) {
+            // Streamed: messages are handled in order, replies carry the seq back
+            socketSend({ type: 'click', row: row, col: col, seq: click.seq });
+            return;
+        }
+        // Clicks made while a request is in flight go together in the next batch
+        unsent.push(click);
+        if (!flushScheduled) {
+            flushScheduled = true;
+            enqueue(sendClicks);
+        }
+    }
 
+    async function sendClicks() {
+        flushScheduled = false;
+        const batch = unsent;
+        unsent = [];
+        if (batch.length === 0) {
+            return;
+        }
+        const seq = batch[batch.length - 1].seq;
         try {
-            const response = await fetch(`/api/click/${row}/${col}`);
+            const response = await fetch('/api/moves' + COMPACT_QUERY, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    clicks: batch.map(click => [Math.floor(click.index / numCols), click.index % numCols]),
+                    seq: seq,
+                }),
+            });
+            if (response.status === 409) {
+                // Stateless mode: this game's token was superseded, start over
+                alert((await response.json()).message);
+                pending = [];
+                unsent = [];
+                await resetGame();
+                return;
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             const data = await response.json();
-            boardState = data.board;
-            moves = data.moves;
-            
-            updateMoveCounter();
-            renderBoard(); // This will re-enable cells if they are individually managed or just redraw
-
-            if (data.win) {
-                // Board remains non-interactive until after prompt and score submission/cancellation
-                setTimeout(async () => { // Make this async to await fetch
-                    const playerName = window.prompt(`Parabéns! Você venceu em ${data.moves} jogadas!\nDigite seu nome para o ranking:`);
-                    if (playerName && playerName.trim() !== "") {
-                        // No explicit button to disable for prompt, browser handles modal nature
-                        try {
-                            const submitResponse = await fetch('/api/submit_score', {
-                                method: 'POST',
-                                headers: {
-                                    'Content-Type': 'application/json',
-                                },
-                                body: JSON.stringify({ name: playerName.trim(), moves: data.moves }),
-                            });
-                            const submitResult = await submitResponse.json();
-                            if (submitResponse.ok && submitResult.success) {
-                                alert(submitResult.message + "\nVocê será redirecionado para a página de ranking.");
-                                window.location.href = '/ranking'; // Redirect to ranking page
-                            } else {
-                                alert("Falha ao enviar pontuação: " + (submitResult.message || "Erro desconhecido"));
-                                setBoardInteractive(true); // Re-enable board if score submission fails and user stays on page
-                            }
-                        } catch (submitError) {
-                            console.error("Error submitting score:", submitError);
-                            alert("Ocorreu um erro ao enviar sua pontuação.");
-                            setBoardInteractive(true); // Re-enable board
-                        }
-                    } else {
-                        alert("Você venceu, mas sua pontuação não foi salva porque nenhum nome foi fornecido.");
-                        setBoardInteractive(true); // Re-enable board as game is over but score not saved
-                    }
-                }, 100); // Small delay to allow UI update before prompt
-            } else {
-                 setBoardInteractive(true); // Re-enable board if not a win
-            }
+            applyServerState(data, seq);
+            checkWin(data);
         } catch (error) {
             console.error("Error during cell click:", error);
             alert("Ocorreu um erro durante sua jogada. Por favor, tente novamente."); // User-friendly message
-            setBoardInteractive(true); // Re-enable board on error
+            await resynchronize();
         }
     }
-    
-    async function handleResetGame() {
+
+    async function resetGame(seq = clickSeq) {
         resetButton.disabled = true; // Disable reset button
         try {
-            const response = await fetch('/api/reset');
+            const tier = tierSelect.value;
+            const rule = ruleSelect.value;
+            const response = await fetch('/api/reset' + COMPACT_QUERY +
+                `&tier=${encodeURIComponent(tier)}&rule=${encodeURIComponent(rule)}`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             const data = await response.json();
-            boardState = data.board;
-            moves = data.moves;
-            updateMoveCounter();
-            renderBoard(); // This will redraw the board, implicitly making it interactive again
+            applyServerState(data, seq);
+            // Puzzles come with their optimal move count; the classic board doesn't
+            optimalInfoElement.hidden = data.optimal_moves === undefined;
+            if (data.optimal_moves !== undefined) {
+                optimalMovesElement.textContent = data.optimal_moves;
+            }
         } catch (error) {
             console.error("Error resetting game:", error);
             alert("Falha ao reiniciar o jogo. Por favor, tente novamente.");
@@ -157,8 +401,50 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function handleResetGame() {
+        // After any clicks still on their way, so they cannot land on the new game:
+        // REST clicks are ahead in the queue, channel clicks must be answered first
+        const seq = clickSeq;
+        const socketSeq = socketSentSeq;
+        return enqueue(async () => {
+            await socketAcknowledged(socketSeq);
+            await resetGame(seq);
+        });
+    }
+
+    function handleHistoryStep(kind) {
+        // kind is 'undo' or 'redo': the server re-toggles one logged click
+        if (gameSocket && gameSocket.readyState === WebSocket.OPEN) {
+            socketSend({ type: kind, seq: ++clickSeq });
+            return;
+        }
+        undoButton.disabled = redoButton.disabled = true;
+        const seq = clickSeq; // Clicks up to here are sent before this step
+        return enqueue(async () => {
+            try {
+                const response = await fetch(`/api/${kind}` + COMPACT_QUERY, { method: 'POST' });
+                if (response.status === 409) {
+                    alert((await response.json()).message);
+                    await resetGame();
+                    return;
+                }
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                const data = await response.json();
+                applyServerState(data, seq);
+                checkWin(data);
+            } catch (error) {
+                console.error(`Error during ${kind}:`, error);
+                updateMoveCounter(); // Restores the buttons
+            }
+        });
+    }
+
     resetButton.addEventListener('click', handleResetGame);
+    undoButton.addEventListener('click', () => handleHistoryStep('undo'));
+    redoButton.addEventListener('click', () => handleHistoryStep('redo'));
 
-    // Initial setup: Fetch game state from server
-    fetchInitialGameState();
+    // Initial setup: Fetch game state from server (which also issues the session cookie)
+    fetchInitialGameState().then(connectGameChannel);
 });
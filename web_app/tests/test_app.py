@@ -0,0 +1,505 @@
+import unittest
+import os
+import tempfile
+import threading
+
+from web_app import app as app_module
+from web_app import ranking_utils
+from web_app import replay
+from web_app import metrics
+from web_app.wire import COMPACT_MIMETYPE, decode_state, encode_clicks
+from web_app.sessions import MAX_GAME_MOVES
+from web_app.tokens import MAX_TOKEN_CLICKS
+
+
+class TestApp(unittest.TestCase):
+
+    def setUp(self):
+        app_module.sessions = app_module.SessionRegistry()
+        self.app = app_module.app
+        self.app.testing = True
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_ranking_file_path = ranking_utils.RANKING_FILE_PATH
+        ranking_utils.RANKING_FILE_PATH = os.path.join(self.temp_dir.name, "ranking_jogo.txt")
+        self.original_replay_log_path = replay.REPLAY_LOG_PATH
+        replay.REPLAY_LOG_PATH = os.path.join(self.temp_dir.name, "ranking_replays.txt")
+
+    def tearDown(self):
+        app_module.score_writer.flush() # Queued scores go to this test's files
+        ranking_utils.RANKING_FILE_PATH = self.original_ranking_file_path
+        replay.REPLAY_LOG_PATH = self.original_replay_log_path
+        self.temp_dir.cleanup()
+
+    def test_each_browser_has_its_own_game(self):
+        alice = self.app.test_client()
+        bob = self.app.test_client()
+        alice.get('/api/click/0/0')
+        alice.get('/api/click/2/2')
+
+        self.assertEqual(alice.get('/api/gamestate').get_json()['moves'], 2)
+        bob_state = bob.get('/api/gamestate').get_json()
+        self.assertEqual(bob_state['moves'], 0)
+        self.assertTrue(all(cell == bob_state['light_off_char'] for row in bob_state['board'] for cell in row))
+
+    def test_reset_only_affects_own_game(self):
+        alice = self.app.test_client()
+        bob = self.app.test_client()
+        alice.get('/api/click/1/1')
+        bob.get('/api/click/3/3')
+        alice.get('/api/reset')
+        self.assertEqual(alice.get('/api/gamestate').get_json()['moves'], 0)
+        self.assertEqual(bob.get('/api/gamestate').get_json()['moves'], 1)
+
+    def test_compact_format_by_query_parameter(self):
+        client = self.app.test_client()
+        data = client.get('/api/click/0/0?format=compact').get_json()
+        self.assertEqual(data['changed'], [0, 1, 5])
+        self.assertEqual(decode_state(data['state']), 0b100011)
+        self.assertEqual(data['moves'], 1)
+        self.assertFalse(data['win'])
+        self.assertNotIn('board', data)
+
+    def test_compact_format_by_accept_header(self):
+        client = self.app.test_client()
+        data = client.get('/api/gamestate', headers={'Accept': COMPACT_MIMETYPE}).get_json()
+        self.assertEqual((data['rows'], data['cols'], data['moves']), (5, 5, 0))
+        self.assertEqual(decode_state(data['state']), 0)
+
+        client.get('/api/click/4/4')
+        data = client.get('/api/reset?format=compact').get_json()
+        self.assertEqual(data['changed'], [19, 23, 24])
+
+    def test_batched_moves(self):
+        client = self.app.test_client()
+        data = client.post('/api/moves?format=compact', json={'clicks': [[0, 0], [0, 0], [2, 2]]}).get_json()
+        self.assertEqual(data['moves'], 3)
+        self.assertEqual(data['changed'], [7, 11, 12, 13, 17])
+        self.assertFalse(data['win'])
+
+        solution = client.get('/api/solve').get_json()['clicks']
+        cells = [row * 5 + col for row, col in solution]
+        data = client.post('/api/moves', json={'packed': encode_clicks(cells)}).get_json()
+        self.assertTrue(data['win'])
+        self.assertEqual(data['moves'], 3 + len(cells))
+
+    def test_batched_moves_are_validated_up_front(self):
+        client = self.app.test_client()
+        response = client.post('/api/moves', json={'clicks': [[0, 0], [9, 9]]})
+        self.assertEqual(response.status_code, 400)
+        state = client.get('/api/gamestate?format=compact').get_json()
+        self.assertEqual(state['moves'], 0)
+        self.assertEqual(decode_state(state['state']), 0)
+
+    def test_games_have_a_move_cap(self):
+        client = self.app.test_client()
+        batch = {'clicks': [[0, 0]] * app_module.MAX_BATCH_MOVES}
+        for _ in range(MAX_GAME_MOVES // app_module.MAX_BATCH_MOVES):
+            self.assertEqual(client.post('/api/moves', json=batch).status_code, 200)
+        self.assertEqual(client.post('/api/moves', json={'clicks': [[0, 0]]}).status_code, 400)
+        self.assertEqual(client.get('/api/click/0/0').status_code, 400)
+        self.assertEqual(client.get('/api/gamestate').get_json()['moves'], MAX_GAME_MOVES)
+        client.get('/api/reset')
+        self.assertEqual(client.get('/api/click/0/0').status_code, 200)
+
+    def test_click_outside_board_is_rejected(self):
+        client = self.app.test_client()
+        self.assertEqual(client.get('/api/click/5/0').status_code, 400)
+        self.assertEqual(client.get('/api/gamestate').get_json()['moves'], 0)
+
+    def test_submit_score_is_verified_by_replay(self):
+        client = self.app.test_client()
+        # Not won yet: rejected whatever the claimed move count
+        client.get('/api/click/0/0')
+        response = client.post('/api/submit_score', json={'name': "Cheater", 'moves': 1})
+        self.assertEqual(response.status_code, 400)
+
+        solution = client.get('/api/solve').get_json()['clicks']
+        data = client.post('/api/moves', json={'clicks': solution}).get_json()
+        self.assertTrue(data['win'])
+        # Wrong move count: rejected
+        response = client.post('/api/submit_score', json={'name': "Cheater", 'moves': data['moves'] - 1})
+        self.assertEqual(response.status_code, 400)
+
+        response = client.post('/api/submit_score', json={'name': "Honest, Player", 'moves': data['moves']})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['rank'], 1)
+        app_module.score_writer.flush()
+        self.assertEqual(ranking_utils.get_rankings()[0]['name'], "Honest, Player")
+        # The same win cannot be submitted twice
+        response = client.post('/api/submit_score', json={'name': "Honest, Player", 'moves': data['moves']})
+        self.assertEqual(response.status_code, 400)
+
+        verified, failed = replay.audit_replay_log()
+        self.assertEqual((verified, failed), (1, []))
+
+    def test_submit_score_needs_a_name(self):
+        client = self.app.test_client()
+        solution = client.get('/api/solve').get_json()['clicks']
+        client.post('/api/moves', json={'clicks': solution})
+        for name in (5, None, "", "   ", "\n"):
+            response = client.post('/api/submit_score', json={'name': name, 'moves': len(solution)})
+            self.assertEqual(response.status_code, 400)
+        # Refused names leave the won game in place
+        response = client.post('/api/submit_score', json={'name': " Named ", 'moves': len(solution)})
+        self.assertEqual(response.status_code, 202)
+        app_module.score_writer.flush()
+        self.assertEqual([e['name'] for e in ranking_utils.get_rankings()], ["Named"])
+
+    def test_rule_variants(self):
+        client = self.app.test_client()
+        data = client.get('/api/reset?rule=toroidal').get_json()
+        self.assertEqual(data['rule'], 'toroidal')
+        client.get('/api/click/0/0')
+        state = client.get('/api/gamestate?format=compact').get_json()
+        self.assertEqual(state['rule'], 'toroidal')
+        self.assertEqual(decode_state(state['state']), (1 << 0) | (1 << 1) | (1 << 4) | (1 << 5) | (1 << 20))
+
+        client.get('/api/reset')  # Keeps the rule
+        solution = client.get('/api/solve').get_json()['clicks']
+        won = client.post('/api/moves', json={'clicks': solution}).get_json()
+        self.assertTrue(won['win'])
+        response = client.post('/api/submit_score', json={'name': "Torus", 'moves': won['moves']})
+        self.assertEqual(response.status_code, 202)
+        app_module.score_writer.flush()
+        entries = client.get('/api/ranking?rule=toroidal').get_json()['entries']
+        self.assertEqual([e['name'] for e in entries], ["Torus"])
+        self.assertEqual(client.get('/api/ranking').get_json()['total'], 0)
+        self.assertEqual(replay.audit_replay_log(), (1, []))
+
+        self.assertEqual(client.get('/api/reset?rule=hexagonal').status_code, 400)
+        # A stencil that leaves most cells untouched has too many equivalent solutions
+        self.assertEqual(client.get('/api/reset?rule=custom:3_3').status_code, 400)
+        data = client.get('/api/reset?rule=custom:0_0;1_1&tier=easy').get_json()
+        self.assertEqual((data['rule'], data['tier']), ('custom:0_0;1_1', 'easy'))
+
+    def test_costly_or_unwinnable_custom_stencils_are_refused(self):
+        client = self.app.test_client()
+        # Nullity 19 on 5x5: every solve would walk 2^19 equivalent solutions
+        self.assertEqual(client.get('/api/reset?rule=custom:-3_-2&tier=hard').status_code, 400)
+        self.assertEqual(client.get('/api/ranking?rule=custom:-3_-2').status_code, 400)
+        # Only ever toggles a right neighbor: the first column can never light up
+        self.assertEqual(client.get('/api/reset?rule=custom:0_1').status_code, 400)
+        self.assertEqual(client.get('/api/solve').get_json()['moves'], 15) # Still the classic game
+
+    def test_reset_with_tier_starts_from_a_puzzle(self):
+        client = self.app.test_client()
+        self.assertEqual(client.get('/api/reset?tier=nope').status_code, 400)
+        # Every rule reaches its own hard tier on 5x5 (these used to never finish)
+        for rule in ('toroidal', 'moore'):
+            hard = client.get(f'/api/reset?tier=hard&rule={rule}').get_json()
+            self.assertEqual((hard['rule'], hard['tier']), (rule, 'hard'))
+        data = client.get('/api/reset?format=compact&tier=medium&rule=classic').get_json()
+        self.assertEqual(data['tier'], 'medium')
+        self.assertNotEqual(decode_state(data['state']), 0)
+
+        solution = client.get('/api/solve').get_json()
+        self.assertEqual(solution['moves'], data['optimal_moves'])
+        won = client.post('/api/moves', json={'clicks': solution['clicks']}).get_json()
+        self.assertTrue(won['win'])
+        response = client.post('/api/submit_score', json={'name': "Puzzler", 'moves': won['moves']})
+        self.assertEqual(response.status_code, 202)
+        app_module.score_writer.flush()
+        self.assertEqual(replay.audit_replay_log(), (1, []))
+
+        data = client.get('/api/reset?format=compact').get_json()
+        self.assertEqual(decode_state(data['state']), 0)
+        self.assertNotIn('tier', data)
+
+    def test_hint(self):
+        client = self.app.test_client()
+        hint = client.get('/api/hint').get_json()
+        self.assertEqual(hint['moves_remaining'], 15)
+        row, col = hint['best_click']
+        client.get(f'/api/click/{row}/{col}')
+        self.assertEqual(client.get('/api/hint').get_json()['moves_remaining'], 14)
+
+    def test_metrics_endpoint(self):
+        client = self.app.test_client()
+        won_before = metrics.GAMES_WON.value()
+        solution = client.get('/api/solve').get_json()['clicks']
+        for row, col in solution:
+            client.get(f'/api/click/{row}/{col}')
+        ranking_utils.add_score("PlayerA", 20, "2023-01-01 10:00:00")
+        client.get('/ranking')
+
+        self.assertEqual(metrics.GAMES_WON.value() - won_before, 1)
+        self.assertGreaterEqual(
+            metrics.REQUEST_LATENCY.count({'route': '/api/click/<int:row>/<int:col>'}), len(solution))
+        response = client.get('/metrics')
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('jogo_http_request_duration_seconds_bucket{route="/ranking",le=', text)
+        self.assertIn('jogo_http_requests_total{method="GET",route="/api/solve",status="200"}', text)
+        self.assertIn('jogo_ranking_io_duration_seconds_count{operation="read"}', text)
+        self.assertIn('jogo_ranking_io_duration_seconds_count{operation="write"}', text)
+        self.assertIn('jogo_active_sessions 1', text)
+
+    def test_ranking_page_does_not_create_file(self):
+        response = self.app.test_client().get('/ranking')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(ranking_utils.RANKING_FILE_PATH))
+
+    def test_ranking_page_etag_and_304(self):
+        client = self.app.test_client()
+        ranking_utils.add_score("PlayerA", 20, "2023-01-01 10:00:00")
+        first = client.get('/ranking')
+        etag = first.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn("PlayerA", first.get_data(as_text=True))
+
+        cached = client.get('/ranking', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.get_data(), b'')
+
+        ranking_utils.add_score("PlayerB", 18, "2023-01-02 10:00:00")
+        updated = client.get('/ranking', headers={'If-None-Match': etag})
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated.headers['ETag'], etag)
+        self.assertIn("PlayerB", updated.get_data(as_text=True))
+
+    def test_ranking_pagination_and_rank(self):
+        client = self.app.test_client()
+        for i in range(25):
+            ranking_utils.add_score(f"Player{i}", 10 + i, "2023-01-01 10:00:00")
+        data = client.get('/api/ranking?page=3&size=10').get_json()
+        self.assertEqual((data['total'], data['pages']), (25, 3))
+        self.assertEqual([e['rank'] for e in data['entries']], list(range(21, 26)))
+        self.assertEqual(data['entries'][0]['name'], "Player20")
+
+        html = client.get('/ranking?page=2&size=10').get_data(as_text=True)
+        self.assertIn("Player10", html)
+        self.assertNotIn("Player9<", html)
+        self.assertIn("Página 2 de 3", html)
+
+        standing = client.get('/api/ranking/rank?moves=15').get_json()
+        self.assertEqual(standing, {'moves': 15, 'rank': 6, 'percentile': 76.0, 'total': 25})
+        self.assertEqual(client.get('/api/ranking/rank?moves=abc').status_code, 400)
+        self.assertEqual(client.get('/api/ranking?rows=99').status_code, 400)
+
+    def test_payloads_support_client_prediction(self):
+        client = self.app.test_client()
+        state = client.get('/api/gamestate?format=compact').get_json()
+        self.assertEqual(state['stencil'], {'offsets': [[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1]], 'wrap': False})
+        reset = client.get('/api/reset?rule=toroidal').get_json()
+        self.assertTrue(reset['stencil']['wrap'])
+        # Pipelined batches are acknowledged by the seq of their last click
+        data = client.post('/api/moves?format=compact', json={'clicks': [[0, 0], [1, 1]], 'seq': 7}).get_json()
+        self.assertEqual((data['seq'], data['moves']), (7, 2))
+        self.assertNotIn('seq', client.post('/api/moves', json={'clicks': [[0, 0]]}).get_json())
+
+    def test_undo_and_redo(self):
+        client = self.app.test_client()
+        self.assertEqual(client.post('/api/undo').status_code, 400)
+        client.get('/api/click/0/0')
+        client.get('/api/click/2/2')
+        data = client.post('/api/undo?format=compact').get_json()
+        self.assertEqual((data['moves'], data['changed']), (3, [7, 11, 12, 13, 17]))
+        self.assertEqual((data['can_undo'], data['can_redo']), (True, True))
+        data = client.post('/api/redo').get_json()
+        self.assertEqual((data['moves'], data['can_redo']), (4, False))
+        self.assertEqual(client.post('/api/redo').status_code, 400)
+        state = client.get('/api/gamestate').get_json()
+        self.assertEqual((state['can_undo'], state['can_redo']), (True, False))
+
+    def test_undo_and_redo_count_in_the_submitted_score(self):
+        client = self.app.test_client()
+        client.get('/api/click/0/0')
+        client.post('/api/undo')
+        client.post('/api/redo')
+        client.post('/api/undo')
+        solution = client.get('/api/solve').get_json()['clicks']
+        data = client.post('/api/moves', json={'clicks': solution}).get_json()
+        self.assertTrue(data['win'])
+        # One click, two undos and a redo are four moves on top of the solution
+        self.assertEqual(data['moves'], len(solution) + 4)
+        response = client.post('/api/submit_score', json={'name': "Undo", 'moves': len(solution)})
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/api/submit_score', json={'name': "Undo", 'moves': len(solution) + 4})
+        self.assertEqual(response.status_code, 202)
+        app_module.score_writer.flush()
+        self.assertEqual(ranking_utils.get_rankings()[0]['moves'], len(solution) + 4)
+        self.assertEqual(replay.audit_replay_log(), (1, []))
+
+    def test_ranking_board_sizes_are_separate(self):
+        client = self.app.test_client()
+        ranking_utils.add_score("Classic", 20, "2023-01-01 10:00:00")
+        ranking_utils.add_score("Bigger", 30, "2023-01-01 10:00:00", rows=6, cols=6)
+        self.assertEqual([e['name'] for e in client.get('/api/ranking?rows=6&cols=6').get_json()['entries']],
+                         ["Bigger"])
+        self.assertEqual(client.get('/api/ranking?rows=7&cols=7').get_json()['total'], 0)
+        self.assertFalse(os.path.exists(ranking_utils.ranking_file_path(7, 7)))
+        self.assertNotIn("Classic", client.get('/ranking?rows=6&cols=6').get_data(as_text=True))
+
+    def test_ranking_stream(self):
+        client = self.app.test_client()
+        ranking_utils.add_score("Streamed", 9, "2023-01-01 10:00:00")
+        for i in range(14):
+            ranking_utils.add_score(f"Player{i}", 20 + i, "2023-01-01 10:00:00")
+        response = client.get('/api/ranking/stream?size=20', multithread=True)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        first = next(iter(response.response)).decode('utf-8')
+        self.assertTrue(first.startswith("event: snapshot\n"))
+        self.assertIn('"name":"Streamed"', first)
+        # Every row of the page, not only the top 10, and the total
+        self.assertIn('"total":15', first)
+        self.assertIn('"rank":15', first)
+        response.close()
+        self.assertEqual(client.get('/api/ranking/stream?rows=99', multithread=True).status_code, 400)
+        self.assertIn('data-stream-url="/api/ranking/stream?rows=5',
+                      client.get('/ranking', multithread=True).get_data(as_text=True))
+
+    def test_ranking_stream_needs_a_threaded_server(self):
+        client = self.app.test_client()
+        # A sync worker would be held by the stream: refused, and the page does not subscribe
+        self.assertEqual(client.get('/api/ranking/stream').status_code, 503)
+        self.assertNotIn('data-stream-url', client.get('/ranking').get_data(as_text=True))
+        self.app.config['RANKING_STREAM'] = '1'
+        try:
+            self.assertIn('data-stream-url', client.get('/ranking').get_data(as_text=True))
+        finally:
+            self.app.config['RANKING_STREAM'] = 'auto'
+
+    def test_ranking_page_sees_external_writes(self):
+        client = self.app.test_client()
+        ranking_utils.add_score("PlayerA", 20, "2023-01-01 10:00:00")
+        etag = client.get('/ranking').headers['ETag']
+        with open(ranking_utils.RANKING_FILE_PATH, 'a', encoding='utf-8') as f:
+            f.write("OtherWorker,12,2023-01-03 10:00:00\n")
+        response = client.get('/ranking', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("OtherWorker", response.get_data(as_text=True))
+
+
+class TestStatelessApp(unittest.TestCase):
+    """Games carried by signed tokens instead of the session registry."""
+
+    def setUp(self):
+        app_module.sessions = app_module.SessionRegistry()
+        app_module.token_ledger = app_module.TokenLedger()
+        self.app = app_module.app
+        self.app.testing = True
+        self.app.config['STATELESS_GAMES'] = True
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_ranking_file_path = ranking_utils.RANKING_FILE_PATH
+        ranking_utils.RANKING_FILE_PATH = os.path.join(self.temp_dir.name, "ranking_jogo.txt")
+        self.original_replay_log_path = replay.REPLAY_LOG_PATH
+        replay.REPLAY_LOG_PATH = os.path.join(self.temp_dir.name, "ranking_replays.txt")
+
+    def tearDown(self):
+        self.app.config['STATELESS_GAMES'] = False
+        app_module.score_writer.flush()
+        ranking_utils.RANKING_FILE_PATH = self.original_ranking_file_path
+        replay.REPLAY_LOG_PATH = self.original_replay_log_path
+        self.temp_dir.cleanup()
+
+    def test_game_travels_in_the_token(self):
+        client = self.app.test_client()
+        client.get('/api/click/0/0')
+        response = client.get('/api/click/2/2') # The token comes back in the cookie
+        self.assertEqual(response.get_json()['moves'], 2)
+        token = response.headers[app_module.TOKEN_HEADER]
+        self.assertEqual(len(app_module.sessions), 0)
+
+        # Any worker holding the secret can continue from the header alone
+        other_worker = self.app.test_client(use_cookies=False)
+        response = other_worker.get('/api/gamestate', headers={app_module.TOKEN_HEADER: token})
+        self.assertEqual(response.get_json()['moves'], 2)
+        # Reads do not re-issue the token
+        self.assertNotIn(app_module.TOKEN_HEADER, response.headers)
+
+    def test_full_ledger_refuses_new_games_but_keeps_old_tokens_stale(self):
+        app_module.token_ledger = app_module.TokenLedger(capacity=1)
+        client = self.app.test_client(use_cookies=False)
+        token = client.get('/api/click/0/0').headers[app_module.TOKEN_HEADER]
+        newer = client.get('/api/click/1/1', headers={app_module.TOKEN_HEADER: token}).headers[app_module.TOKEN_HEADER]
+        # Tokenless requests cannot push the game out of the ledger
+        self.assertEqual(client.get('/api/gamestate').status_code, 503)
+        self.assertEqual(client.get('/api/click/2/2', headers={app_module.TOKEN_HEADER: token}).status_code, 409)
+        response = client.get('/api/click/2/2', headers={app_module.TOKEN_HEADER: newer})
+        self.assertEqual(response.get_json()['moves'], 3)
+
+    def test_forged_token_starts_a_new_game(self):
+        client = self.app.test_client(use_cookies=False)
+        token = client.get('/api/click/0/0').headers[app_module.TOKEN_HEADER]
+        forged = token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB')
+        response = client.get('/api/gamestate', headers={app_module.TOKEN_HEADER: forged})
+        self.assertEqual(response.get_json()['moves'], 0)
+
+    def test_stale_token_cannot_take_back_clicks(self):
+        client = self.app.test_client(use_cookies=False)
+        token = client.get('/api/click/0/0').headers[app_module.TOKEN_HEADER]
+        newer = client.get('/api/click/1/1', headers={app_module.TOKEN_HEADER: token}).headers[app_module.TOKEN_HEADER]
+        response = client.get('/api/click/3/3', headers={app_module.TOKEN_HEADER: token})
+        self.assertEqual(response.status_code, 409)
+        response = client.get('/api/click/3/3', headers={app_module.TOKEN_HEADER: newer})
+        self.assertEqual(response.get_json()['moves'], 3)
+        # Starting over is always allowed
+        response = client.get('/api/reset', headers={app_module.TOKEN_HEADER: token})
+        self.assertEqual(response.get_json()['moves'], 0)
+
+    def test_concurrent_replays_of_a_token_fork_nothing(self):
+        token = self.app.test_client(use_cookies=False).get('/api/click/0/0').headers[app_module.TOKEN_HEADER]
+        barrier = threading.Barrier(8)
+        statuses = []
+
+        def replay_token():
+            client = self.app.test_client(use_cookies=False)
+            barrier.wait()
+            statuses.append(client.get('/api/click/2/2', headers={app_module.TOKEN_HEADER: token}).status_code)
+
+        players = [threading.Thread(target=replay_token) for _ in range(8)]
+        for player in players:
+            player.start()
+        for player in players:
+            player.join()
+        self.assertEqual(sorted(statuses), [200] + [409] * 7)
+
+    def test_refused_write_still_renews_the_token(self):
+        client = self.app.test_client(use_cookies=False)
+        token = client.get('/api/click/0/0').headers[app_module.TOKEN_HEADER]
+        response = client.get('/api/click/9/9', headers={app_module.TOKEN_HEADER: token})
+        self.assertEqual(response.status_code, 400)
+        # The request claimed the token's next number: the old token is spent, the new one plays on
+        self.assertEqual(client.get('/api/click/1/1', headers={app_module.TOKEN_HEADER: token}).status_code, 409)
+        response = client.get('/api/click/1/1', headers={app_module.TOKEN_HEADER: response.headers[app_module.TOKEN_HEADER]})
+        self.assertEqual(response.get_json()['moves'], 2)
+
+    def test_won_token_is_submitted_once(self):
+        client = self.app.test_client(use_cookies=False)
+        token = client.get('/api/reset?tier=easy').headers[app_module.TOKEN_HEADER]
+        headers = {app_module.TOKEN_HEADER: token}
+        solution = client.get('/api/solve', headers=headers).get_json()['clicks']
+        response = client.post('/api/moves', json={'clicks': solution}, headers=headers)
+        self.assertTrue(response.get_json()['win'])
+        headers = {app_module.TOKEN_HEADER: response.headers[app_module.TOKEN_HEADER]}
+
+        response = client.post('/api/submit_score', json={'name': "Stateless", 'moves': len(solution)},
+                               headers=headers)
+        self.assertEqual(response.status_code, 202)
+        response = client.post('/api/submit_score', json={'name': "Stateless", 'moves': len(solution)},
+                               headers=headers)
+        self.assertEqual(response.status_code, 409)
+        app_module.score_writer.flush()
+        self.assertEqual([e['name'] for e in ranking_utils.get_rankings()], ["Stateless"])
+        self.assertEqual(replay.audit_replay_log(), (1, []))
+
+    def test_spent_token_is_refused_by_every_worker(self):
+        # Workers sharing the ledger file: a token submitted through one is spent for all
+        path = os.path.join(self.temp_dir.name, "token_ledger.sqlite3")
+        workers = [app_module.SqliteTokenLedger(path), app_module.SqliteTokenLedger(path)]
+        client = self.app.test_client(use_cookies=False)
+        app_module.token_ledger = workers[0]
+        token = client.get('/api/click/0/0').headers[app_module.TOKEN_HEADER]
+        client.get('/api/click/1/1', headers={app_module.TOKEN_HEADER: token})
+        app_module.token_ledger = workers[1]
+        response = client.get('/api/click/3/3', headers={app_module.TOKEN_HEADER: token})
+        self.assertEqual(response.status_code, 409)
+
+    def test_move_limit_keeps_token_small(self):
+        client = self.app.test_client()
+        response = client.post('/api/moves', json={'clicks': [[0, 0]] * (MAX_TOKEN_CLICKS + 1)})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
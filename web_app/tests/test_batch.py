@@ -0,0 +1,72 @@
+import random
+import unittest
+
+from web_app.game_logic import Game, LIGHT_ON, full_mask
+from web_app import batch
+from web_app.rules import PRESETS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestBatchGame(unittest.TestCase):
+
+    def run_against_games(self, count, rows, cols, steps, seed, rule=PRESETS['classic']):
+        rng = random.Random(seed)
+        games = [Game(rows, cols, rule) for _ in range(count)]
+        engine = batch.BatchGame(count, rows, cols, rule=rule)
+        for _ in range(steps):
+            # Includes out-of-range clicks, which Game ignores
+            click_rows = [rng.randrange(-1, rows + 1) for _ in range(count)]
+            click_cols = [rng.randrange(-1, cols + 1) for _ in range(count)]
+            wins = engine.click(click_rows, click_cols)
+            for game, row, col in zip(games, click_rows, click_cols):
+                game.toggle_cell_and_neighbors(row, col)
+            self.assertEqual(engine.get_states(), [game.state for game in games])
+            self.assertEqual(wins.tolist(), [game.check_win() for game in games])
+
+    def test_matches_game_on_classic_board(self):
+        self.run_against_games(200, 5, 5, 30, seed=1)
+
+    def test_matches_game_on_multi_word_boards(self):
+        self.run_against_games(50, 9, 13, 30, seed=2)
+        self.run_against_games(10, 1, 1, 10, seed=3)
+
+    def test_matches_game_with_other_rules(self):
+        self.run_against_games(50, 5, 5, 20, seed=4, rule=PRESETS['toroidal'])
+        self.run_against_games(50, 6, 7, 20, seed=5, rule=PRESETS['moore'])
+
+    def test_win_flags(self):
+        states = [full_mask(5, 5), 0, full_mask(5, 5) ^ (1 << 24)]
+        engine = batch.BatchGame(3, 5, 5, states=states)
+        self.assertEqual(engine.check_win().tolist(), [True, False, False])
+        game = Game()
+        game.state = states[2]
+        game.toggle_cell_and_neighbors(4, 4)
+        wins = engine.click_cells([-1, -1, 24])
+        self.assertEqual(engine.get_states()[2], game.state)
+        self.assertEqual(wins.tolist(), [True, False, game.check_win()])
+
+    def test_bool_boards_match_get_board(self):
+        rng = random.Random(5)
+        states = [rng.getrandbits(70) for _ in range(4)]
+        engine = batch.BatchGame(4, 7, 10, states=states)
+        boards = engine.to_bool_boards()
+        for state, board in zip(states, boards):
+            game = Game(7, 10)
+            game.state = state
+            expected = [[cell == LIGHT_ON for cell in row] for row in game.get_board()]
+            self.assertEqual(board.tolist(), expected)
+
+    def test_reset(self):
+        engine = batch.BatchGame(5, 4, 4)
+        engine.click_cells([0, 1, 2, 3, 4])
+        engine.reset()
+        self.assertEqual(engine.get_states(), [0] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
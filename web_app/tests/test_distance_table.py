@@ -0,0 +1,58 @@
+import random
+import tempfile
+import unittest
+
+from web_app.game_logic import full_mask
+from web_app.solver import optimal_moves
+from web_app import distance_table
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestDistanceTable(unittest.TestCase):
+
+    def test_distances_match_solver(self):
+        for rows, cols in ((1, 2), (2, 3), (3, 3), (4, 4)):
+            distances = distance_table.compute_distances(rows, cols)
+            for state in range(1 << (rows * cols)):
+                expected = optimal_moves(state, rows, cols)
+                value = int(distances[state])
+                self.assertEqual(None if value == distance_table.UNREACHABLE else value, expected)
+
+    def test_built_table_lookups_and_stats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            stats = distance_table.build_distance_table(4, 4, directory)
+            table = distance_table.load_distance_table(4, 4, directory)
+            try:
+                # 4x4 has a 4-dimensional null space: 16 solvability classes
+                self.assertEqual(stats['solvability_classes'], 16)
+                self.assertEqual(sum(stats['distribution'].values()), stats['winnable_states'])
+                self.assertEqual(table.stats, stats)
+                self.assertEqual(table.distance(full_mask(4, 4)), 0)
+                self.assertIsNone(table.best_click(full_mask(4, 4)))
+
+                rng = random.Random(8)
+                for _ in range(50):
+                    state = rng.getrandbits(16)
+                    remaining = table.distance(state)
+                    self.assertEqual(remaining, optimal_moves(state, 4, 4))
+                    # Following best_click reaches the goal in exactly `remaining` clicks
+                    while remaining:
+                        row, col = table.best_click(state)
+                        state ^= table._masks[row * 4 + col]
+                        self.assertEqual(table.distance(state), remaining - 1)
+                        remaining -= 1
+            finally:
+                table.close()
+
+    def test_missing_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(distance_table.load_distance_table(5, 5, directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import random
+
+from web_app import game_logic
+from web_app.game_logic import (
+    Game, LIGHT_ON, LIGHT_OFF, get_toggle_masks, full_mask, state_to_board, board_to_state
+)
+from web_app.rules import PRESETS, compile_rule
+
+
+def reference_toggle(board, row, col):
+    """List-of-lists toggle used by the original implementation, kept as an oracle."""
+    rows, cols = len(board), len(board[0])
+    for r, c in ((row, col), (row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+        if 0 <= r < rows and 0 <= c < cols:
+            board[r][c] = LIGHT_ON if board[r][c] == LIGHT_OFF else LIGHT_OFF
+
+
+class TestGameLogic(unittest.TestCase):
+
+    def test_initial_board_all_off(self):
+        game = Game()
+        self.assertEqual(game.get_board(), [[LIGHT_OFF] * 5 for _ in range(5)])
+        self.assertFalse(game.check_win())
+
+    def test_corner_toggle(self):
+        game = Game()
+        game.toggle_cell_and_neighbors(0, 0)
+        board = game.get_board()
+        self.assertEqual(board[0][:3], [LIGHT_ON, LIGHT_ON, LIGHT_OFF])
+        self.assertEqual(board[1][:2], [LIGHT_ON, LIGHT_OFF])
+        self.assertEqual(sorted(game._get_neighbors(0, 0)), [(0, 0), (0, 1), (1, 0)])
+
+    def test_invalid_cell_is_ignored(self):
+        game = Game()
+        game.toggle_cell_and_neighbors(5, 0)
+        game.toggle_cell_and_neighbors(-1, 2)
+        self.assertEqual(game.state, 0)
+
+    def test_click_is_its_own_inverse(self):
+        game = Game(7, 9)
+        game.toggle_cell_and_neighbors(3, 4)
+        game.toggle_cell_and_neighbors(3, 4)
+        self.assertEqual(game.state, 0)
+
+    def test_matches_reference_on_random_clicks(self):
+        rng = random.Random(1234)
+        for rows, cols in ((1, 1), (1, 6), (5, 5), (4, 7), (12, 12), (40, 33)):
+            game = Game(rows, cols)
+            board = [[LIGHT_OFF] * cols for _ in range(rows)]
+            for _ in range(200):
+                r, c = rng.randrange(rows), rng.randrange(cols)
+                game.toggle_cell_and_neighbors(r, c)
+                reference_toggle(board, r, c)
+            self.assertEqual(game.get_board(), board)
+            self.assertEqual(game.check_win(), all(cell == LIGHT_ON for row in board for cell in row))
+
+    def test_win_and_reset(self):
+        game = Game()
+        game.board = [[LIGHT_ON] * 5 for _ in range(5)]
+        self.assertTrue(game.check_win())
+        game.reset_board()
+        self.assertFalse(game.check_win())
+        self.assertEqual(game.state, 0)
+
+    def test_masks_are_shared_per_size(self):
+        self.assertIs(get_toggle_masks(5, 5), Game(5, 5)._masks)
+        self.assertEqual(len(get_toggle_masks(3, 4)), 12)
+
+    def test_large_boards_build_masks_from_the_row_stencil(self):
+        game = Game(300, 300)
+        self.assertIsNone(game._masks)
+        game.toggle_cell_and_neighbors(0, 299)
+        game.toggle_cell_and_neighbors(150, 150)
+        expected = {(0, 299), (1, 299), (0, 298),
+                    (150, 150), (149, 150), (151, 150), (150, 149), (150, 151)}
+        self.assertEqual(game.state, sum(1 << (r * 300 + c) for r, c in expected))
+
+    def test_row_stencil_matches_the_mask_table(self):
+        original = game_logic.MAX_MASK_TABLE_CELLS
+        game_logic.MAX_MASK_TABLE_CELLS = 0
+        try:
+            for rule in PRESETS.values():
+                for rows, cols in ((1, 1), (2, 2), (2, 3), (5, 5), (7, 4)):
+                    game = Game(rows, cols, rule)
+                    self.assertIsNone(game._masks)
+                    masks = tuple(game._mask(index) for index in range(rows * cols))
+                    self.assertEqual(masks, compile_rule(rule, rows, cols), (rule.name, rows, cols))
+        finally:
+            game_logic.MAX_MASK_TABLE_CELLS = original
+
+    def test_board_round_trip(self):
+        state = 0b1011001110
+        board = state_to_board(state, 2, 5)
+        self.assertEqual(board_to_state(board), state)
+        self.assertEqual(full_mask(2, 5), 0b1111111111)
+
+
+if __name__ == '__main__':
+    unittest.main()
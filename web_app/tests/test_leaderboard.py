@@ -0,0 +1,84 @@
+import random
+import unittest
+
+from web_app.leaderboard import Leaderboard
+
+
+class TestLeaderboard(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.scores = [(f"P{i}", rng.randint(1, 300), "2024-01-01") for i in range(2000)]
+        self.board = Leaderboard()
+        for name, moves, date_str in self.scores:
+            self.board.add(name, moves, date_str)
+        # Reference order: by moves, ties in insertion order
+        self.expected = sorted(self.scores, key=lambda score: score[1])
+
+    def test_pages_match_sorted_order(self):
+        for page, size in ((0, 10), (3, 37), (19, 100), (0, 5000)):
+            entries = self.board.page(page, size)
+            expected = self.expected[page * size:(page + 1) * size]
+            self.assertEqual([(e['name'], e['moves'], e['date']) for e in entries], expected)
+
+    def test_rank_and_percentile(self):
+        moves_list = [moves for _, moves, _ in self.scores]
+        for moves in (0, 1, 50, 150, 300, 301):
+            better = sum(1 for m in moves_list if m < moves)
+            worse = sum(1 for m in moves_list if m > moves)
+            self.assertEqual(self.board.rank_of(moves), better + 1)
+            self.assertAlmostEqual(self.board.percentile(moves), 100.0 * worse / len(moves_list))
+
+    def test_grows_for_large_move_counts(self):
+        self.board.add("Slow", 100000, "2024-01-01")
+        self.assertEqual(len(self.board), 2001)
+        self.assertEqual(self.board.rank_of(100000), 2001)
+        self.assertEqual(self.board.page(2000, 1)[0]['name'], "Slow")
+        self.assertEqual(self.board.top(3), self.board.page(0, 3))
+
+    def test_slots_follow_distinct_move_counts(self):
+        board = Leaderboard()
+        board.add("Huge", 10 ** 7, "2024-01-01")
+        board.add("Best", 3, "2024-01-01")
+        board.extend([(f"P{i}", 10 ** 7 - i % 100, "2024-01-01") for i in range(500)])
+        self.assertLess(len(board._tree), 200) # Not one slot per move
+        self.assertEqual(board.top(2)[0]['name'], "Best")
+        self.assertEqual(board.rank_of(10 ** 7), 502 - 5)
+        self.assertEqual(board.page(501, 1)[0]['name'], "P400")
+
+    def test_new_counts_in_any_order(self):
+        rng = random.Random(3)
+        board = Leaderboard()
+        scores = [(f"Q{i}", rng.randint(1, 10 ** 6), "2024-01-01") for i in range(300)]
+        for name, moves, date_str in scores:
+            board.add(name, moves, date_str)
+        expected = sorted(scores, key=lambda score: score[1])
+        self.assertEqual([(e['name'], e['moves'], e['date']) for e in board.page(0, 300)], expected)
+        for _, moves, _ in scores[::17]:
+            self.assertEqual(board.rank_of(moves), sum(1 for score in scores if score[1] < moves) + 1)
+
+    def test_extend_matches_adding_one_by_one(self):
+        bulk = Leaderboard()
+        bulk.add("First", 5, "2024-01-01")
+        bulk.extend(self.scores[:1000])
+        bulk.extend(self.scores[1000:1010]) # Small batches take the incremental path
+        bulk.extend(self.scores[1010:])
+        reference = Leaderboard()
+        reference.add("First", 5, "2024-01-01")
+        for name, moves, date_str in self.scores:
+            reference.add(name, moves, date_str)
+        self.assertEqual(len(bulk), len(reference))
+        self.assertEqual(bulk.page(0, 5000), reference.page(0, 5000))
+        self.assertEqual(bulk.rank_of(120), reference.rank_of(120))
+
+    def test_empty_and_invalid_pages(self):
+        empty = Leaderboard()
+        self.assertEqual(empty.page(0, 10), [])
+        self.assertEqual(empty.rank_of(10), 1)
+        self.assertEqual(empty.percentile(10), 100.0)
+        self.assertEqual(self.board.page(-1, 10), [])
+        self.assertEqual(self.board.page(0, 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
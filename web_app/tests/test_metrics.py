@@ -0,0 +1,48 @@
+import unittest
+
+from web_app.metrics import MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter('test_total', "A counter.")
+        counter.inc()
+        counter.inc(2, {'route': '/a'})
+        counter.inc(1, {'route': '/a'})
+        self.assertEqual(counter.value(), 1)
+        self.assertEqual(counter.value({'route': '/a'}), 3)
+        text = self.registry.render()
+        self.assertIn("# TYPE test_total counter", text)
+        self.assertIn('test_total{route="/a"} 3', text)
+        self.assertIs(self.registry.counter('test_total', "Same."), counter)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('latency_seconds', "A histogram.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, {'route': '/x'})
+        lines = self.registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{route="/x",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/x",le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{route="/x",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_count{route="/x"} 4', lines)
+        self.assertIn('latency_seconds_sum{route="/x"} 3.65', lines)
+        self.assertEqual(histogram.count({'route': '/x'}), 4)
+
+    def test_gauge_reads_callback(self):
+        values = [1]
+        self.registry.gauge('active', "A gauge.", lambda: values[0])
+        values[0] = 7
+        self.assertIn("active 7", self.registry.render())
+
+    def test_label_values_are_escaped(self):
+        counter = self.registry.counter('escaped_total', "Escaping.")
+        counter.inc(1, {'name': 'a"b\\c'})
+        self.assertIn('escaped_total{name="a\\"b\\\\c"} 1', self.registry.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
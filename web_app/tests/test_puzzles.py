@@ -0,0 +1,109 @@
+import time
+import unittest
+
+from web_app.game_logic import Game
+from web_app import puzzles
+from web_app.puzzles import PuzzlePool, generate_puzzle, tier_for, reachable_tiers, TIER_NAMES
+from web_app.rules import PRESETS, custom_rule
+from web_app.solver import max_optimal_moves
+
+
+class TestPuzzles(unittest.TestCase):
+
+    def test_generated_puzzle_is_solvable_in_optimal_moves(self):
+        for seed in range(20):
+            puzzle = generate_puzzle(5, 5, seed=seed)
+            game = Game(5, 5)
+            game.state = puzzle.state
+            clicks = game.solve()
+            self.assertEqual(len(clicks), puzzle.optimal_moves)
+            self.assertEqual(puzzle.tier, tier_for(puzzle.optimal_moves, 5, 5))
+
+    def test_puzzles_follow_the_rule(self):
+        for rule in PRESETS.values():
+            puzzle = generate_puzzle(5, 5, 'medium', seed=5, rule=rule)
+            self.assertEqual(puzzle.rule, rule)
+            game = Game(5, 5, rule)
+            game.state = puzzle.state
+            clicks = game.solve()
+            self.assertEqual(len(clicks), puzzle.optimal_moves)
+            for row, col in clicks:
+                game.toggle_cell_and_neighbors(row, col)
+            self.assertTrue(game.check_win())
+        pool = PuzzlePool(size=2)
+        self.assertEqual(pool.pop(5, 5, 'easy', PRESETS['moore']).rule, PRESETS['moore'])
+
+    def test_seed_reproduces_puzzle(self):
+        self.assertEqual(generate_puzzle(6, 6, 'hard', seed=99), generate_puzzle(6, 6, 'hard', seed=99))
+
+    def test_tiers(self):
+        self.assertEqual(tier_for(3, 5, 5), 'easy')
+        self.assertEqual(tier_for(9, 5, 5), 'medium')
+        self.assertEqual(tier_for(15, 5, 5), 'hard')
+
+    def test_tiers_follow_the_rule_distance_range(self):
+        # Largest optimal move counts on 5x5: no toroidal or 3x3 board needs 12 moves
+        self.assertEqual([max_optimal_moves(5, 5, PRESETS[name]) for name in ('classic', 'toroidal', 'moore')],
+                         [15, 8, 9])
+        self.assertEqual(tier_for(8, 5, 5, PRESETS['toroidal']), 'hard')
+        pool = PuzzlePool(size=2)
+        for rule in PRESETS.values():
+            self.assertEqual(reachable_tiers(5, 5, rule), TIER_NAMES)
+            for tier in TIER_NAMES:
+                self.assertEqual(pool.pop(5, 5, tier, rule).tier, tier)
+        pool.fill()
+        self.assertEqual(pool.available(5, 5, 'hard', PRESETS['toroidal']), 2)
+
+    def test_unreachable_tier_falls_back_to_the_nearest(self):
+        # On a single cell the only puzzle takes one move, the whole range
+        self.assertEqual(reachable_tiers(1, 1), ('hard',))
+        pool = PuzzlePool(size=2, board_sizes=((1, 1),))
+        self.assertEqual(pool.available(1, 1, 'easy'), 0)
+        self.assertEqual(pool.pop(1, 1, 'easy').tier, 'hard')
+        self.assertEqual(pool.fill(), 2)
+        self.assertEqual(pool.available(1, 1, 'hard'), 2)
+
+    def test_pool_pop_returns_requested_tier(self):
+        pool = PuzzlePool(size=4)
+        pool.fill()
+        for tier in TIER_NAMES:
+            self.assertEqual(pool.available(5, 5, tier), 4)
+            puzzle = pool.pop(5, 5, tier)
+            self.assertEqual(puzzle.tier, tier)
+            self.assertGreater(puzzle.optimal_moves, 0)
+            self.assertEqual(pool.available(5, 5, tier), 3)
+        # Sizes not registered up front are generated on demand
+        self.assertEqual(pool.pop(4, 6, 'easy').tier, 'easy')
+        with self.assertRaises(ValueError):
+            pool.pop(5, 5, 'impossible')
+
+    def test_custom_stencils_are_pooled_for_the_most_recent_boards(self):
+        pool = PuzzlePool(size=2, board_sizes=())
+        rules = [custom_rule([(0, 0), (1, dc)]) for dc in range(-3, 4)]
+        rules += [custom_rule([(0, 0), (2, dc)]) for dc in range(-3, 4)]
+        rules += [custom_rule([(0, 0), (3, dc)]) for dc in range(-3, 4)]
+        rules = rules[:puzzles.MAX_CUSTOM_BOARDS + 1]
+        tiers = [pool.pop(5, 5, 'easy', rule).tier for rule in rules]
+        pool.fill()
+        self.assertEqual(pool.available(5, 5, tiers[0], rules[0]), 0) # Least recently used, dropped
+        self.assertEqual(pool.available(5, 5, tiers[-1], rules[-1]), 2)
+        self.assertEqual(len({key[:3] for key in pool._pools}), puzzles.MAX_CUSTOM_BOARDS)
+
+    def test_background_thread_tops_up(self):
+        pool = PuzzlePool(size=3)
+        pool.start()
+        try:
+            deadline = time.monotonic() + 5
+            while pool.available(5, 5, 'hard') < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(pool.available(5, 5, 'hard'), 3)
+            pool.pop(5, 5, 'hard')
+            while pool.available(5, 5, 'hard') < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(pool.available(5, 5, 'hard'), 3)
+        finally:
+            pool.stop(timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import json
+import unittest
+
+from web_app.ranking_stream import RankingBroadcaster, diff_entries, SUBSCRIBER_BUFFER
+
+BOARD = (5, 5, 'classic')
+
+
+def entry(name, moves):
+    return {'name': name, 'moves': moves, 'date': "2024-01-01 10:00:00"}
+
+
+def parse(event):
+    lines = event.decode('utf-8').strip().split("\n")
+    return lines[0][len("event: "):], json.loads(lines[1][len("data: "):])
+
+
+class FakeRankings:
+    """First page, total and a version counter standing in for the ranking file."""
+
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self.total = len(self.entries)
+        self.version = 0
+        self.loads = 0
+
+    def set(self, entries, total=None):
+        self.entries = list(entries)
+        self.total = len(self.entries) if total is None else total
+        self.version += 1
+
+    def load(self, rows, cols, variant):
+        self.loads += 1
+        return list(self.entries), self.total
+
+    def version_of(self, rows, cols, variant):
+        return self.version
+
+
+class TestRankingBroadcaster(unittest.TestCase):
+
+    def setUp(self):
+        self.rankings = FakeRankings([entry("Ana", 10), entry("Bia", 12)])
+        # A long window: the tests drive refresh() themselves
+        self.broadcaster = RankingBroadcaster(window=3600, load=self.rankings.load,
+                                              version_of=self.rankings.version_of)
+
+    def test_diff_entries(self):
+        old = [entry("Ana", 10), entry("Bia", 12)]
+        new = [entry("Ana", 10), entry("Caio", 11), entry("Bia", 12)]
+        self.assertEqual(diff_entries(old, new), [[2, "Caio", 11, entry("x", 0)['date']],
+                                                  [3, "Bia", 12, entry("x", 0)['date']]])
+        self.assertEqual(diff_entries(new, new), [])
+
+    def test_snapshot_then_diff(self):
+        subscription = self.broadcaster.subscribe(BOARD)
+        kind, data = parse(subscription.next_event(0))
+        self.assertEqual(kind, 'snapshot')
+        self.assertEqual([(e['rank'], e['name']) for e in data['entries']], [(1, "Ana"), (2, "Bia")])
+        self.assertEqual(data['total'], 2)
+
+        self.rankings.set([entry("Caio", 8), entry("Ana", 10), entry("Bia", 12)])
+        self.assertTrue(self.broadcaster.refresh(BOARD))
+        kind, data = parse(subscription.next_event(0))
+        self.assertEqual(kind, 'diff')
+        self.assertEqual((data['version'], data['size'], data['total']), (1, 3, 3))
+        self.assertEqual([change[:2] for change in data['changes']], [[1, "Caio"], [2, "Ana"], [3, "Bia"]])
+        self.assertIsNone(subscription.next_event(0))
+
+    def test_unchanged_top_sends_nothing(self):
+        subscription = self.broadcaster.subscribe(BOARD)
+        subscription.next_event(0)
+        self.assertFalse(self.broadcaster.refresh(BOARD)) # Same version: not even read
+        self.rankings.set(self.rankings.entries)          # Written, but the top is the same
+        self.assertFalse(self.broadcaster.refresh(BOARD))
+        self.assertIsNone(subscription.next_event(0))
+
+    def test_new_score_shifts_every_row_below_it(self):
+        # More rows than the old top 10: the whole rendered page is streamed
+        page = [entry(f"P{i}", 10 + i) for i in range(15)]
+        self.rankings.set(page)
+        subscription = self.broadcaster.subscribe(BOARD)
+        self.assertEqual(len(parse(subscription.next_event(0))[1]['entries']), 15)
+        self.rankings.set(page[:2] + [entry("New", 11)] + page[2:])
+        self.broadcaster.refresh(BOARD)
+        kind, data = parse(subscription.next_event(0))
+        self.assertEqual((kind, data['size'], data['total']), ('diff', 16, 16))
+        # Old #10 is now #11, and every row from the new score down is renumbered
+        self.assertEqual([change[0] for change in data['changes']], list(range(3, 17)))
+        self.assertEqual([change[1] for change in data['changes']][8], "P9")
+
+    def test_score_below_the_page_updates_the_total(self):
+        subscription = self.broadcaster.subscribe(BOARD)
+        subscription.next_event(0)
+        self.rankings.set(self.rankings.entries, total=3)
+        self.assertTrue(self.broadcaster.refresh(BOARD))
+        kind, data = parse(subscription.next_event(0))
+        self.assertEqual((kind, data['total'], data['changes']), ('diff', 3, []))
+
+    def test_one_read_per_change_for_all_subscribers(self):
+        subscriptions = [self.broadcaster.subscribe(BOARD) for _ in range(500)]
+        self.assertEqual(self.rankings.loads, 1)
+        # Several writes within one window are coalesced into one update
+        self.rankings.set([entry("Caio", 8)] + self.rankings.entries)
+        self.rankings.set([entry("Duda", 7)] + self.rankings.entries)
+        self.broadcaster.refresh(BOARD)
+        self.assertEqual(self.rankings.loads, 2)
+        events = set()
+        for subscription in subscriptions:
+            subscription.next_event(0)
+            events.add(subscription.next_event(0))
+            self.assertIsNone(subscription.next_event(0))
+        self.assertEqual(len(events), 1) # The same encoded bytes for everyone
+        self.assertEqual(self.broadcaster.subscriber_count(), 500)
+        for subscription in subscriptions:
+            self.broadcaster.unsubscribe(subscription)
+        self.assertEqual(self.broadcaster.subscriber_count(), 0)
+
+    def test_lagging_subscriber_gets_a_snapshot(self):
+        stream = self.broadcaster.stream(BOARD, heartbeat=0)
+        self.assertEqual(parse(next(stream))[0], 'snapshot')
+        for moves in range(SUBSCRIBER_BUFFER + 5):
+            self.rankings.set([entry("Ana", 100 - moves)])
+            self.broadcaster.refresh(BOARD)
+        kind, data = parse(next(stream))
+        self.assertEqual(kind, 'snapshot')
+        self.assertEqual(data['entries'][0]['moves'], 100 - SUBSCRIBER_BUFFER - 4)
+        self.assertEqual(next(stream), b": keepalive\n\n")
+        stream.close()
+        self.assertEqual(self.broadcaster.subscriber_count(), 0)
+
+    def test_producer_stops_without_subscribers(self):
+        broadcaster = RankingBroadcaster(window=0.01, load=self.rankings.load, version_of=self.rankings.version_of)
+        subscription = broadcaster.subscribe(BOARD)
+        thread = broadcaster._thread
+        self.assertTrue(thread.is_alive())
+        broadcaster.unsubscribe(subscription)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(broadcaster._thread)
+        # The next subscriber starts a new one
+        subscription = broadcaster.subscribe(BOARD)
+        self.assertTrue(broadcaster._thread.is_alive())
+        broadcaster.unsubscribe(subscription)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
 import os
+import multiprocessing
+import threading
 from datetime import datetime
 
 # Adjust the import path based on how tests will be run.
@@ -18,17 +20,21 @@ class TestRankingUtils(unittest.TestCase):
         self.test_ranking_file_path = "/app/test_ranking_jogo.txt"  # Test file at /app root
         ranking_utils.RANKING_FILE_PATH = self.test_ranking_file_path
 
-        # Ensure the test ranking file is clean before each test
-        if os.path.exists(self.test_ranking_file_path):
-            os.remove(self.test_ranking_file_path)
+        # Ensure the test ranking files are clean before each test
+        for path in (self.test_ranking_file_path, ranking_utils.ranking_file_path(6, 6)):
+            if os.path.exists(path):
+                os.remove(path)
 
     def tearDown(self):
+        sized_path = ranking_utils.ranking_file_path(6, 6)
         # Restore the original RANKING_FILE_PATH
         ranking_utils.RANKING_FILE_PATH = self.original_ranking_file_path
 
-        # Clean up the test ranking file after each test
-        if os.path.exists(self.test_ranking_file_path):
-            os.remove(self.test_ranking_file_path)
+        # Clean up the test ranking files (and their lock files) after each test
+        for path in (self.test_ranking_file_path, self.test_ranking_file_path + ranking_utils.LOCK_FILE_SUFFIX,
+                     sized_path, sized_path + ranking_utils.LOCK_FILE_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_get_rankings_non_existent_file(self):
         """Test get_rankings when the ranking file does not exist."""
@@ -217,6 +223,160 @@ class TestRankingUtils(unittest.TestCase):
         self.assertEqual(len(rankings), 1)
         self.assertEqual(rankings[0]['name'], "ValidPlayer")
 
+    # --- Tests for the append-only storage engine ---
+
+    def test_name_with_commas_survives(self):
+        """Names containing commas are kept, since records are split from the right."""
+        ranking_utils.add_score("Silva, Rafael", 12, "2023-01-01 10:00:00")
+        rankings = ranking_utils.get_rankings()
+        self.assertEqual(rankings, [{'name': "Silva, Rafael", 'moves': 12, 'date': "2023-01-01 10:00:00"}])
+
+    def test_name_line_breaks_are_removed(self):
+        ranking_utils.add_score("Evil\nPlayer,1,2020-01-01 00:00:00", 30, "2023-01-01 10:00:00")
+        rankings = ranking_utils.get_rankings()
+        self.assertEqual(len(rankings), 1)
+        self.assertEqual(rankings[0]['moves'], 30)
+
+    def test_add_score_appends_instead_of_rewriting(self):
+        ranking_utils.add_score("PlayerA", 10, "2023-01-01 10:00:00")
+        ranking_utils.add_score("PlayerB", 5, "2023-01-02 10:00:00")
+        with open(self.test_ranking_file_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "PlayerA,10,2023-01-01 10:00:00\nPlayerB,5,2023-01-02 10:00:00\n")
+
+    def test_external_appends_and_rewrites_are_seen(self):
+        ranking_utils.add_score("PlayerA", 10, "2023-01-01 10:00:00")
+        self.assertEqual(len(ranking_utils.get_rankings()), 1)
+        # Another process appends a record...
+        with open(self.test_ranking_file_path, 'a', encoding='utf-8') as f:
+            f.write("PlayerB,3,2023-01-02 10:00:00\n")
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings()], ["PlayerB", "PlayerA"])
+        # ...or rewrites the file with different content.
+        with open(self.test_ranking_file_path, 'w', encoding='utf-8') as f:
+            f.write("PlayerC,7,2023-01-03 10:00:00\n")
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings()], ["PlayerC"])
+
+    def test_partial_last_line_is_not_lost(self):
+        with open(self.test_ranking_file_path, 'w', encoding='utf-8') as f:
+            f.write("PlayerA,10,2023-01-01 10:00:00\nHalfWritten,")
+        ranking_utils.add_score("PlayerB", 12, "2023-01-02 10:00:00")
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings()], ["PlayerA", "PlayerB"])
+
+    def test_every_score_is_kept_by_default(self):
+        for i in range(MAX_RANKING_ENTRIES + 6):
+            ranking_utils.add_score(f"Player{i}", 100 - i, "2023-01-01 10:00:00")
+        with open(self.test_ranking_file_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), MAX_RANKING_ENTRIES + 6)
+        self.assertEqual(len(ranking_utils.get_rankings()), MAX_RANKING_ENTRIES)
+
+    def test_compaction_keeps_top_scores(self):
+        original_limit, original_threshold = ranking_utils.MAX_STORED_ENTRIES, ranking_utils.COMPACTION_THRESHOLD
+        ranking_utils.MAX_STORED_ENTRIES, ranking_utils.COMPACTION_THRESHOLD = MAX_RANKING_ENTRIES, 5
+        try:
+            for i in range(MAX_RANKING_ENTRIES + 6):
+                ranking_utils.add_score(f"Player{i}", 100 - i, "2023-01-01 10:00:00")
+        finally:
+            ranking_utils.MAX_STORED_ENTRIES, ranking_utils.COMPACTION_THRESHOLD = original_limit, original_threshold
+        with open(self.test_ranking_file_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), MAX_RANKING_ENTRIES)
+        rankings = ranking_utils.get_rankings()
+        self.assertEqual(rankings[0]['moves'], 100 - (MAX_RANKING_ENTRIES + 5))
+
+    def test_ranking_pages(self):
+        with open(self.test_ranking_file_path, 'w', encoding='utf-8') as f:
+            for i in range(25):
+                f.write(f"Player{i},{25 - i},2023-01-01 10:00:00\n")
+        page, total = ranking_utils.get_ranking_page(1, 10)
+        self.assertEqual(total, 25)
+        self.assertEqual([r['moves'] for r in page], list(range(11, 21)))
+        page, _ = ranking_utils.get_ranking_page(2, 10)
+        self.assertEqual([r['moves'] for r in page], list(range(21, 26)))
+        self.assertEqual(ranking_utils.get_ranking_page(3, 10), ([], 25))
+
+    def test_rank_and_percentile(self):
+        for moves in (10, 12, 12, 15):
+            ranking_utils.add_score("Player", moves, "2023-01-01 10:00:00")
+        self.assertEqual(ranking_utils.get_rank(12), {'rank': 2, 'percentile': 25.0, 'total': 4})
+        self.assertEqual(ranking_utils.get_rank(9)['rank'], 1)
+        self.assertEqual(ranking_utils.get_rank(9)['percentile'], 100.0)
+        self.assertEqual(ranking_utils.get_rank(20)['rank'], 5)
+
+    def test_board_sizes_have_separate_rankings(self):
+        ranking_utils.add_score("Small", 10, "2023-01-01 10:00:00")
+        ranking_utils.add_score("Large", 30, "2023-01-01 10:00:00", rows=6, cols=6)
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings()], ["Small"])
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings(6, 6)], ["Large"])
+        self.assertNotEqual(ranking_utils.get_rankings_version(), ranking_utils.get_rankings_version(6, 6))
+
+    def test_large_file_is_sorted_stably(self):
+        """Ties keep file order when a large file is read in one go."""
+        with open(self.test_ranking_file_path, 'w', encoding='utf-8') as f:
+            for i in range(500):
+                f.write(f"Player{i},{(i * 7) % 50 + 1},2023-01-01 10:00:00\n")
+        rankings = ranking_utils.get_rankings()
+        expected = sorted(((i * 7) % 50 + 1, i) for i in range(500))[:MAX_RANKING_ENTRIES]
+        self.assertEqual([(r['moves'], int(r['name'][6:])) for r in rankings], expected)
+
+    def test_readers_do_not_wait_for_each_other(self):
+        ranking_utils.add_score("Player", 10, "2023-01-01 10:00:00")
+        with ranking_utils._FileLock(self.test_ranking_file_path, shared=True):
+            reader = threading.Thread(target=ranking_utils.get_rankings)
+            reader.start()
+            reader.join(5)
+            self.assertFalse(reader.is_alive())
+
+    def test_boards_do_not_wait_for_each_other(self):
+        with ranking_utils._FileLock(self.test_ranking_file_path):
+            writer = threading.Thread(target=ranking_utils.add_score, args=("Large", 30, "2023-01-01 10:00:00", 6, 6))
+            writer.start()
+            writer.join(5)
+            self.assertFalse(writer.is_alive())
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings(6, 6)], ["Large"])
+
+    def test_writer_waits_for_readers(self):
+        written = threading.Event()
+        with ranking_utils._FileLock(self.test_ranking_file_path, shared=True):
+            writer = threading.Thread(target=lambda: (ranking_utils.add_score("Player", 10, "2023-01-01 10:00:00"),
+                                                      written.set()))
+            writer.start()
+            self.assertFalse(written.wait(0.2))
+        writer.join(5)
+        self.assertTrue(written.is_set())
+        self.assertEqual(len(ranking_utils.get_rankings()), 1)
+
+    def test_threads_share_one_index_per_file(self):
+        path = self.test_ranking_file_path + ".index"
+        barrier = threading.Barrier(8)
+        found = []
+        def first_use():
+            barrier.wait()
+            found.append(ranking_utils._index_for(path))
+        threads = [threading.Thread(target=first_use) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        ranking_utils._indexes.pop(path, None)
+        self.assertEqual(len({id(index) for index in found}), 1)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "requires fork")
+    def test_concurrent_processes_do_not_lose_scores(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_add_many_scores, args=(self.test_ranking_file_path, w)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        with open(self.test_ranking_file_path, encoding='utf-8') as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 4 * 25)
+        self.assertTrue(all(ranking_utils.parse_record(line.strip()) for line in lines))
+
+
+def _add_many_scores(path, worker):
+    ranking_utils.RANKING_FILE_PATH = path
+    for i in range(25):
+        ranking_utils.add_score(f"Worker{worker}-{i}", i + 1, "2023-01-01 10:00:00")
+
 
 if __name__ == '__main__':
     unittest.main()
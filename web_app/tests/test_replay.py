@@ -0,0 +1,80 @@
+import os
+import random
+import tempfile
+import unittest
+
+from web_app.game_logic import Game
+from web_app.solver import solve_state
+from web_app.wire import encode_clicks
+from web_app import replay
+from web_app.rules import PRESETS
+
+
+def winning_log(rng, rows, cols, detour=10):
+    """A random detour followed by its own undo and an optimal solution, as cell indices."""
+    cells = [rng.randrange(rows * cols) for _ in range(detour)]
+    cells += list(reversed(cells))
+    cells += [row * cols + col for row, col in solve_state(0, rows, cols)]
+    return cells
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_replay_matches_game(self):
+        rng = random.Random(3)
+        game = Game(6, 8)
+        cells = [rng.randrange(48) for _ in range(100)]
+        for index in cells:
+            game.toggle_cell_and_neighbors(*divmod(index, 8))
+        self.assertEqual(replay.replay(cells, 6, 8), game.state)
+        self.assertIsNone(replay.replay([48], 6, 8))
+
+    def test_verify_game(self):
+        cells = winning_log(random.Random(1), 5, 5)
+        self.assertTrue(replay.verify_game(cells, 5, 5, len(cells)))
+        self.assertTrue(replay.verify_game(encode_clicks(cells), 5, 5, len(cells)))
+        self.assertFalse(replay.verify_game(cells, 5, 5, len(cells) - 1))
+        self.assertFalse(replay.verify_game(cells[:-1], 5, 5, len(cells) - 1))
+        self.assertFalse(replay.verify_game("not base64!", 5, 5, 3))
+
+    def test_verify_batch_serial_and_parallel(self):
+        rng = random.Random(2)
+        games = []
+        for i in range(replay.MIN_PARALLEL_BATCH):
+            cells = winning_log(rng, 5, 5, detour=rng.randrange(5))
+            claimed = len(cells) if i % 3 else len(cells) + 1
+            games.append((encode_clicks(cells), 5, 5, claimed))
+        expected = [bool(i % 3) for i in range(len(games))]
+        self.assertEqual(replay.verify_batch(games), expected)
+        self.assertEqual(replay.verify_batch(games, workers=2, chunk_size=500), expected)
+
+    def test_audit_replay_log(self):
+        rng = random.Random(4)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "replays.txt")
+            cells = winning_log(rng, 5, 5)
+            replay.append_replay_record("Name, with comma", len(cells), "2023-01-01 10:00:00", 5, 5, cells, path=path)
+            replay.append_replay_record("Spoofer", 3, "2023-01-01 10:00:00", 5, 5, cells[:3], path=path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("garbage\n")
+            verified, failed = replay.audit_replay_log(path)
+        self.assertEqual(verified, 1)
+        self.assertEqual(len(failed), 2)
+        self.assertEqual(failed[1]['name'], "Spoofer")
+
+    def test_records_keep_the_rule(self):
+        rule = PRESETS['toroidal']
+        cells = [row * 5 + col for row, col in solve_state(0, 5, 5, rule)]
+        self.assertTrue(replay.verify_game(cells, 5, 5, len(cells), rule=rule))
+        self.assertFalse(replay.verify_game(cells, 5, 5, len(cells)))
+        line = replay.format_replay_record("Torus, fan", len(cells), "2023-01-01 10:00:00", 5, 5, cells, rule=rule)
+        record = replay.parse_replay_record(line)
+        self.assertEqual((record['rule'], record['name']), (rule, "Torus, fan"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "replays.txt")
+            replay.append_replay_records([line], path=path)
+            self.assertEqual(replay.audit_replay_log(path), (1, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
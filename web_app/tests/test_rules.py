@@ -0,0 +1,78 @@
+import unittest
+
+from web_app.game_logic import Game, get_toggle_masks
+from web_app import rules
+from web_app.rules import CLASSIC, PRESETS, compile_rule, custom_rule, parse_rule, rule_slug
+
+
+def plus_masks(rows, cols):
+    """The original hand-written plus-shaped masks, as a reference."""
+    masks = []
+    for row in range(rows):
+        for col in range(cols):
+            index = row * cols + col
+            mask = 1 << index
+            if row > 0:
+                mask |= 1 << (index - cols)
+            if row < rows - 1:
+                mask |= 1 << (index + cols)
+            if col > 0:
+                mask |= 1 << (index - 1)
+            if col < cols - 1:
+                mask |= 1 << (index + 1)
+            masks.append(mask)
+    return tuple(masks)
+
+
+def toggled(mask, cols):
+    return {divmod(index, cols) for index in range(mask.bit_length()) if (mask >> index) & 1}
+
+
+class TestRules(unittest.TestCase):
+
+    def test_classic_matches_plus_shape(self):
+        for rows, cols in ((1, 1), (3, 7), (5, 5), (9, 4)):
+            self.assertEqual(get_toggle_masks(rows, cols), plus_masks(rows, cols))
+
+    def test_tables_are_compiled_once(self):
+        self.assertIs(compile_rule(PRESETS['moore'], 5, 5), compile_rule(PRESETS['moore'], 5, 5))
+
+    def test_toroidal_wraps_around(self):
+        masks = compile_rule(PRESETS['toroidal'], 5, 5)
+        self.assertEqual(toggled(masks[0], 5), {(0, 0), (1, 0), (4, 0), (0, 1), (0, 4)})
+        # Offsets landing on the same cell toggle it once
+        self.assertEqual(toggled(compile_rule(PRESETS['toroidal'], 2, 2)[0], 2), {(0, 0), (1, 0), (0, 1)})
+
+    def test_diagonal_and_moore(self):
+        diagonal = compile_rule(PRESETS['diagonal'], 5, 5)
+        self.assertEqual(toggled(diagonal[12], 5), {(2, 2), (1, 1), (1, 3), (3, 1), (3, 3)})
+        self.assertEqual(toggled(diagonal[0], 5), {(0, 0), (1, 1)})
+        moore = compile_rule(PRESETS['moore'], 5, 5)
+        self.assertEqual(len(toggled(moore[12], 5)), 9)
+        self.assertEqual(len(toggled(moore[0], 5)), 4)
+
+    def test_game_uses_the_rule(self):
+        game = Game(5, 5, PRESETS['toroidal'])
+        game.toggle_cell_and_neighbors(4, 4)
+        self.assertEqual(game._get_neighbors(4, 4), sorted(toggled(game.state, 5)))
+        self.assertIn((0, 4), game._get_neighbors(4, 4))
+
+    def test_custom_rules_round_trip(self):
+        rule = custom_rule([(0, 0), (0, 2), (2, 0)], wrap=True)
+        self.assertEqual(rule.name, "custom:0_0;0_2;2_0:wrap")
+        self.assertEqual(parse_rule(rule.name), rule)
+        self.assertEqual(parse_rule("custom:2_0;0_0;0_2:wrap"), rule)
+        self.assertEqual(parse_rule(None), CLASSIC)
+        self.assertEqual(parse_rule("moore"), PRESETS['moore'])
+        self.assertEqual(rule_slug(PRESETS['diagonal']), 'diagonal')
+        self.assertRegex(rule_slug(rule), r'^custom-[0-9a-f]{12}$')
+
+    def test_invalid_rules(self):
+        for name in ("hexagonal", "custom:", "custom:1", "custom:a_b", "custom:0_0:loop",
+                     f"custom:0_{rules.MAX_STENCIL_REACH + 1}", "custom:0_0_0"):
+            with self.assertRaises(ValueError):
+                parse_rule(name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from web_app import ranking_utils
+from web_app import replay
+from web_app.score_writer import ScoreWriter
+
+
+class TestScoreWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_ranking_file_path = ranking_utils.RANKING_FILE_PATH
+        ranking_utils.RANKING_FILE_PATH = os.path.join(self.temp_dir.name, "ranking_jogo.txt")
+        self.original_replay_log_path = replay.REPLAY_LOG_PATH
+        replay.REPLAY_LOG_PATH = os.path.join(self.temp_dir.name, "ranking_replays.txt")
+        self.writer = ScoreWriter(capacity=1000, batch_size=100)
+
+    def tearDown(self):
+        self.writer.stop()
+        ranking_utils.RANKING_FILE_PATH = self.original_ranking_file_path
+        replay.REPLAY_LOG_PATH = self.original_replay_log_path
+        self.temp_dir.cleanup()
+
+    def _lines(self, path):
+        with open(path, encoding='utf-8') as f:
+            return f.readlines()
+
+    def test_scores_are_written_in_batches(self):
+        batches = []
+        write_batch = self.writer.write_batch
+        self.writer.write_batch = lambda items: (batches.append(len(items)), write_batch(items))
+        # Hold the ranking lock so the submissions pile up behind the first batch
+        with ranking_utils._FileLock(ranking_utils.RANKING_FILE_PATH):
+            for i in range(250):
+                self.assertTrue(self.writer.submit(f"Player{i}", i + 1, "2024-01-01 10:00:00"))
+        self.writer.flush()
+        self.assertEqual(sum(batches), 250)
+        self.assertLessEqual(len(batches), 4)
+        self.assertEqual(len(self._lines(ranking_utils.RANKING_FILE_PATH)), 250)
+        self.assertEqual(ranking_utils.get_rankings()[0]['name'], "Player0")
+
+    def test_board_sizes_and_replay_records(self):
+        self.writer.submit("Small", 10, "2024-01-01 10:00:00", replay_record="replay-1\n")
+        self.writer.submit("Large", 20, "2024-01-01 10:00:00", 6, 6, replay_record="replay-2\n")
+        self.writer.flush()
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings()], ["Small"])
+        self.assertEqual([r['name'] for r in ranking_utils.get_rankings(6, 6)], ["Large"])
+        self.assertEqual(self._lines(replay.REPLAY_LOG_PATH), ["replay-1\n", "replay-2\n"])
+
+    def test_standing_counts_queued_scores_without_the_file(self):
+        ranking_utils.add_score("Written", 10, "2024-01-01 10:00:00")
+        self.assertEqual(self.writer.standing(12)['total'], 1)
+        held, release = threading.Event(), threading.Event()
+
+        def hold_ranking_lock():
+            with ranking_utils._FileLock(ranking_utils.RANKING_FILE_PATH):
+                held.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_ranking_lock)
+        holder.start()
+        held.wait()
+        try:
+            # The writer and any file access are stuck behind the lock; the standing is not
+            for moves in (5, 20):
+                self.assertTrue(self.writer.submit("Queued", moves, "2024-01-01 10:00:00"))
+            self.assertEqual(self.writer.standing(12), {'rank': 3, 'percentile': 33.33, 'total': 3})
+        finally:
+            release.set()
+            holder.join()
+        self.writer.flush()
+        self.assertEqual(self.writer.standing(12), {'rank': 3, 'percentile': 33.33, 'total': 3})
+
+    def test_full_queue_refuses_scores(self):
+        writer = ScoreWriter(capacity=2, batch_size=1)
+        try:
+            with ranking_utils._FileLock(ranking_utils.RANKING_FILE_PATH):
+                accepted = [writer.submit(f"Player{i}", i + 1, "2024-01-01 10:00:00") for i in range(5)]
+                self.assertIn(False, accepted)
+            writer.flush()
+        finally:
+            writer.stop()
+        self.assertEqual(len(ranking_utils.get_rankings()), accepted.count(True))
+
+    def test_stop_writes_everything_queued(self):
+        with ranking_utils._FileLock(ranking_utils.RANKING_FILE_PATH):
+            for i in range(50):
+                self.writer.submit(f"Player{i}", i + 1, "2024-01-01 10:00:00")
+            self.assertGreater(len(self.writer), 0)
+        self.writer.stop()
+        self.assertEqual(len(self._lines(ranking_utils.RANKING_FILE_PATH)), 50)
+        # Submitting again restarts the writer
+        self.writer.submit("Late", 1, "2024-01-01 10:00:00")
+        self.writer.flush()
+        self.assertEqual(len(self._lines(ranking_utils.RANKING_FILE_PATH)), 51)
+
+
+if __name__ == '__main__':
+    unittest.main()
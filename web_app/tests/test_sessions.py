@@ -0,0 +1,109 @@
+import unittest
+
+from web_app.sessions import SessionRegistry, GameSession
+from web_app import metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.registry = SessionRegistry(capacity=3, ttl=60, clock=self.clock)
+
+    def test_get_creates_and_reuses_session(self):
+        session = self.registry.get("a")
+        self.assertIsInstance(session, GameSession)
+        session.game.toggle_cell_and_neighbors(0, 0)
+        session.moves += 1
+        self.assertIs(self.registry.get("a"), session)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_sessions_are_independent(self):
+        first = self.registry.get("a")
+        second = self.registry.get("b")
+        first.game.toggle_cell_and_neighbors(2, 2)
+        self.assertEqual(second.game.state, 0)
+
+    def test_lru_eviction(self):
+        for session_id in ("a", "b", "c"):
+            self.registry.get(session_id)
+        self.registry.get("a")  # "b" becomes the least recently used
+        self.registry.get("d")
+        self.assertIn("a", self.registry)
+        self.assertNotIn("b", self.registry)
+        self.assertEqual(self.registry.evicted, 1)
+
+    def test_ttl_expiry(self):
+        self.registry.get("a")
+        self.clock.now = 30
+        self.registry.get("b")
+        self.clock.now = 61
+        self.assertNotIn("a", self.registry)
+        self.assertIn("b", self.registry)
+        self.assertEqual(self.registry.expired, 1)
+
+    def test_expired_session_starts_over(self):
+        session = self.registry.get("a")
+        session.moves = 4
+        self.clock.now = 120
+        self.assertEqual(self.registry.get("a").moves, 0)
+
+    def test_game_counters(self):
+        started = metrics.GAMES_STARTED.value()
+        won = metrics.GAMES_WON.value()
+        abandoned = metrics.GAMES_ABANDONED.value()
+        session = self.registry.get("a")
+        session.game.state = session.game._full ^ session.game._masks[12]
+        session.click(2, 2)  # Wins
+        session.reset()      # Won game: not abandoned
+        self.registry.get("b").click(0, 0)
+        self.clock.now = 120
+        self.registry.get("c")  # "a" and "b" expire; only "b" was unfinished
+        self.assertEqual(metrics.GAMES_STARTED.value() - started, 4)
+        self.assertEqual(metrics.GAMES_WON.value() - won, 1)
+        self.assertEqual(metrics.GAMES_ABANDONED.value() - abandoned, 2)
+
+    def test_undo_and_redo(self):
+        session = self.registry.get("a")
+        session.click(0, 0)
+        session.click(2, 2)
+        after_two = session.game.state
+        self.assertEqual(session.undo(), 12)
+        # The undo is a move too: logged, counted and replayed like a click
+        self.assertEqual((session.moves, list(session.history), list(session.undone)), (3, [0, 12, 12], [12]))
+        self.assertEqual(session.undo(), 0)
+        self.assertEqual(session.game.state, 0)
+        self.assertIsNone(session.undo())
+        self.assertEqual(session.redo(), 0)
+        self.assertEqual(session.redo(), 12)
+        self.assertEqual((session.game.state, session.moves), (after_two, 6))
+        self.assertIsNone(session.redo())
+        self.assertEqual(session.moves, len(session.history))
+
+        # A new click discards what was undone; the log stays a valid replay
+        session.undo()
+        session.click(4, 4)
+        self.assertEqual((list(session.history), len(session.undone)), ([0, 12, 12, 0, 0, 12, 12, 24], 0))
+        self.assertEqual(session.undo(), 24)
+        self.assertEqual(session.undo(), 0)
+        session.reset()
+        self.assertEqual((len(session.history), len(session.played), len(session.undone)), (0, 0, 0))
+
+    def test_memory_footprint_grows_with_sessions(self):
+        empty = self.registry.memory_footprint()
+        self.registry.get("a")
+        self.registry.get("b")
+        self.assertGreater(self.registry.memory_footprint(), empty)
+        self.assertEqual(self.registry.stats()['active'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import random
+from itertools import combinations
+
+from web_app.game_logic import Game, full_mask, get_toggle_masks
+from web_app.solver import (get_solver, solve_state, optimal_moves, LinearSolver, ChasingSolver,
+                            supports_chasing)
+from web_app import ranking_utils
+from web_app.rules import PRESETS, custom_rule
+
+
+def brute_force_minimum(state, rows, cols):
+    """Exhaustive search over click sets of growing size; only usable on tiny boards."""
+    masks = get_toggle_masks(rows, cols)
+    target = state ^ full_mask(rows, cols)
+    for size in range(rows * cols + 1):
+        for clicks in combinations(masks, size):
+            result = 0
+            for mask in clicks:
+                result ^= mask
+            if result == target:
+                return size
+    return None
+
+
+class TestSolver(unittest.TestCase):
+
+    def apply(self, game, clicks):
+        for row, col in clicks:
+            game.toggle_cell_and_neighbors(row, col)
+
+    def test_every_rule_is_solved_with_its_own_table(self):
+        rng = random.Random(11)
+        rules = list(PRESETS.values()) + [custom_rule([(0, 0), (0, 1), (1, 1)], wrap=True)]
+        for rule in rules:
+            for _ in range(5):
+                game = Game(5, 5, rule)
+                game.apply_moves(rng.sample(range(25), 8))
+                clicks = game.solve()
+                if clicks is None:
+                    continue
+                self.apply(game, clicks)
+                self.assertTrue(game.check_win(), rule.name)
+        self.assertIsNot(get_solver(5, 5), get_solver(5, 5, PRESETS['toroidal']))
+
+    def test_classic_board_from_all_off(self):
+        game = Game()
+        clicks = game.solve()
+        self.assertEqual(len(clicks), 15)
+        self.apply(game, clicks)
+        self.assertTrue(game.check_win())
+        self.assertEqual(ranking_utils.get_optimal_moves(), 15)
+
+    def test_already_won_board_needs_no_clicks(self):
+        game = Game(4, 6)
+        game.state = full_mask(4, 6)
+        self.assertEqual(game.solve(), [])
+
+    def test_unsolvable_state(self):
+        # 5x5 has a 2-dimensional null space, so a single lit corner is unreachable.
+        self.assertEqual(len(get_solver(5, 5).null_basis), 2)
+        self.assertIsNone(solve_state(full_mask(5, 5) ^ 1, 5, 5))
+
+    def test_minimal_against_brute_force(self):
+        rng = random.Random(7)
+        for rows, cols in ((2, 2), (3, 3), (2, 4), (4, 4)):
+            masks = get_toggle_masks(rows, cols)
+            for _ in range(10):
+                state = 0
+                for mask in masks:
+                    if rng.random() < 0.5:
+                        state ^= mask
+                self.assertEqual(optimal_moves(state, rows, cols), brute_force_minimum(state, rows, cols))
+
+    def test_random_solvable_boards(self):
+        rng = random.Random(42)
+        for rows, cols in ((5, 5), (6, 9), (9, 9), (12, 7)):
+            game = Game(rows, cols)
+            scramble = [(rng.randrange(rows), rng.randrange(cols)) for _ in range(60)]
+            self.apply(game, scramble)
+            clicks = game.solve()
+            self.assertIsNotNone(clicks)
+            self.apply(game, clicks)
+            self.assertTrue(game.check_win())
+
+    def test_solver_is_cached_per_size(self):
+        self.assertIs(get_solver(5, 5), get_solver(5, 5))
+
+
+class TestChasingSolver(unittest.TestCase):
+
+    # A click reaches only the cell straight above it, so it can be chased
+    SKEWED = custom_rule([(0, 0), (-1, 0), (1, -1), (1, 1), (0, 2)])
+
+    def apply(self, game, solution):
+        for index in range(game.rows * game.cols):
+            if (solution >> index) & 1:
+                game.toggle_cell_and_neighbors(*divmod(index, game.cols))
+
+    def test_supported_rules(self):
+        self.assertTrue(supports_chasing(PRESETS['classic']))
+        self.assertTrue(supports_chasing(self.SKEWED))
+        for name in ('toroidal', 'diagonal', 'moore'):
+            self.assertFalse(supports_chasing(PRESETS[name]))
+            with self.assertRaises(ValueError):
+                ChasingSolver(5, 5, PRESETS[name])
+
+    def test_agrees_with_elimination(self):
+        rng = random.Random(7)
+        for rule in (PRESETS['classic'], self.SKEWED):
+            for rows, cols in ((1, 1), (1, 6), (6, 1), (4, 4), (5, 5), (3, 8), (7, 7)):
+                chasing = ChasingSolver(rows, cols, rule)
+                linear = LinearSolver(get_toggle_masks(rows, cols, rule), rows * cols)
+                self.assertEqual((chasing.rank, len(chasing.null_basis)), (linear.rank, len(linear.null_basis)))
+                for vector in chasing.null_basis:
+                    game = Game(rows, cols, rule)
+                    self.apply(game, vector)
+                    self.assertEqual(game.state, 0)
+                for _ in range(30):
+                    target = rng.getrandbits(rows * cols)
+                    solution = chasing.particular_solution(target)
+                    self.assertEqual(solution is None, not linear.is_solvable(target))
+                    if solution is None:
+                        continue
+                    game = Game(rows, cols, rule)
+                    self.apply(game, solution)
+                    self.assertEqual(game.state, target)
+                    self.assertEqual(bin(chasing.minimal_solution(target)).count("1"),
+                                     bin(linear.minimal_solution(target)).count("1"))
+
+    def test_large_board(self):
+        rows, cols = 60, 80
+        self.assertIsInstance(get_solver(rows, cols), ChasingSolver)
+        game = Game(rows, cols)
+        game.state = random.Random(3).getrandbits(rows * cols)
+        clicks = solve_state(game.state, rows, cols, minimal=False)
+        self.assertIsNotNone(clicks)
+        for row, col in clicks:
+            game.toggle_cell_and_neighbors(row, col)
+        self.assertTrue(game.check_win())
+
+    def test_small_boards_keep_full_elimination(self):
+        self.assertIsInstance(get_solver(5, 5), LinearSolver)
+
+
+if __name__ == '__main__':
+    unittest.main()
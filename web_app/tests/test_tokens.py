@@ -0,0 +1,221 @@
+import os
+import tempfile
+import unittest
+
+from web_app.game_logic import Game
+from web_app.puzzles import generate_puzzle
+from web_app.replay import verify_game
+from web_app.rules import PRESETS
+from web_app.tokens import TokenCodec, TokenLedger, SqliteTokenLedger, TokenSession, InvalidToken, LedgerFull, MAX_TOKEN_CLICKS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.codec = TokenCodec("secret", ttl=60, clock=self.clock)
+
+    def test_round_trip(self):
+        session = self.codec.new_session()
+        session.reset(generate_puzzle(5, 5, 'medium', seed=7), None)
+        session.click(0, 0)
+        session.click(4, 3)
+        session.seq = 5
+
+        restored = self.codec.decode(self.codec.encode(session))
+        self.assertIsInstance(restored, TokenSession)
+        self.assertEqual(restored.game.state, session.game.state)
+        self.assertEqual(restored.moves, 2)
+        self.assertEqual(list(restored.history), [0, 23])
+        self.assertEqual(restored.start_state, session.start_state)
+        self.assertEqual(restored.puzzle.seed, 7)
+        self.assertEqual(restored.puzzle.tier, session.puzzle.tier)
+        self.assertEqual(restored.puzzle.optimal_moves, session.puzzle.optimal_moves)
+        self.assertEqual((restored.game_id, restored.seq), (session.game_id, 5))
+        self.assertEqual(restored.fingerprint(), session.fingerprint())
+
+    def test_redo_stack_survives(self):
+        session = self.codec.new_session()
+        session.click(0, 0)
+        session.click(1, 1)
+        session.click(2, 2)
+        session.undo()
+        session.undo()
+        restored = self.codec.decode(self.codec.encode(session))
+        self.assertEqual((list(restored.history), list(restored.played), list(restored.undone)),
+                         ([0, 6, 12, 12, 6], [0], [12, 6]))
+        self.assertEqual(restored.moves, 5)
+        self.assertEqual(restored.redo(), 6)
+        self.assertEqual(restored.undo(), 6)
+        self.assertEqual(restored.undo(), 0)
+        self.assertEqual(restored.game.state, Game(5, 5).state)
+
+    def test_rule_and_win_survive(self):
+        session = self.codec.new_session()
+        session.reset(rule=PRESETS['toroidal'])
+        for row, col in session.game.solve():
+            session.click(row, col)
+        restored = self.codec.decode(self.codec.encode(session))
+        self.assertEqual(restored.game.rule, PRESETS['toroidal'])
+        self.assertTrue(restored.won)
+        self.assertTrue(verify_game(restored.history, 5, 5, restored.moves,
+                                    restored.start_state, restored.game.rule))
+
+    def test_token_is_compact(self):
+        session = self.codec.new_session()
+        for index in range(100):
+            session.click(index % 5, index // 5 % 5)
+        # One byte and one bit per click on a 5x5 board, plus ~70 bytes of header and signature
+        self.assertLess(len(self.codec.encode(session)), 260)
+        for index in range(MAX_TOKEN_CLICKS - 100):
+            session.click(index % 5, index // 5 % 5)
+        self.assertLess(len(self.codec.encode(session)), 4000)  # Still fits in a cookie
+
+    def test_largest_redo_stack_fits_in_a_cookie(self):
+        session = self.codec.new_session()
+        for index in range(MAX_TOKEN_CLICKS // 2):
+            session.click(index % 5, index // 5 % 5)
+        while session.room_for(1):
+            session.undo()
+        self.assertEqual(len(session.undone), MAX_TOKEN_CLICKS // 2)
+        self.assertLess(len(self.codec.encode(session)), 4000)
+
+    def test_tampered_token_is_rejected(self):
+        session = self.codec.new_session()
+        session.click(2, 2)
+        token = self.codec.encode(session)
+        for position in (0, 10, len(token) // 2, len(token) - 1):
+            flipped = 'A' if token[position] != 'A' else 'B'
+            with self.assertRaises(InvalidToken):
+                self.codec.decode(token[:position] + flipped + token[position + 1:])
+        with self.assertRaises(InvalidToken):
+            self.codec.decode("not a token!")
+        with self.assertRaises(InvalidToken):
+            self.codec.decode("")
+
+    def test_other_secret_is_rejected(self):
+        token = self.codec.encode(self.codec.new_session())
+        with self.assertRaises(InvalidToken):
+            TokenCodec("other", clock=self.clock).decode(token)
+        # Workers sharing the secret accept each other's tokens
+        self.assertEqual(TokenCodec("secret", clock=self.clock).decode(token).moves, 0)
+
+    def test_expired_token_is_rejected(self):
+        token = self.codec.encode(self.codec.new_session())
+        self.clock.now += 61
+        with self.assertRaises(InvalidToken):
+            self.codec.decode(token)
+
+    def test_restore_keeps_game_counters(self):
+        session = TokenSession(Game(5, 5), 0)
+        game_id = session.game_id
+        session.reset()
+        self.assertNotEqual(session.game_id, game_id)
+        self.assertEqual(session.seq, 0)
+
+
+class TestTokenLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.ledger = TokenLedger(capacity=3, ttl=60, clock=self.clock)
+
+    def test_older_tokens_are_stale(self):
+        self.assertTrue(self.ledger.is_current(1, 1))  # Unknown games are accepted
+        self.assertTrue(self.ledger.advance(1, 3, 4))
+        self.assertTrue(self.ledger.is_current(1, 4))
+        self.assertFalse(self.ledger.is_current(1, 3))
+        self.assertTrue(self.ledger.is_current(2, 1))
+
+    def test_advance_is_a_compare_and_set(self):
+        self.assertTrue(self.ledger.advance(1, 0, 1))
+        self.assertTrue(self.ledger.advance(1, 1, 2))
+        self.assertFalse(self.ledger.advance(1, 1, 2))  # The same token played twice
+        self.assertFalse(self.ledger.advance(1, 0, 5))
+        self.assertTrue(self.ledger.is_current(1, 2))
+
+    def test_finished_games_are_stale(self):
+        self.ledger.advance(1, 3, 4)
+        self.ledger.finish(1)
+        self.assertFalse(self.ledger.is_current(1, 4))
+        self.assertFalse(self.ledger.is_current(1, 100))
+        self.assertFalse(self.ledger.advance(1, 4, 5))
+
+    def test_bounded_and_expires(self):
+        for game_id in range(3):
+            self.ledger.advance(game_id, 0, 1)
+        with self.assertRaises(LedgerFull):
+            self.ledger.advance(3, 0, 1)
+        self.assertEqual(len(self.ledger), 3)
+        self.assertTrue(self.ledger.advance(0, 1, 2)) # Known games still move on
+        self.clock.now += 61
+        self.ledger.advance(10, 0, 1)
+        self.assertEqual(len(self.ledger), 1)
+
+    def test_a_full_ledger_still_refuses_old_tokens(self):
+        self.ledger.advance(0, 0, 1)
+        self.ledger.advance(0, 1, 2)
+        for game_id in range(1, 10):
+            try:
+                self.ledger.advance(game_id, 0, 1)
+            except LedgerFull:
+                pass
+        self.assertFalse(self.ledger.is_current(0, 1))
+        self.assertFalse(self.ledger.advance(0, 1, 2))
+
+
+class TestSqliteTokenLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "ledger.sqlite3")
+        self.clock = FakeClock()
+        # Two instances on one file stand in for two worker processes
+        self.worker_a = SqliteTokenLedger(self.path, ttl=60, clock=self.clock)
+        self.worker_b = SqliteTokenLedger(self.path, ttl=60, clock=self.clock)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_workers_share_stale_and_finished_games(self):
+        game_id = (1 << 64) - 1  # Game ids use the whole unsigned range
+        self.assertTrue(self.worker_b.is_current(game_id, 1))
+        self.assertTrue(self.worker_a.advance(game_id, 3, 4))
+        self.assertFalse(self.worker_b.is_current(game_id, 3))
+        self.assertTrue(self.worker_b.is_current(game_id, 4))
+        self.assertFalse(self.worker_b.advance(game_id, 1, 2))  # A late write never takes the game back
+        self.assertFalse(self.worker_a.is_current(game_id, 3))
+        self.worker_b.finish(game_id)
+        self.assertFalse(self.worker_a.advance(game_id, 4, 9))
+        self.assertFalse(self.worker_a.is_current(game_id, 9))
+
+    def test_only_one_worker_advances_from_a_sequence_number(self):
+        # Unknown game: the second insert loses
+        self.assertTrue(self.worker_a.advance(7, 0, 1))
+        self.assertFalse(self.worker_b.advance(7, 0, 1))
+        # Known game: the second update loses
+        self.assertTrue(self.worker_b.advance(7, 1, 2))
+        self.assertFalse(self.worker_a.advance(7, 1, 2))
+        # An expired entry counts as unknown
+        self.clock.now += 61
+        self.assertTrue(self.worker_a.advance(7, 0, 1))
+
+    def test_expired_entries_are_ignored_and_purged(self):
+        self.worker_a.advance(1, 3, 4)
+        self.clock.now += 61
+        self.assertTrue(self.worker_b.is_current(1, 1))
+        self.worker_a._writes = -1  # The next write purges
+        self.worker_a.advance(2, 0, 1)
+        self.assertEqual(len(self.worker_b), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from web_app.game_logic import Game, get_toggle_masks
+from web_app.wire import (
+    encode_state, decode_state, changed_cells, compact_payload, encode_clicks, decode_clicks, parse_clicks,
+    unpack_varints, varint_width
+)
+
+
+class TestWire(unittest.TestCase):
+
+    def test_round_trip(self):
+        for rows, cols, state in ((5, 5, 0), (5, 5, (1 << 25) - 1), (3, 7, 0b101100111), (100, 100, 1 << 9999)):
+            encoded = encode_state(state, rows, cols)
+            self.assertEqual(decode_state(encoded), state)
+
+    def test_classic_board_is_short(self):
+        self.assertEqual(len(encode_state((1 << 25) - 1, 5, 5)), 8)
+
+    def test_changed_cells_of_a_click(self):
+        game = Game()
+        previous = game.state
+        game.toggle_cell_and_neighbors(2, 2)
+        self.assertEqual(changed_cells(previous, game.state), [7, 11, 12, 13, 17])
+        self.assertEqual(changed_cells(0, get_toggle_masks(5, 5)[0]), [0, 1, 5])
+
+    def test_compact_payload(self):
+        game = Game(4, 4)
+        game.toggle_cell_and_neighbors(0, 0)
+        payload = compact_payload(game, 1, previous_state=0)
+        self.assertEqual(payload['rows'], 4)
+        self.assertEqual(payload['moves'], 1)
+        self.assertEqual(payload['changed'], [0, 1, 4])
+        self.assertEqual(decode_state(payload['state']), game.state)
+        self.assertNotIn('changed', compact_payload(game, 1))
+
+    def test_clicks_round_trip(self):
+        cells = [0, 24, 127, 128, 300, 9999, 5]
+        self.assertEqual(decode_clicks(encode_clicks(cells)), cells)
+        # One byte per click on small boards
+        self.assertEqual(len(encode_clicks(range(24))), 32)
+
+    def test_parse_clicks(self):
+        self.assertEqual(parse_clicks({'clicks': [[0, 0], [4, 4], [2, 1]]}, 5, 5), [0, 24, 11])
+        self.assertEqual(parse_clicks({'packed': encode_clicks([3, 7])}, 5, 5), [3, 7])
+
+    def test_parse_clicks_rejects_bad_input(self):
+        for data in (None, {}, {'clicks': [[0, 5]]}, {'clicks': [[0]]}, {'clicks': [["0", 1]]},
+                     {'clicks': [[True, 1]]}, {'packed': encode_clicks([25])}, {'packed': 'gA=='},
+                     {'packed': '***'}):
+            with self.assertRaises(ValueError):
+                parse_clicks(data, 5, 5)
+
+    def test_varints_are_bounded(self):
+        self.assertEqual((varint_width(25), varint_width(128), varint_width(129), varint_width(10000)), (1, 1, 2, 2))
+        self.assertEqual(unpack_varints(b'\x7f', 128), [127])
+        for data, limit in ((b'\x80\x01', 128), (b'\x18', 24), (b'\xff' * 100000 + b'\x01', 1 << 32)):
+            with self.assertRaises(ValueError):
+                unpack_varints(data, limit)
+
+    def test_parse_clicks_limits_the_batch(self):
+        self.assertEqual(parse_clicks({'packed': encode_clicks([1] * 10)}, 5, 5, max_clicks=10), [1] * 10)
+        for data in ({'packed': encode_clicks([1] * 11)}, {'packed': 'A' * 100000}, {'clicks': [[0, 0]] * 11}):
+            with self.assertRaisesRegex(ValueError, "Máximo de 10"):
+                parse_clicks(data, 5, 5, max_clicks=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
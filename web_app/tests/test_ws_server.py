@@ -0,0 +1,178 @@
+import base64
+import json
+import os
+import socket
+import struct
+import threading
+import unittest
+
+from web_app.sessions import SessionRegistry
+from web_app.wire import decode_state
+from web_app import ws_server
+
+
+class WebSocketClient:
+    """Minimal blocking client, enough to talk to the game channel."""
+
+    def __init__(self, port, cookie=None, origin=None):
+        self.sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        headers = [f"GET {ws_server.WS_PATH} HTTP/1.1", f"Host: 127.0.0.1:{port}", "Upgrade: websocket",
+                   "Connection: Upgrade", f"Sec-WebSocket-Key: {key}", "Sec-WebSocket-Version: 13"]
+        if cookie:
+            headers.append(f"Cookie: {cookie}")
+        if origin:
+            headers.append(f"Origin: {origin}")
+        self.sock.sendall(("\r\n".join(headers) + "\r\n\r\n").encode('ascii'))
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = self.sock.recv(1024)
+            if not chunk:
+                break
+            response += chunk
+        self.status = int(response.split()[1])
+        if self.status == 101:
+            assert ws_server.accept_key(key).encode('ascii') in response
+
+    def send(self, opcode, payload):
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.sock.sendall(struct.pack('!BB', 0x80 | opcode, 0x80 | len(payload)) + mask + masked)
+
+    def recv(self):
+        first, second = self._read(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self._read(2))[0]
+        return first & 0x0F, self._read(length)
+
+    def request(self, message):
+        self.send(ws_server.OPCODE_TEXT, json.dumps(message).encode('utf-8'))
+        opcode, payload = self.recv()
+        return json.loads(payload)
+
+    def _read(self, count):
+        data = b""
+        while len(data) < count:
+            chunk = self.sock.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError("closed")
+            data += chunk
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+class TestGameChannel(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = SessionRegistry()
+        self.channel = ws_server.GameChannel(self.registry, host='127.0.0.1', port=0).start()
+
+    def tearDown(self):
+        self.channel.stop()
+
+    def test_clicks_update_the_shared_session(self):
+        client = WebSocketClient(self.channel.port, cookie="game_sid=player-1")
+        try:
+            self.assertEqual(client.status, 101)
+            reply = client.request({'type': 'click', 'row': 0, 'col': 0, 'seq': 1})
+            self.assertEqual(reply['type'], 'state')
+            self.assertEqual(reply['seq'], 1)
+            self.assertEqual(reply['changed'], [0, 1, 5])
+            self.assertEqual(reply['moves'], 1)
+            self.assertFalse(reply['win'])
+            # The REST side sees the same game
+            session = self.registry.get("player-1")
+            self.assertEqual(session.moves, 1)
+            self.assertEqual(decode_state(reply['state']), session.game.state)
+
+            state = client.request({'type': 'state', 'seq': 2})
+            self.assertNotIn('changed', state)
+            self.assertEqual(state['stencil']['offsets'][0], [0, 0])
+            self.assertNotIn('stencil', reply)
+            error = client.request({'type': 'click', 'row': 7, 'col': 0, 'seq': 3})
+            self.assertEqual(error['type'], 'error')
+            self.assertEqual(client.request(['nope'])['type'], 'error')
+        finally:
+            client.close()
+
+    def test_undo_and_redo(self):
+        client = WebSocketClient(self.channel.port, cookie="game_sid=player-2")
+        try:
+            client.request({'type': 'click', 'row': 2, 'col': 2, 'seq': 1})
+            reply = client.request({'type': 'undo', 'seq': 2})
+            self.assertEqual((reply['moves'], reply['changed']), (2, [7, 11, 12, 13, 17]))
+            self.assertEqual((reply['can_undo'], reply['can_redo']), (False, True))
+            self.assertEqual(client.request({'type': 'undo', 'seq': 3})['type'], 'error')
+            reply = client.request({'type': 'redo', 'seq': 4})
+            self.assertEqual((reply['moves'], reply['can_redo']), (3, False))
+        finally:
+            client.close()
+
+    def test_clicks_stop_at_the_move_cap(self):
+        session = self.registry.get("player-3")
+        session.game.apply_moves([0] * session.max_moves)
+        session.record([0] * session.max_moves)
+        reply = self.channel.handle_message("player-3", json.dumps({'type': 'click', 'row': 0, 'col': 0, 'seq': 1}))
+        self.assertEqual((reply['type'], reply['message']), ('error', 'Limite de jogadas atingido.'))
+        reply = self.channel.handle_message("player-3", json.dumps({'type': 'undo', 'seq': 2}))
+        self.assertEqual((reply['type'], reply['message']), ('error', 'Limite de jogadas atingido.'))
+        self.assertEqual(session.moves, session.max_moves)
+
+    def test_booleans_are_not_coordinates(self):
+        reply = self.channel.handle_message("player-4", json.dumps({'type': 'click', 'row': True, 'col': 0, 'seq': 1}))
+        self.assertEqual(reply['type'], 'error')
+        self.assertEqual(self.registry.get("player-4").moves, 0)
+
+    def test_session_lock_is_shared_with_the_rest_routes(self):
+        session = self.registry.get("player-5")
+        replies = []
+        message = json.dumps({'type': 'click', 'row': 0, 'col': 0, 'seq': 1})
+        worker = threading.Thread(target=lambda: replies.append(self.channel.handle_message("player-5", message)))
+        with session.lock: # As a Flask route holds it while it plays
+            worker.start()
+            worker.join(0.2)
+            self.assertTrue(worker.is_alive())
+            self.assertEqual(session.moves, 0)
+        worker.join(5)
+        self.assertEqual((replies[0]['moves'], list(session.history)), (1, [0]))
+
+    def test_a_locked_session_does_not_stall_other_connections(self):
+        session = self.registry.get("player-6")
+        blocked = WebSocketClient(self.channel.port, cookie="game_sid=player-6")
+        other = WebSocketClient(self.channel.port, cookie="game_sid=player-7")
+        try:
+            with session.lock:
+                blocked.send(ws_server.OPCODE_TEXT, json.dumps({'type': 'click', 'row': 0, 'col': 0, 'seq': 1}).encode('utf-8'))
+                reply = other.request({'type': 'click', 'row': 0, 'col': 0, 'seq': 1})
+                self.assertEqual(reply['moves'], 1)
+            opcode, payload = blocked.recv()
+            self.assertEqual(json.loads(payload)['moves'], 1)
+        finally:
+            blocked.close()
+            other.close()
+
+    def test_ping_and_close(self):
+        client = WebSocketClient(self.channel.port)
+        try:
+            client.send(ws_server.OPCODE_PING, b"hi")
+            self.assertEqual(client.recv(), (ws_server.OPCODE_PONG, b"hi"))
+            client.send(ws_server.OPCODE_CLOSE, struct.pack('!H', 1000))
+            opcode, _ = client.recv()
+            self.assertEqual(opcode, ws_server.OPCODE_CLOSE)
+        finally:
+            client.close()
+
+    def test_cross_origin_handshake_is_rejected(self):
+        client = WebSocketClient(self.channel.port, origin="http://evil.example")
+        self.assertEqual(client.status, 403)
+        client.close()
+        client = WebSocketClient(self.channel.port, origin="http://127.0.0.1:8080")
+        self.assertEqual(client.status, 101)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
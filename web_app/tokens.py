@@ -0,0 +1,372 @@
+"""
+Stateless, signed game-state tokens.
+
+In stateless mode (JOGO_STATELESS=1) a player's game is not kept in the
+session registry: it travels with every request as a token that any worker
+holding the same secret (JOGO_TOKEN_SECRET) can verify, update and re-issue,
+so games are not tied to one process. A token is a compact binary record
+signed with a truncated HMAC-SHA256 and base64url-encoded:
+
+    header (version, flags, size, moves, sequence number, issue time,
+            game id, puzzle seed, optimal moves, tier), rule name,
+    board, starting board, one bit per logged move (set for the clicks
+    still in effect, which undo takes back), move log then redo stack
+    (varints, see wire.pack_varints; the move count tells where the log ends)
+
+The click log keeps scores verifiable by replay exactly as in registry mode.
+A valid signature only proves that the server issued a token, not that it is
+the latest one: going back to an older token of the same game would take back
+clicks without counting them. TokenLedger remembers the highest sequence
+number issued for each game and which games are finished; tokens behind it
+are stale. A request that changes a game claims the next sequence number
+with a compare-and-set (advance) before it changes anything, so of two
+requests carrying the same token only one goes through; the other would
+fork the game. The ledger is the only state the workers must share, a few bytes per
+game: TokenLedger keeps it in one process's memory (enough with a single
+worker), SqliteTokenLedger in a SQLite file that every worker process on the
+host opens, which is what the app uses in stateless mode.
+"""
+import os
+import hmac
+import time
+import sqlite3
+import base64
+import struct
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+try:
+    from .game_logic import Game
+    from .rules import parse_rule
+    from .sessions import GameSession, new_history, new_positions, DEFAULT_TTL_SECONDS
+    from .puzzles import Puzzle, TIER_NAMES
+    from .wire import pack_varints, unpack_varints
+except ImportError:
+    from game_logic import Game
+    from rules import parse_rule
+    from sessions import GameSession, new_history, new_positions, DEFAULT_TTL_SECONDS
+    from puzzles import Puzzle, TIER_NAMES
+    from wire import pack_varints, unpack_varints
+
+TOKEN_VERSION = 2
+SIGNATURE_SIZE = 16     # Bytes of the HMAC-SHA256 digest kept in the token
+MAX_TOKEN_CLICKS = 1500 # Keeps a 5x5 token (one byte per logged or undone click) under the 4 KB cookie limit
+LEDGER_CAPACITY = 200000
+DEFAULT_LEDGER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "data", "token_ledger.sqlite3"))
+LEDGER_PURGE_INTERVAL = 1000 # Writes between two deletions of expired ledger rows
+
+# version, flags, rows, cols, moves, seq, issued at, game id, puzzle seed, optimal moves, tier, rule name length
+_HEADER = struct.Struct('>BBBBIIIQQHBH')
+_FLAG_WON = 0x01
+_FLAG_PUZZLE = 0x02
+_NO_OPTIMAL = 0xFFFF
+
+
+class InvalidToken(ValueError):
+    """The token is malformed, was not signed with our secret, or has expired."""
+
+
+class LedgerFull(Exception):
+    """The ledger holds `capacity` live games; a new one must wait for an entry to expire."""
+
+
+def new_game_id():
+    return secrets.randbits(64)
+
+
+class TokenSession(GameSession):
+    """
+    GameSession that lives in a token: adds the game id and the sequence
+    number of the last token issued for it. Starting over gives a new game id.
+    Its move cap is MAX_TOKEN_CLICKS so that the token still fits in a cookie.
+    """
+
+    __slots__ = ('game_id', 'seq')
+
+    max_moves = MAX_TOKEN_CLICKS
+
+    def __init__(self, game, now):
+        super().__init__(game, now)
+        self.game_id = new_game_id()
+        self.seq = 0
+
+    @classmethod
+    def restore(cls, game, moves, history, played, undone, puzzle, won, game_id, seq, now):
+        """Rebuilds a session from a token without counting it as a new game."""
+        session = cls.__new__(cls)
+        session.game = game
+        session.moves = moves
+        session.history = history
+        session.played = played
+        session.undone = undone
+        session.puzzle = puzzle
+        session.won = won
+        session.last_access = now
+        session.lock = threading.Lock()
+        session.game_id = game_id
+        session.seq = seq
+        return session
+
+    def reset(self, puzzle=None, rule=None):
+        super().reset(puzzle, rule)
+        self.game_id = new_game_id()
+        self.seq = 0
+
+    def fingerprint(self):
+        """Everything a token carries that a request can change."""
+        return (self.game_id, self.moves, len(self.undone), self.game.state, self.won, self.game.rule)
+
+
+class TokenCodec:
+    """
+    Signs and verifies game tokens with `secret` (bytes or str). Without a
+    secret a random one is drawn, so tokens are only valid in this process.
+    Tokens not re-issued for `ttl` seconds expire.
+    """
+
+    def __init__(self, secret=None, ttl=DEFAULT_TTL_SECONDS, clock=time.time):
+        if not secret:
+            secret = secrets.token_bytes(32)
+        elif isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        self._secret = secret
+        self.ttl = ttl
+        self._clock = clock
+
+    def _sign(self, body):
+        return hmac.new(self._secret, body, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+    def new_session(self, rows=5, cols=5):
+        return TokenSession(Game(rows, cols), self._clock())
+
+    def encode(self, session):
+        game = session.game
+        puzzle = session.puzzle
+        flags = (_FLAG_WON if session.won else 0) | (_FLAG_PUZZLE if puzzle is not None else 0)
+        seed = optimal = tier = 0
+        if puzzle is not None:
+            seed = puzzle.seed or 0
+            optimal = _NO_OPTIMAL if puzzle.optimal_moves is None else puzzle.optimal_moves
+            tier = TIER_NAMES.index(puzzle.tier) + 1 if puzzle.tier in TIER_NAMES else 0
+        rule_name = game.rule.name.encode('utf-8')
+        size = (game.rows * game.cols + 7) // 8
+        # played is ascending (every click or redo is logged after the ones still in effect)
+        in_effect = bytearray((session.moves + 7) // 8)
+        for position in session.played:
+            in_effect[position >> 3] |= 1 << (position & 7)
+        body = b''.join((
+            _HEADER.pack(TOKEN_VERSION, flags, game.rows, game.cols, session.moves, session.seq,
+                         int(self._clock()), session.game_id, seed, optimal, tier, len(rule_name)),
+            rule_name,
+            game.state.to_bytes(size, 'little'),
+            session.start_state.to_bytes(size, 'little'),
+            bytes(in_effect),
+            pack_varints(session.history),
+            pack_varints(session.undone),
+        ))
+        return base64.urlsafe_b64encode(body + self._sign(body)).rstrip(b'=').decode('ascii')
+
+    def decode(self, token):
+        """Returns the TokenSession carried by `token`. Raises InvalidToken."""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        except (TypeError, ValueError):
+            raise InvalidToken("Malformed token") from None
+        if base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii') != token:
+            # Stray characters or unused low bits in the last character: one token, one spelling
+            raise InvalidToken("Malformed token")
+        body, signature = raw[:-SIGNATURE_SIZE], raw[-SIGNATURE_SIZE:]
+        if len(body) < _HEADER.size or not hmac.compare_digest(signature, self._sign(body)):
+            raise InvalidToken("Bad token signature")
+        (version, flags, rows, cols, moves, seq, issued_at,
+         game_id, seed, optimal, tier, rule_length) = _HEADER.unpack_from(body)
+        if version != TOKEN_VERSION:
+            raise InvalidToken(f"Unsupported token version {version}")
+        now = self._clock()
+        if issued_at + self.ttl < now:
+            raise InvalidToken("Expired token")
+
+        offset = _HEADER.size
+        size = (rows * cols + 7) // 8
+        try:
+            rule = parse_rule(body[offset:offset + rule_length].decode('utf-8'))
+            offset += rule_length
+            state = int.from_bytes(body[offset:offset + size], 'little')
+            start_state = int.from_bytes(body[offset + size:offset + 2 * size], 'little')
+            offset += 2 * size
+            in_effect = body[offset:offset + (moves + 7) // 8]
+            offset += len(in_effect)
+            clicks = unpack_varints(body[offset:], rows * cols)
+            history = new_history(rows, cols)
+            history.extend(clicks[:moves])
+            undone = new_history(rows, cols)
+            undone.extend(clicks[moves:])
+            played = new_positions()
+            played.extend(position for position in range(moves)
+                          if position >> 3 < len(in_effect) and in_effect[position >> 3] >> (position & 7) & 1)
+        except (ValueError, OverflowError) as error:
+            raise InvalidToken(f"Malformed token: {error}") from None
+        if len(history) != moves:
+            raise InvalidToken("Malformed token: move log does not match the move count")
+
+        game = Game(rows, cols, rule)
+        game.state = state
+        puzzle = None
+        if flags & _FLAG_PUZZLE:
+            puzzle = Puzzle(rows, cols, start_state, None if optimal == _NO_OPTIMAL else optimal,
+                            TIER_NAMES[tier - 1] if tier else None, seed, rule)
+        return TokenSession.restore(game, moves, history, played, undone, puzzle, bool(flags & _FLAG_WON),
+                                    game_id, seq, now)
+
+
+class TokenLedger:
+    """
+    Latest sequence number issued per game id, and the game ids that are
+    finished (submitted or started over). Bounded, thread-safe, and entries
+    idle for longer than the token TTL are dropped, since their tokens have
+    expired anyway. A live entry is never evicted, as its game's older tokens
+    would pass again: a new game raises LedgerFull while the ledger is full.
+    """
+
+    _FINISHED = -1
+
+    def __init__(self, capacity=LEDGER_CAPACITY, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._clock = clock
+        self._games = OrderedDict()  # game id -> (latest seq or _FINISHED, last update)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._games)
+
+    def _expire(self, now):
+        games = self._games
+        deadline = now - self.ttl
+        while games and next(iter(games.values()))[1] <= deadline:
+            games.popitem(last=False)
+
+    def _set(self, game_id, seq, expected=None):
+        """
+        Stores `seq`; with `expected`, only if the game is unknown or still at
+        `expected`. Raises LedgerFull for an unknown game when there is no room.
+        """
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            games = self._games
+            entry = games.pop(game_id, None)
+            if expected is not None and entry is not None and entry[0] != expected:
+                games[game_id] = entry
+                return False
+            if entry is None and len(games) >= self.capacity:
+                raise LedgerFull(f"{len(games)} games are live in the token ledger")
+            games[game_id] = (seq, now)
+            return True
+
+    def is_current(self, game_id, seq):
+        """False if a newer token of this game was issued or the game is finished."""
+        with self._lock:
+            entry = self._games.get(game_id)
+        if entry is None:
+            return True
+        latest = entry[0]
+        return latest != self._FINISHED and seq >= latest
+
+    def advance(self, game_id, expected, seq):
+        """
+        Compare-and-set: moves the game from sequence number `expected` to
+        `seq`. Returns False, changing nothing, if another token of the game
+        was issued since or the game is finished.
+        """
+        return self._set(game_id, seq, expected)
+
+    def finish(self, game_id):
+        self._set(game_id, self._FINISHED)
+
+
+class SqliteTokenLedger:
+    """
+    TokenLedger shared by every process that opens the same SQLite file, so
+    a stale or spent token is refused whichever worker it reaches. Same
+    interface; entries idle for longer than the token TTL are deleted every
+    LEDGER_PURGE_INTERVAL writes. Each advance is a single conditional
+    statement, so two workers can never both move a game on from the same
+    sequence number, and a finished game stays finished.
+    """
+
+    _FINISHED = -1
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, ttl=DEFAULT_TTL_SECONDS, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self._clock = clock
+        self._local = threading.local() # SQLite connections are per thread
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS token_ledger ("
+                               "game_id INTEGER PRIMARY KEY, seq INTEGER NOT NULL, updated REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS token_ledger_updated ON token_ledger (updated)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL") # Readers never wait for a writer
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _key(game_id):
+        """Game ids are unsigned 64-bit; SQLite integers are signed."""
+        return game_id - (1 << 64) if game_id >= 1 << 63 else game_id
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM token_ledger").fetchone()[0]
+
+    def _purge(self, now):
+        self._writes += 1
+        if self._writes % LEDGER_PURGE_INTERVAL == 0:
+            self._connection().execute("DELETE FROM token_ledger WHERE updated <= ?", (now - self.ttl,))
+
+    def is_current(self, game_id, seq):
+        """False if a newer token of this game was issued or the game is finished."""
+        row = self._connection().execute("SELECT seq, updated FROM token_ledger WHERE game_id = ?",
+                                         (self._key(game_id),)).fetchone()
+        if row is None or row[1] <= self._clock() - self.ttl:
+            return True
+        return row[0] != self._FINISHED and seq >= row[0]
+
+    def advance(self, game_id, expected, seq):
+        """
+        Compare-and-set: moves the game from sequence number `expected` to
+        `seq`. Returns False, changing nothing, if another token of the game
+        was issued since or the game is finished.
+        """
+        now = self._clock()
+        key = self._key(game_id)
+        connection = self._connection()
+        # An expired row counts as no row, as in is_current
+        moved = connection.execute(
+            "UPDATE token_ledger SET seq = ?, updated = ? WHERE game_id = ? AND (seq = ? OR updated <= ?)",
+            (seq, now, key, expected, now - self.ttl)).rowcount
+        if not moved:
+            # Unknown game; if another worker inserts it first, it won the race
+            moved = connection.execute("INSERT OR IGNORE INTO token_ledger (game_id, seq, updated) VALUES (?, ?, ?)",
+                                       (key, seq, now)).rowcount
+        self._purge(now)
+        return moved > 0
+
+    def finish(self, game_id):
+        now = self._clock()
+        self._connection().execute(
+            "INSERT INTO token_ledger (game_id, seq, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT (game_id) DO UPDATE SET seq = excluded.seq, updated = excluded.updated",
+            (self._key(game_id), self._FINISHED, now))
+        self._purge(now)
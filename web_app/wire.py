@@ -0,0 +1,162 @@
+"""
+Compact wire format for board states.
+
+Instead of a 2D array of emoji strings, a board travels as its bitmask
+packed into little-endian bytes and base64-encoded (bit i = cell
+row * cols + col, 1 = ON), plus the list of cell indices that changed.
+A 5x5 board fits in 8 characters; a 100x100 board in ~1.7 KB instead of
+~100 KB of JSON.
+
+Click sequences travel either as a JSON list of [row, col] pairs or as a
+packed string: each cell index as an unsigned LEB128 varint (one byte per
+click on boards up to 128 cells), base64url-encoded. Decoding rejects any
+varint wider than the board needs, so a hostile payload cannot make the
+decoder build ever larger integers.
+"""
+import base64
+
+COMPACT_MIMETYPE = 'application/vnd.jogo-das-luzes.compact+json'
+COMPACT_FORMAT = 'compact'
+
+
+def encode_state(state, rows, cols):
+    """Packs a board bitmask into a base64 string."""
+    size = (rows * cols + 7) // 8
+    return base64.b64encode(state.to_bytes(size, 'little')).decode('ascii')
+
+
+def decode_state(encoded):
+    """Inverse of encode_state."""
+    return int.from_bytes(base64.b64decode(encoded), 'little')
+
+
+def changed_cells(old_state, new_state):
+    """Indices (row * cols + col) of the cells whose light differs between two states."""
+    diff = old_state ^ new_state
+    cells = []
+    while diff:
+        low_bit = diff & -diff
+        cells.append(low_bit.bit_length() - 1)
+        diff ^= low_bit
+    return cells
+
+
+def wants_compact(args, accept_mimetypes):
+    """
+    True when the client asked for the compact format, either with
+    `?format=compact` or by listing COMPACT_MIMETYPE in its Accept header.
+    """
+    if args.get('format') == COMPACT_FORMAT:
+        return True
+    return COMPACT_MIMETYPE in accept_mimetypes.values()
+
+
+def compact_payload(game, moves, previous_state=None):
+    """Compact response body for a game; includes `changed` when the previous state is known."""
+    payload = {
+        'rows': game.rows,
+        'cols': game.cols,
+        'state': encode_state(game.state, game.rows, game.cols),
+        'moves': moves,
+        'rule': game.rule.name,
+    }
+    if previous_state is not None:
+        payload['changed'] = changed_cells(previous_state, game.state)
+    return payload
+
+
+def pack_varints(cells):
+    """Packs a sequence of non-negative integers as LEB128 varints."""
+    out = bytearray()
+    for index in cells:
+        while index >= 0x80:
+            out.append((index & 0x7F) | 0x80)
+            index >>= 7
+        out.append(index)
+    return bytes(out)
+
+
+def varint_width(limit):
+    """Bytes of the longest varint below `limit`."""
+    return max(1, ((limit - 1).bit_length() + 6) // 7)
+
+
+def unpack_varints(data, limit=1 << 32):
+    """
+    Inverse of pack_varints for values below `limit`. Raises ValueError on a
+    truncated varint, or as soon as a value reaches `limit` or its varint is
+    longer than that requires.
+    """
+    cells = []
+    max_shift = 7 * (varint_width(limit) - 1)
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            if shift > max_shift:
+                raise ValueError("Invalid packed clicks: varint too long")
+        else:
+            if value >= limit:
+                raise ValueError(f"Invalid packed clicks: {value} out of range")
+            cells.append(value)
+            value = shift = 0
+    if shift:
+        raise ValueError("Invalid packed clicks: truncated varint")
+    return cells
+
+
+def encode_clicks(cells):
+    """Packs a sequence of cell indices into a base64url string of varints."""
+    return base64.urlsafe_b64encode(pack_varints(cells)).decode('ascii')
+
+
+def decode_clicks(packed, limit=1 << 32):
+    """Inverse of encode_clicks (cell indices below `limit`). Raises ValueError on malformed input."""
+    try:
+        data = base64.b64decode(packed, altchars=b'-_', validate=True)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Invalid packed clicks: {error}")
+    return unpack_varints(data, limit)
+
+
+def parse_clicks(data, rows, cols, max_clicks=None):
+    """
+    Reads the clicks of a batched move request, either `clicks` ([[row, col], ...])
+    or `packed` (see encode_clicks), and returns them as cell indices.
+    Every click is validated before any is applied; raises ValueError otherwise.
+    With `max_clicks`, longer batches are refused before they are decoded.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Corpo da requisição inválido.")
+    size = rows * cols
+    too_many = f"Máximo de {max_clicks} jogadas por requisição."
+    if 'packed' in data:
+        packed = data['packed']
+        if not isinstance(packed, str):
+            raise ValueError("Jogadas compactadas inválidas.")
+        # Base64 length of max_clicks varints of the widest cell index
+        if max_clicks is not None and len(packed) > 4 * -(-max_clicks * varint_width(size) // 3):
+            raise ValueError(too_many)
+        try:
+            cells = decode_clicks(packed, size)
+        except ValueError:
+            raise ValueError("Jogadas compactadas inválidas.")
+        if max_clicks is not None and len(cells) > max_clicks:
+            raise ValueError(too_many)
+        return cells
+    clicks = data.get('clicks')
+    if not isinstance(clicks, list):
+        raise ValueError("Lista de jogadas ausente.")
+    if max_clicks is not None and len(clicks) > max_clicks:
+        raise ValueError(too_many)
+    cells = []
+    for click in clicks:
+        if (not isinstance(click, (list, tuple)) or len(click) != 2
+                or not all(isinstance(v, int) and not isinstance(v, bool) for v in click)):
+            raise ValueError(f"Jogada inválida: {click!r}.")
+        row, col = click
+        if not (0 <= row < rows and 0 <= col < cols):
+            raise ValueError(f"Jogada fora do tabuleiro: {click!r}.")
+        cells.append(row * cols + col)
+    return cells
@@ -0,0 +1,277 @@
+"""
+Optional WebSocket play channel, served next to the Flask app.
+
+A small asyncio server (standard library only, RFC 6455 text frames) that
+shares the Flask app's SessionRegistry, so a player keeps the same game on
+both channels; the session is identified by the same cookie. Each
+connection costs one coroutine and its buffers, so idle players are cheap.
+
+Client -> server messages (JSON):
+    {"type": "click", "row": r, "col": c, "seq": n}
+    {"type": "state", "seq": n}
+    {"type": "undo", "seq": n} / {"type": "redo", "seq": n}
+Server -> client: the compact payload of wire.compact_payload plus
+"type": "state", "win", "can_undo", "can_redo" and the echoed "seq",
+or {"type": "error", ...}.
+The REST routes remain the fallback when the channel is not available.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
+import struct
+import threading
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+try:
+    from .wire import compact_payload
+    from .rules import stencil_payload
+except ImportError:
+    from wire import compact_payload
+    from rules import stencil_payload
+
+WS_PATH = '/ws'
+DEFAULT_WS_PORT = 8081
+MAX_MESSAGE_BYTES = 4096
+MAX_HEADER_BYTES = 8192
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class ProtocolError(Exception):
+    def __init__(self, message, close_code=1002):
+        super().__init__(message)
+        self.close_code = close_code
+
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1(key.encode('ascii') + _WS_GUID).digest()).decode('ascii')
+
+
+def encode_frame(opcode, payload=b""):
+    """Server frames are never masked."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 0x10000:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def _unmask(payload, key):
+    if not payload:
+        return payload
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    value = int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')
+    return value.to_bytes(len(payload), 'big')
+
+
+async def read_frame(reader):
+    """Reads one client frame; returns (opcode, payload)."""
+    first, second = await reader.readexactly(2)
+    if not first & 0x80:
+        raise ProtocolError("Fragmented messages are not supported", 1003)
+    opcode = first & 0x0F
+    if not second & 0x80:
+        raise ProtocolError("Client frames must be masked")
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if length > MAX_MESSAGE_BYTES:
+        raise ProtocolError("Message too big", 1009)
+    key = await reader.readexactly(4)
+    return opcode, _unmask(await reader.readexactly(length), key)
+
+
+async def _read_handshake(reader):
+    raw = await reader.readuntil(b"\r\n\r\n")
+    if len(raw) > MAX_HEADER_BYTES:
+        raise ProtocolError("Handshake too large")
+    lines = raw.decode('latin-1').split("\r\n")
+    request_line = lines[0].split()
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    return request_line, headers
+
+
+def _is_index(value):
+    """JSON true/false arrive as bool, which is an int subclass: not a cell coordinate."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _same_origin(headers):
+    """Rejects cross-site pages opening a socket with the player's cookie."""
+    origin = headers.get('origin')
+    if not origin:
+        return True
+    host = headers.get('host', '').rsplit(':', 1)[0].strip('[]')
+    return urlsplit(origin).hostname == host
+
+
+class GameChannel:
+    """
+    The WebSocket server, run on its own event loop in a daemon thread.
+    `registry` is the SessionRegistry shared with the Flask app.
+    """
+
+    def __init__(self, registry, host='0.0.0.0', port=DEFAULT_WS_PORT, cookie_name='game_sid'):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.cookie_name = cookie_name
+        self.connections = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """Starts serving in a background thread; returns once the socket is bound."""
+        self._thread = threading.Thread(target=self._run, name="game-channel", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._server is None:
+            raise OSError(f"Could not start the game channel on {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, self.host, self.port))
+            # Report the real port when bound to port 0
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError:
+            self._loop.close()
+            return
+        finally:
+            self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Drop the open connections before closing the loop
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def _session_id(self, headers):
+        cookie = SimpleCookie()
+        try:
+            cookie.load(headers.get('cookie', ''))
+        except Exception:
+            pass
+        morsel = cookie.get(self.cookie_name)
+        # Without the cookie the socket still works, on a game of its own
+        return morsel.value if morsel else secrets.token_urlsafe(16)
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            try:
+                request_line, headers = await _read_handshake(reader)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ProtocolError):
+                return
+            key = headers.get('sec-websocket-key')
+            if (len(request_line) < 2 or request_line[0] != 'GET' or urlsplit(request_line[1]).path != WS_PATH
+                    or headers.get('upgrade', '').lower() != 'websocket' or not key):
+                writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                return
+            if not _same_origin(headers):
+                writer.write(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\n\r\n")
+                return
+            writer.write((
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n"
+            ).encode('ascii'))
+            await self._serve(self._session_id(headers), reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _serve(self, session_id, reader, writer):
+        while True:
+            try:
+                opcode, payload = await read_frame(reader)
+            except ProtocolError as e:
+                writer.write(encode_frame(OPCODE_CLOSE, struct.pack('!H', e.close_code)))
+                return
+            if opcode == OPCODE_CLOSE:
+                writer.write(encode_frame(OPCODE_CLOSE, payload[:2]))
+                return
+            if opcode == OPCODE_PING:
+                writer.write(encode_frame(OPCODE_PONG, payload))
+            elif opcode == OPCODE_TEXT:
+                # handle_message waits on the session lock: keep it off the event loop
+                reply = await asyncio.get_running_loop().run_in_executor(
+                    None, self.handle_message, session_id, payload)
+                writer.write(encode_frame(OPCODE_TEXT, json.dumps(reply, separators=(',', ':')).encode('utf-8')))
+            await writer.drain()
+
+    def handle_message(self, session_id, payload):
+        """Applies one client message to the player's game and returns the reply."""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return {'type': 'error', 'message': 'Mensagem inválida.'}
+        if not isinstance(message, dict):
+            return {'type': 'error', 'message': 'Mensagem inválida.'}
+        seq = message.get('seq')
+        session = self.registry.get(session_id)
+        with session.lock: # Shared with the Flask routes of the same player
+            game = session.game
+            previous_state = game.state
+            kind = message.get('type')
+            if kind in ('click', 'undo', 'redo') and not session.room_for(1): # Undo and redo count as moves
+                return {'type': 'error', 'message': 'Limite de jogadas atingido.', 'seq': seq}
+            if kind == 'click':
+                row, col = message.get('row'), message.get('col')
+                if not (_is_index(row) and _is_index(col) and session.click(row, col)):
+                    return {'type': 'error', 'message': 'Jogada fora do tabuleiro.', 'seq': seq}
+            elif kind == 'undo':
+                if session.undo() is None:
+                    return {'type': 'error', 'message': 'Nenhuma jogada para desfazer.', 'seq': seq}
+            elif kind == 'redo':
+                if session.redo() is None:
+                    return {'type': 'error', 'message': 'Nenhuma jogada para refazer.', 'seq': seq}
+            elif kind == 'state':
+                previous_state = None
+            else:
+                return {'type': 'error', 'message': 'Tipo de mensagem desconhecido.', 'seq': seq}
+            reply = compact_payload(game, session.moves, previous_state)
+            reply['type'] = 'state'
+            if previous_state is None:
+                reply['stencil'] = stencil_payload(game.rule) # Full state: the client may need the rule again
+            reply['win'] = game.check_win()
+            reply['can_undo'] = bool(session.played)
+            reply['can_redo'] = bool(session.undone)
+            reply['seq'] = seq
+            return reply